@@ -0,0 +1,103 @@
+"""
+Content-hash cache in front of TagGenerator.generate_metadata.
+
+The same syllabus or timetable is uploaded by many users; files are keyed by the
+SHA-256 of their bytes (hashed while they are received) and the generated tags,
+title, summary and suggested filename are kept in storage (analysis_cache/{hash}),
+so identical re-uploads skip the Gemini Files API upload and generate call.
+"""
+import hashlib
+import threading
+import time
+
+import firebase_config
+import metrics
+
+METADATA_KEYS = ("tags", "title", "summary", "suggested_filename")
+
+def new_hasher():
+    """Incremental SHA-256; feed it chunks as they arrive and pass hexdigest() on."""
+    return hashlib.sha256()
+
+class AnalysisCacheStats:
+    """Hit/miss counts and an estimate of the Gemini time saved by hits."""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_hit(self, lookup_seconds):
+        with self._lock:
+            self.hits += 1
+            # A hit saves what an analysis costs on average, minus the lookup itself
+            if self.misses:
+                self.saved_seconds += max(0.0, self.miss_seconds / self.misses - lookup_seconds)
+
+    def record_miss(self, analysis_seconds):
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += analysis_seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+            }
+
+cache_stats = AnalysisCacheStats()
+
+def generate_metadata(tagger, file_path: str, mime_type: str, content_hash: str = None):
+    """
+    tagger.generate_metadata with the cache in front. Only real analyses (with tags)
+    are cached, never the fallback returned on Gemini errors. Returns None when
+    there is no cached entry and no tagger. file_path may be a callable returning
+    the path, called only on a miss (e.g. to download the file from Storage).
+    """
+    if content_hash:
+        t0 = time.perf_counter()
+        try:
+            cached = firebase_config.get_analysis_cache(content_hash)
+        except Exception as e:
+            print(f"Error reading analysis cache: {e}")
+            cached = None
+        if cached and cached.get("tags"):
+            cache_stats.record_hit(time.perf_counter() - t0)
+            return {key: cached[key] for key in METADATA_KEYS if key in cached}
+
+    if tagger is None:
+        return None
+
+    if callable(file_path):
+        file_path = file_path()
+    t0 = time.perf_counter()
+    generated = tagger.generate_metadata(file_path, mime_type)
+    if content_hash:
+        cache_stats.record_miss(time.perf_counter() - t0)
+        if generated and generated.get("tags"):
+            try:
+                firebase_config.save_analysis_cache(
+                    content_hash, {key: generated[key] for key in METADATA_KEYS if key in generated}
+                )
+            except Exception as e:
+                print(f"Error writing analysis cache: {e}")
+    return generated
+
+def analysis_cache_metrics():
+    """Hit ratio and saved Gemini latency, exported at /metrics."""
+    stats = cache_stats.stats()
+    return (
+        metrics.counter_lines("find_dee_analysis_cache_lookups", "File analysis cache lookups by result (hit, miss).",
+                              {("hit",): stats["hits"], ("miss",): stats["misses"]}, ("result",))
+        + metrics.counter_lines("find_dee_analysis_cache_saved_seconds", "Estimated Gemini seconds saved by analysis cache hits.",
+                                {(): stats["saved_seconds"]})
+        + metrics.gauge_lines("find_dee_analysis_cache", "File analysis cache hit ratio.",
+                              {("hit_ratio",): stats["hit_ratio"]}, ("stat",))
+    )
+
+metrics.register_collector(analysis_cache_metrics)
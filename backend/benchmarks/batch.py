@@ -0,0 +1,109 @@
+"""
+Batch upload benchmark: N files through N /api/upload requests (analysis on the
+background workers) vs one /api/upload/batch request.
+
+Drives the FastAPI app in-process over ASGI against the fakes used by benchmarks.run
+and reports the time until every file is analyzed, Gemini calls, RTDB reads/writes
+and tag pool round trips. With --fresh-pool the tag pool and alias map start empty,
+so every generated tag is new and has to be canonicalized. (httpx's ASGI transport buffers the response, so the time to
+the first streamed batch result is not measured here.)
+
+Usage (from backend/):
+    python -m benchmarks.batch --files 20 --gemini-latency-ms 300 --db-latency-ms 20
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import httpx
+from PIL import Image
+
+from benchmarks.run import Bench, parse_size
+
+class _PoolWrites:
+    """Counts round trips to tags/all (tag pool reads and updates)."""
+    def __init__(self, db):
+        self.count = 0
+        original = db.reference
+
+        def reference(path='/'):
+            if path.strip('/') == 'tags/all':
+                self.count += 1
+            return original(path)
+        db.reference = reference
+
+def make_photo(upload_bytes):
+    """A noise JPEG of roughly upload_bytes (noise keeps it from compressing away)."""
+    side = max(16, int((upload_bytes / 3) ** 0.5))
+    out = io.BytesIO()
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+async def run_single(client, bench, payloads, user):
+    async def one(i, payload):
+        r = await client.post("/api/upload", files={"file": (f"lecture_{i}.jpg", payload, "image/jpeg")},
+                              data={"user_id": user})
+        r.raise_for_status()
+    await asyncio.gather(*[one(i, p) for i, p in enumerate(payloads)])
+    await asyncio.to_thread(bench.main.analysis_jobs.join)
+
+async def run_batch(client, bench, payloads, user):
+    files = [("files", (f"lecture_{i}.jpg", p, "image/jpeg")) for i, p in enumerate(payloads)]
+    r = await client.post("/api/upload/batch", files=files, data={"user_id": user})
+    r.raise_for_status()
+    events = [json.loads(line) for line in r.text.splitlines() if line]
+    assert [e["event"] for e in events] == ["file"] * len(payloads) + ["batch"]
+    assert events[-1]["failed"] == 0
+
+async def measure(bench, args, mode):
+    payloads = [make_photo(args.upload_bytes) for _ in range(args.files)]
+    user = bench.users[0]
+    pool_writes = _PoolWrites(bench.db)
+    reads, writes, calls = bench.db.reads, bench.db.writes, bench.gemini.calls
+    transport = httpx.ASGITransport(app=bench.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        t0 = time.perf_counter()
+        await (run_single if mode == "single" else run_batch)(client, bench, payloads, user)
+        elapsed = (time.perf_counter() - t0) * 1000.0
+    del bench.db.reference # restore the class method
+    return {
+        "mode": mode, "ms": elapsed,
+        "gemini": bench.gemini.calls - calls, "reads": bench.db.reads - reads,
+        "writes": bench.db.writes - writes, "pool_writes": pool_writes.count,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Single vs batch upload of the same files")
+    parser.add_argument("--size", default="1k", help="Corpus size (e.g. 1k, 10k)")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--gemini-latency-ms", type=float, default=300.0)
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--upload-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--tag-pool-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fresh-pool", action="store_true", help="Start from an empty tag pool and alias map")
+    args = parser.parse_args()
+
+    bench = Bench(SimpleNamespace(
+        db_latency_ms=args.db_latency_ms, gemini_latency_ms=args.gemini_latency_ms,
+        tag_pool_size=args.tag_pool_size, seed=args.seed
+    ))
+    rows = []
+    for mode in ("single", "batch"):
+        bench.load(parse_size(args.size))
+        if args.fresh_pool:
+            bench.db.root["tags"]["all"] = []
+            bench.db.root.pop("tag_aliases", None)
+        rows.append(asyncio.run(measure(bench, args, mode)))
+
+    print(f"\n{'mode':<8}{'files':>6}{'all done ms':>13}{'gemini':>8}{'db reads':>10}{'db writes':>11}{'pool r/w':>10}")
+    for r in rows:
+        print(f"{r['mode']:<8}{args.files:>6}{r['ms']:>13.0f}{r['gemini']:>8}{r['reads']:>10}"
+              f"{r['writes']:>11}{r['pool_writes']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Concurrency benchmark: read latency (/api/files, /api/search) while uploads are in flight.
+
+Drives the FastAPI app in-process over ASGI (one event loop, like a single uvicorn
+worker) with simulated Gemini and RTDB latency. Each mode measures reads with the
+app idle and again with --uploads concurrent upload loops:
+- executor: the app as shipped (blocking work on bounded thread pools)
+- inline:   run_blocking patched to call functions directly on the event loop,
+            i.e. how handlers behaved before blocking work was moved off it
+
+Usage (from backend/):
+    python -m benchmarks.concurrency --size 10k --uploads 8 --gemini-latency-ms 300 --db-latency-ms 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from benchmarks.run import Bench, parse_size, percentile
+
+async def _inline(func, *args, limit=None, executor=None):
+    return func(*args)
+
+async def measure_reads(client, users, queries, args, with_uploads):
+    stop = asyncio.Event()
+    uploads = {"done": 0, "failed": 0}
+    payload = os.urandom(args.upload_bytes)
+
+    async def uploader(i):
+        n = 0
+        while not stop.is_set():
+            files = {"file": (f"bench_{i}_{n}.pdf", payload, "application/pdf")}
+            r = await client.post("/api/upload", files=files, data={"user_id": users[i % len(users)]})
+            uploads["done" if r.status_code == 200 else "failed"] += 1
+            n += 1
+            # A real client waits on the network between requests; let the loop run other tasks
+            await asyncio.sleep(0)
+
+    async def timed(method, url, **kwargs):
+        t0 = time.perf_counter()
+        r = await client.request(method, url, **kwargs)
+        r.raise_for_status()
+        return (time.perf_counter() - t0) * 1000.0
+
+    tasks = [asyncio.create_task(uploader(i)) for i in range(args.uploads if with_uploads else 0)]
+    if tasks:
+        await asyncio.sleep(args.warmup_ms / 1000.0) # let uploads reach Gemini/Firebase
+    files_ms, search_ms = [], []
+    started = time.perf_counter()
+    for j in range(args.reads):
+        user = users[j % len(users)]
+        files_ms.append(await timed("GET", f"/api/files/{user}"))
+        search_ms.append(await timed("POST", "/api/search", json={
+            "query": queries[j % len(queries)], "user_id": user, "limit": 20, "compact": True
+        }))
+        await asyncio.sleep(args.read_interval_ms / 1000.0)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*tasks)
+    return files_ms, search_ms, uploads, elapsed
+
+def summary(values):
+    values = sorted(values)
+    return [percentile(values, 50), percentile(values, 95), percentile(values, 99), values[-1] if values else 0.0]
+
+async def run_mode(bench, args, mode, users, queries):
+    original = bench.main.run_blocking
+    if mode == "inline":
+        bench.main.run_blocking = _inline
+    rows = []
+    try:
+        transport = httpx.ASGITransport(app=bench.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # Warm the search index so the first measured read does not pay for the build
+            await client.post("/api/search", json={"query": queries[0], "user_id": users[0]})
+            for with_uploads in (False, True):
+                files_ms, search_ms, uploads, elapsed = await measure_reads(client, users, queries, args, with_uploads)
+                label = f"{args.uploads} uploads" if with_uploads else "idle"
+                rows.append((mode, label, "/api/files", summary(files_ms), uploads, elapsed))
+                rows.append((mode, label, "/api/search", summary(search_ms), uploads, elapsed))
+    finally:
+        bench.main.run_blocking = original
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Read latency with uploads in flight")
+    parser.add_argument("--size", default="10k", help="Corpus size (e.g. 1k, 10k)")
+    parser.add_argument("--uploads", type=int, default=8, help="Concurrent upload loops")
+    parser.add_argument("--reads", type=int, default=10, help="Reads per endpoint per scenario")
+    parser.add_argument("--read-interval-ms", type=float, default=10.0)
+    parser.add_argument("--warmup-ms", type=float, default=100.0)
+    parser.add_argument("--modes", default="executor,inline")
+    parser.add_argument("--gemini-latency-ms", type=float, default=300.0)
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--upload-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--tag-pool-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    bench = Bench(SimpleNamespace(
+        db_latency_ms=args.db_latency_ms, gemini_latency_ms=args.gemini_latency_ms,
+        tag_pool_size=args.tag_pool_size, seed=args.seed
+    ))
+    bench.load(parse_size(args.size))
+    rng = random.Random(args.seed)
+    users = [rng.choice(bench.users) for _ in range(args.reads)]
+    queries = bench.tags[:args.reads]
+
+    rows = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        rows.extend(asyncio.run(run_mode(bench, args, mode, users, queries)))
+
+    print(f"\n{'mode':<10}{'scenario':<13}{'endpoint':<13}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'uploads/s':>11}")
+    for mode, label, endpoint, (p50, p95, p99, worst), uploads, elapsed in rows:
+        rate = uploads["done"] / elapsed if elapsed > 0 else 0.0
+        print(f"{mode:<10}{label:<13}{endpoint:<13}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}{worst:>10.1f}{rate:>11.1f}")
+
+if __name__ == "__main__":
+    main()
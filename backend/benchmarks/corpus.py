@@ -0,0 +1,97 @@
+"""
+Deterministic synthetic corpus: users, groups, a tag pool and file records
+shaped like the ones save_file_metadata / save_user write to RTDB.
+"""
+import datetime
+import random
+
+BASE_TAGS = [
+    "Mathematics", "Physics", "Chemistry", "Biology", "History", "Geography",
+    "Economics", "Statistics", "Programming", "Machine Learning", "Databases",
+    "Networking", "Lecture Notes", "Homework", "Exam", "Midterm", "Final Exam",
+    "Lab Report", "Slides", "Syllabus", "Invoice", "Receipt", "Contract",
+    "Meeting Notes", "Schedule", "Presentation", "Research Paper", "Thesis",
+    "Calculus", "Linear Algebra", "Marketing", "Accounting", "Design", "Poster",
+    "คณิตศาสตร์", "ฟิสิกส์", "เคมี", "ชีววิทยา", "ประวัติศาสตร์", "การบ้าน",
+    "สอบกลางภาค", "สอบปลายภาค", "สรุปเนื้อหา", "ใบเสร็จ",
+]
+
+WORDS = [
+    "chapter", "week", "summary", "draft", "final", "review", "notes", "part",
+    "intro", "advanced", "practice", "solutions", "group", "project", "report",
+]
+
+def tag_vocabulary(size: int = 200):
+    """BASE_TAGS plus numbered variants (e.g. "Physics 2") up to `size` tags."""
+    tags = list(BASE_TAGS)
+    level = 2
+    while len(tags) < size:
+        for base in BASE_TAGS:
+            if len(tags) >= size:
+                break
+            tags.append(f"{base} {level}")
+        level += 1
+    return tags
+
+def generate_corpus(num_files: int, seed: int = 42, tag_pool_size: int = 200,
+                    files_per_user: int = 100, files_per_group: int = 500, group_share: float = 0.7):
+    """
+    Returns {"files": {id: record}, "users": {id: record}, "tags": {"all": [...]}},
+    ready to load as the RTDB root. Same arguments always give the same corpus.
+    """
+    rng = random.Random(seed)
+    tags = tag_vocabulary(tag_pool_size)
+    num_users = max(5, num_files // files_per_user)
+    num_groups = max(2, num_files // files_per_group)
+
+    group_ids = [f"C{g:08x}" for g in range(num_groups)]
+    users = {}
+    for u in range(num_users):
+        user_id = f"U{u:08x}"
+        joined = rng.sample(group_ids, k=min(len(group_ids), rng.randint(1, 4)))
+        users[user_id] = {
+            "display_name": f"User {u}",
+            "groups": {g: f"Group {int(g[1:], 16)}" for g in joined},
+        }
+    user_ids = list(users)
+
+    start = datetime.datetime(2024, 1, 1)
+    files = {}
+    for i in range(num_files):
+        owner = user_ids[rng.randrange(num_users)]
+        group = None
+        if rng.random() < group_share:
+            group = rng.choice(list(users[owner]["groups"]))
+        file_tags = sorted(set(rng.sample(tags, k=rng.randint(2, 5))))
+        ext = rng.choice(("pdf", "pdf", "png", "jpg"))
+        name = "_".join(rng.sample(WORDS, 2) + [file_tags[0].replace(" ", "_")]) + f"_{i}"
+        files[f"-F{i:010d}"] = {
+            "filename": f"{name}.{ext}",
+            "file_type": ext,
+            "storage_path": f"uploads/{owner}/{name}.{ext}",
+            "url": f"https://storage.example/uploads/{owner}/{name}.{ext}",
+            "owner_id": owner,
+            "group_id": group,
+            "tags": file_tags,
+            "version": "v1",
+            "detail_summary": f"{' '.join(rng.sample(WORDS, 4))} about {', '.join(file_tags)}.",
+            "due_date_id": None,
+            "upload_date": str(start + datetime.timedelta(minutes=i)),
+        }
+    for file_id, record in files.items():
+        users[record["owner_id"]].setdefault("files_owned", {})[file_id] = True
+    return {"files": files, "users": users, "tags": {"all": tags}}
+
+def sample_queries(tags, count: int, seed: int = 7):
+    """Mix of tag-word queries (resolved locally) and free text (falls through to the model)."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            queries.append(rng.choice(tags))
+        elif kind == 1:
+            queries.append(f"{rng.choice(WORDS)} for {rng.choice(tags).lower()}")
+        else:
+            queries.append(" ".join(rng.sample(WORDS, 3)))
+    return queries
@@ -0,0 +1,101 @@
+"""
+Planner date queries: the previous full download of dates/ filtered in Python vs
+the ordered date_key / owner_date queries.
+
+Seeds --dates records spread over --users users and five years around today, then
+runs a user's upcoming and this-month views and the global upcoming view both ways.
+Reports latency, RTDB reads and the JSON size of what the database returned
+(roughly what RTDB would send over the wire).
+
+Usage (from backend/):
+    python -m benchmarks.dates --dates 100000 --users 1000 --db-latency-ms 20
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+from unittest.mock import patch
+
+import firebase_config
+from benchmarks.fakes import FakeDB, FakeQuery, FakeReference
+
+class _Downloaded:
+    """Sums the JSON size of every snapshot the fake database returns."""
+    def __init__(self):
+        self.bytes = 0
+        self._patches = [patch.object(cls, "get", self._wrap(cls.get)) for cls in (FakeQuery, FakeReference)]
+
+    def _wrap(self, get):
+        def counted(ref, *args, **kwargs):
+            result = get(ref, *args, **kwargs)
+            self.bytes += len(json.dumps(result))
+            return result
+        return counted
+
+    def __enter__(self):
+        for p in self._patches:
+            p.start()
+        return self
+
+    def __exit__(self, *exc):
+        for p in self._patches:
+            p.stop()
+
+def _scan(predicate):
+    """How the views were served before: read all of dates/ and filter."""
+    items = [d for d in firebase_config._date_items(firebase_config._ref('dates').get()) if predicate(d)]
+    return firebase_config._sort_by_date(items)
+
+def seed(db, n_dates, n_users, rng):
+    today = datetime.date.today()
+    dates = {}
+    for i in range(n_dates):
+        day = today + datetime.timedelta(days=rng.randint(-4 * 365, 365))
+        record = {"owner_id": f"user_{rng.randrange(n_users)}", "title": f"Task {i}",
+                  "description": "Chapter review and exercises", "date": day.isoformat(),
+                  "tags": ["Homework"], "is_complete": False}
+        record.update(firebase_config._date_index_fields(record))
+        dates[f"-D{i:09d}"] = record
+    db.root = {"dates": dates, "meta": {"date_index": "seeded"}}
+
+def main():
+    parser = argparse.ArgumentParser(description="Date views: full scan vs indexed range queries")
+    parser.add_argument("--dates", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = FakeDB(latency_ms=args.db_latency_ms)
+    seed(db, args.dates, args.users, rng)
+    user = "user_0"
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    month = today[:7]
+    views = [
+        ("user upcoming",
+         lambda: _scan(lambda d: d.get("owner_id") == user and d.get("date", "") >= today),
+         lambda: firebase_config.get_upcoming_dates(user)),
+        ("user this month",
+         lambda: _scan(lambda d: d.get("owner_id") == user and d.get("date", "").startswith(month)),
+         lambda: firebase_config.get_dates_this_month(user)),
+        ("all upcoming",
+         lambda: _scan(lambda d: d.get("date", "") >= today),
+         lambda: firebase_config.get_upcoming_dates()),
+    ]
+
+    print(f"{'view':<17}{'variant':<9}{'results':>8}{'ms':>9}{'reads':>7}{'KB read':>10}")
+    with patch.object(firebase_config, "db", db), patch.object(firebase_config, "_ready_indexes", set()):
+        for label, scan, indexed in views:
+            for variant, run in (("scan", scan), ("indexed", indexed)):
+                db.reset_counters()
+                with _Downloaded() as downloaded:
+                    t0 = time.perf_counter()
+                    results = run()
+                    elapsed = (time.perf_counter() - t0) * 1000.0
+                print(f"{label:<17}{variant:<9}{len(results):>8}{elapsed:>9.0f}{db.reads:>7}"
+                      f"{downloaded.bytes / 1024:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+In-process stand-ins for the external services used by the backend:
+- FakeDB / FakeStorage: replace firebase_admin `db` and `storage` inside firebase_config,
+  so every firebase_config function runs unchanged against an in-memory tree.
+- FakeGeminiClient: deterministic replacement for genai.Client with configurable latency.
+"""
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+def _copy(node):
+    """Returns a detached copy, like a fresh RTDB snapshot (callers mutate results)."""
+    if isinstance(node, dict):
+        return {k: _copy(v) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_copy(v) for v in node]
+    return node
+
+class _FakeRegistration:
+    def __init__(self, db, listener):
+        self.db = db
+        self.listener = listener
+
+    def close(self):
+        with self.db._lock:
+            if self.listener in self.db._listeners:
+                self.db._listeners.remove(self.listener)
+
+class FakeDB:
+    """Minimal firebase_admin.db: reference(path) with get/set/update/push/delete/order_by_child/listen."""
+    def __init__(self, latency_ms: float = 0.0, stream_latency_ms: float = 0.0):
+        self.root = {}
+        self.latency = latency_ms / 1000.0
+        self.stream_latency = stream_latency_ms / 1000.0
+        self.reads = 0
+        self.writes = 0
+        self._push_counter = 0
+        self._lock = threading.RLock()
+        self._listeners = [] # (path parts, callback)
+        self._events = None  # (deliver at, callback, event), delivered in order by one thread
+
+    def _listen(self, parts, callback):
+        with self._lock:
+            if self._events is None:
+                self._events = queue.Queue()
+                threading.Thread(target=self._deliver, daemon=True).start()
+            listener = (parts, callback)
+            self._listeners.append(listener)
+            node = FakeReference(self, parts)._node()
+            self._queue_event(callback, 'put', '/', _copy(node))
+        return _FakeRegistration(self, listener)
+
+    def _queue_event(self, callback, event_type, path, data):
+        event = SimpleNamespace(event_type=event_type, path=path, data=data)
+        self._events.put((time.monotonic() + self.stream_latency, callback, event))
+
+    def _deliver(self):
+        while True:
+            deliver_at, callback, event = self._events.get()
+            delay = deliver_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Error in fake RTDB listener: {e}")
+
+    def _emit(self, parts, values, merge=False):
+        """Queues change events for a write of {relative path: value} at parts (called under the lock)."""
+        for listen_parts, callback in list(self._listeners):
+            n = len(listen_parts)
+            if merge and list(parts[:n]) == list(listen_parts):
+                # Update at or below the listener: one patch, like RTDB
+                rel = '/' + '/'.join(parts[n:])
+                self._queue_event(callback, 'patch', rel, {k: _copy(v) for k, v in values.items()})
+                continue
+            for key, value in values.items():
+                full = list(parts) + [p for p in key.split('/') if p]
+                if full[:n] == list(listen_parts):
+                    self._queue_event(callback, 'put', '/' + '/'.join(full[n:]), _copy(value))
+                elif list(listen_parts[:len(full)]) == full:
+                    # Write above the listener: the listener's whole subtree changed
+                    self._queue_event(callback, 'put', '/', _copy(FakeReference(self, listen_parts)._node()))
+
+    def reference(self, path='/'):
+        return FakeReference(self, [p for p in path.strip('/').split('/') if p])
+
+    def _round_trip(self, write=False):
+        with self._lock:
+            if write:
+                self.writes += 1
+            else:
+                self.reads += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def next_key(self):
+        with self._lock:
+            self._push_counter += 1
+            return f"-N{self._push_counter:012d}"
+
+    def reset_counters(self):
+        self.reads = 0
+        self.writes = 0
+
+class FakeQuery:
+    """order_by_child query: equal_to / start_at / end_at filters, results ordered by the child."""
+    _UNSET = object()
+
+    def __init__(self, ref, child):
+        self.ref = ref
+        self.child = child
+        self.value = self.start = self.end = self._UNSET
+
+    def equal_to(self, value):
+        self.value = value
+        return self
+
+    def start_at(self, value):
+        self.start = value
+        return self
+
+    def end_at(self, value):
+        self.end = value
+        return self
+
+    def _matches(self, v):
+        if self.value is not self._UNSET:
+            return v == self.value
+        if v is None:
+            return self.start is self._UNSET
+        try:
+            return ((self.start is self._UNSET or v >= self.start)
+                    and (self.end is self._UNSET or v <= self.end))
+        except TypeError:
+            return False
+
+    def get(self):
+        self.ref.db._round_trip()
+        with self.ref.db._lock:
+            node = self.ref._node()
+            if not isinstance(node, dict):
+                return {}
+            hits = [(k, v) for k, v in node.items()
+                    if isinstance(v, dict) and self._matches(v.get(self.child))]
+            hits.sort(key=lambda kv: (str(kv[1].get(self.child)), kv[0]))
+            return {k: _copy(v) for k, v in hits}
+
+class FakeReference:
+    def __init__(self, db, parts):
+        self.db = db
+        self.parts = parts
+
+    @property
+    def key(self):
+        return self.parts[-1] if self.parts else None
+
+    @property
+    def path(self):
+        return '/' + '/'.join(self.parts)
+
+    def listen(self, callback):
+        return self.db._listen(list(self.parts), callback)
+
+    def _node(self, create=False):
+        node = self.db.root
+        for p in self.parts:
+            if not isinstance(node, dict):
+                return None
+            if p not in node:
+                if not create:
+                    return None
+                node[p] = {}
+            node = node[p]
+        return node
+
+    def _parent(self):
+        parent = FakeReference(self.db, self.parts[:-1])._node(create=True)
+        return parent
+
+    def _remove(self):
+        # RTDB has no empty nodes: removing the last child removes the parent too
+        parts = list(self.parts)
+        while parts:
+            parent = FakeReference(self.db, parts[:-1])._node()
+            if not isinstance(parent, dict):
+                return
+            parent.pop(parts[-1], None)
+            if parent:
+                return
+            parts.pop()
+
+    def get(self, shallow=False):
+        self.db._round_trip()
+        with self.db._lock:
+            node = self._node()
+            if shallow and isinstance(node, dict):
+                return {k: True for k in node}
+            return _copy(node)
+
+    def set(self, value):
+        self.db._round_trip(write=True)
+        with self.db._lock:
+            if not self.parts:
+                self.db.root = _copy(value) or {}
+            else:
+                self._parent()[self.parts[-1]] = _copy(value)
+            self.db._emit(self.parts, {'': value})
+
+    def update(self, values):
+        self.db._round_trip(write=True)
+        with self.db._lock:
+            for path, value in values.items():
+                ref = FakeReference(self.db, self.parts + [p for p in path.split('/') if p])
+                if value is None: # RTDB deletes keys set to null
+                    ref._remove()
+                else:
+                    ref._parent()[ref.parts[-1]] = _copy(value)
+            self.db._emit(self.parts, values, merge=True)
+
+    def push(self, value=None):
+        ref = FakeReference(self.db, self.parts + [self.db.next_key()])
+        if value is not None:
+            ref.set(value)
+        return ref
+
+    def delete(self):
+        self.db._round_trip(write=True)
+        with self.db._lock:
+            self._remove()
+            self.db._emit(self.parts, {'': None})
+
+    def transaction(self, update):
+        # Atomic read-modify-write under the lock, like a successful RTDB transaction
+        self.db._round_trip(write=True)
+        with self.db._lock:
+            value = update(_copy(self._node()))
+            if value is None:
+                self._remove()
+            else:
+                self._parent()[self.parts[-1]] = _copy(value)
+            self.db._emit(self.parts, {'': value})
+            return _copy(value)
+
+    def order_by_child(self, child):
+        return FakeQuery(self, child)
+
+class FakeBlob:
+    def __init__(self, store, name, chunk_size=None):
+        self.store = store
+        self.name = name
+        self.chunk_size = chunk_size
+
+    def upload_from_string(self, data, content_type=None):
+        self._store(data if isinstance(data, bytes) else data.encode())
+
+    def upload_from_filename(self, filename):
+        with open(filename, 'rb') as f:
+            self._store(f.read())
+
+    def upload_from_file(self, file_obj, content_type=None, size=None, **kwargs):
+        chunks = []
+        while True:
+            chunk = file_obj.read(self.chunk_size or 1024 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self._store(b"".join(chunks))
+
+    def _store(self, data):
+        self.store.blobs[self.name] = len(data)
+        self.store.data[self.name] = data
+
+    def download_to_filename(self, filename):
+        if self.name not in self.store.data:
+            raise FileNotFoundError(self.name)
+        with open(filename, 'wb') as f:
+            f.write(self.store.data[self.name])
+
+    def generate_signed_url(self, expiration, method='GET'):
+        return f"https://storage.example/{self.name}?sig=fake"
+
+    def delete(self):
+        self.store.blobs.pop(self.name, None)
+        self.store.data.pop(self.name, None)
+
+class FakeStorage:
+    """Minimal firebase_admin.storage: bucket(name=None).blob(name)."""
+    def __init__(self):
+        self.blobs = {} # name -> size
+        self.data = {}  # name -> bytes
+
+    def bucket(self, name=None):
+        return self
+
+    def blob(self, name, chunk_size=None):
+        return FakeBlob(self, name, chunk_size)
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class _FakeFiles:
+    def __init__(self, client):
+        self.client = client
+
+    def upload(self, file=None, **kwargs):
+        self.client._call(os.path.getsize(file))
+        return f"files/{hashlib.sha1(str(file).encode()).hexdigest()[:12]}"
+
+def _payload_bytes(part):
+    """Bytes a content part puts on the wire (inline data or text; file references are free)."""
+    if isinstance(part, str):
+        return len(part.encode("utf-8"))
+    inline = getattr(part, "inline_data", None)
+    return len(inline.data) if inline is not None else 0
+
+class _FakeModels:
+    def __init__(self, client):
+        self.client = client
+
+    def generate_content(self, model=None, contents=None, config=None):
+        parts = contents if isinstance(contents, list) else [contents]
+        self.client._call(sum(_payload_bytes(p) for p in parts))
+        prompt = contents if isinstance(contents, str) else str(contents[-1])
+        return _FakeResponse(self.client.respond(prompt, contents))
+
+class FakeGeminiClient:
+    """
+    Deterministic stand-in for genai.Client. Recognizes the prompts used by
+    TagGenerator, TagDeduplicator and TagSearch and answers from the prompt itself.
+    With upload_mbps set, each call also takes the time to send its payload.
+    """
+    def __init__(self, vocabulary, latency_ms: float = 0.0, upload_mbps: float = 0.0):
+        self.vocabulary = list(vocabulary)
+        self.latency = latency_ms / 1000.0
+        self.upload_bytes_per_s = upload_mbps * 1e6 / 8
+        self.calls = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.models = _FakeModels(self)
+        self.files = _FakeFiles(self)
+
+    def _call(self, payload_bytes=0):
+        with self._lock:
+            self.calls += 1
+            self.bytes_sent += payload_bytes
+        delay = self.latency
+        if self.upload_bytes_per_s:
+            delay += payload_bytes / self.upload_bytes_per_s
+        if delay:
+            time.sleep(delay)
+
+    def _pick(self, seed, k):
+        h = int(hashlib.sha1(seed.encode()).hexdigest(), 16)
+        return [self.vocabulary[(h >> (8 * i)) % len(self.vocabulary)] for i in range(k)]
+
+    def respond(self, prompt, contents):
+        if "Tag Pool:" in prompt:
+            m = re.search(r"Tag Pool:\s*(\[.*?\])\s*Query:\s*(.*)", prompt, re.S)
+            pool = json.loads(m.group(1)) if m else []
+            query = m.group(2).strip().lower() if m else ""
+            hits = [t for t in pool if t.lower() in query]
+            return json.dumps(hits or (pool[:1] if pool else ["other"]))
+        if "Existing canonical tags:" in prompt:
+            m = re.search(r"Existing canonical tags:\s*(\[.*?\])\s*New tags:\s*(\[.*\])", prompt, re.S)
+            canonical = {t.lower(): t for t in json.loads(m.group(1))}
+            return json.dumps({t: canonical.setdefault(t.lower(), t) for t in json.loads(m.group(2))})
+        if "key is the original tag" in prompt:
+            tags = json.loads(re.search(r"Tags:\s*(\[.*\])", prompt, re.S).group(1))
+            canonical = {}
+            return json.dumps({t: canonical.setdefault(t.lower(), t) for t in tags})
+        if "unique tags" in prompt:
+            tags = json.loads(re.search(r"Tags:\s*(\[.*\])", prompt, re.S).group(1))
+            seen = {}
+            for t in tags:
+                seen.setdefault(t.lower(), t)
+            return json.dumps(list(seen.values()))
+        if "suggested_filename" in prompt:
+            first = contents[0] if isinstance(contents, list) else prompt
+            inline = getattr(first, "inline_data", None)
+            # Seed on the whole payload (Part reprs are truncated, and JPEG headers alike)
+            seed = hashlib.sha1(inline.data).hexdigest() if inline is not None else str(first)
+            tags = sorted(set(self._pick(seed, 3)))
+            name = "_".join(t.replace(" ", "_") for t in tags)[:30]
+            return json.dumps({
+                "tags": tags,
+                "title": " ".join(tags).title(),
+                "summary": f"Document about {', '.join(tags)}.",
+                "suggested_filename": name
+            })
+        return json.dumps(self._pick(prompt, 3))
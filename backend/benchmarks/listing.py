@@ -0,0 +1,64 @@
+"""
+File listing benchmark: /api/files/{user_id} with full records vs compact=true
+(listing fields from file_index/, details loaded on demand).
+
+Reports, per listing, the response size, the time to parse it (json.loads, a
+stand-in for the mini-app's response.json()), the handler latency and how much
+data the handler read from RTDB. Corpus summaries are padded to --summary-chars,
+closer to what Gemini writes than the corpus' one-line summaries.
+
+Usage (from backend/):
+    python -m benchmarks.listing --size 10k --db-latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from types import SimpleNamespace
+
+from benchmarks.dates import _Downloaded
+from benchmarks.run import Bench, parse_size
+
+def main():
+    parser = argparse.ArgumentParser(description="Full vs compact file listings")
+    parser.add_argument("--size", default="10k", help="Corpus size (e.g. 10k, 100k)")
+    parser.add_argument("--users", type=int, default=20, help="Listings measured per mode")
+    parser.add_argument("--summary-chars", type=int, default=600)
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--tag-pool-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    bench = Bench(SimpleNamespace(db_latency_ms=args.db_latency_ms, gemini_latency_ms=0.0,
+                                  tag_pool_size=args.tag_pool_size, seed=args.seed))
+    bench.load(parse_size(args.size))
+    for record in bench.db.root["files"].values():
+        record["detail_summary"] = (record["detail_summary"] + " ") * (args.summary_chars // len(record["detail_summary"]) + 1)
+        record["detail_summary"] = record["detail_summary"][:args.summary_chars]
+
+    loop = asyncio.new_event_loop()
+    users = bench.users[:args.users]
+    print(f"{'mode':<9}{'files':>7}{'KB':>9}{'parse ms':>10}{'handler ms':>12}{'KB read':>10}")
+    try:
+        for mode, compact in (("full", False), ("compact", True)):
+            files, sizes, parse, handler, read = [], [], [], [], []
+            for user in users:
+                with _Downloaded() as downloaded:
+                    t0 = time.perf_counter()
+                    response = loop.run_until_complete(bench.main.get_user_files(user, compact=compact))
+                    handler.append((time.perf_counter() - t0) * 1000.0)
+                body = json.dumps(response)
+                t0 = time.perf_counter()
+                json.loads(body)
+                parse.append((time.perf_counter() - t0) * 1000.0)
+                sizes.append(len(body) / 1024)
+                read.append(downloaded.bytes / 1024)
+                files.append(sum(len(g["files"]) for g in response.get("groups", [])))
+            print(f"{mode:<9}{statistics.mean(files):>7.0f}{statistics.mean(sizes):>9.0f}"
+                  f"{statistics.median(parse):>10.2f}{statistics.median(handler):>12.0f}{statistics.mean(read):>10.0f}")
+    finally:
+        loop.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Media pre-processing benchmark: bytes sent to Gemini and end-to-end
+TagGenerator.generate_metadata latency, with and without MediaPreprocessor.
+
+Samples are generated locally: a 12 MP phone photo, a 200-page PDF with a text
+layer and a figure per page, and a small PNG screenshot. The fake Gemini client
+charges --gemini-latency-ms per call plus the transfer time of the payload at
+--upload-mbps, so the numbers include both the round trip saved by sending inline
+and the upload time saved by sending less.
+
+Usage (from backend/):
+    python -m benchmarks.media --gemini-latency-ms 300 --upload-mbps 20
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+from unittest.mock import patch
+
+from PIL import Image
+
+from benchmarks.fakes import FakeGeminiClient
+
+def make_photo(path, width=4000, height=3000, seed=0):
+    """Noisy gradient saved as a quality-95 JPEG at phone-camera resolution."""
+    rng = random.Random(seed)
+    small = Image.new("RGB", (width // 8, height // 8))
+    small.putdata([(x % 256, y % 256, rng.randrange(256))
+                   for y in range(height // 8) for x in range(width // 8)])
+    small.resize((width, height), Image.BICUBIC).save(path, format="JPEG", quality=95)
+
+def make_text_pdf(path, pages=200, lines=40, figure_px=0, seed=0):
+    """Writes a PDF with `lines` lines of text per page (and a JPEG figure per page if figure_px)."""
+    rng = random.Random(seed)
+    words = ["lecture", "syllabus", "calculus", "biology", "exam", "schedule", "chapter",
+             "assignment", "theorem", "laboratory", "history", "economics"]
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    next_id = 4
+    for p in range(pages):
+        text = "\n".join(
+            f"BT /F1 10 Tf 50 {760 - 17 * i} Td ({' '.join(rng.choice(words) for _ in range(10))}) Tj ET"
+            for i in range(lines)
+        )
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        resources = b"/Font << /F1 3 0 R >>"
+        if figure_px:
+            image_id = next_id
+            next_id += 1
+            figure = io.BytesIO()
+            Image.frombytes("RGB", (figure_px, figure_px), rng.randbytes(figure_px * figure_px * 3)).save(
+                figure, format="JPEG", quality=80)
+            data = figure.getvalue()
+            objects[image_id] = (
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+                b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n" % (figure_px, figure_px, len(data))
+                + data + b"\nendstream"
+            )
+            resources += b" /XObject << /Im1 %d 0 R >>" % image_id
+            text += "\nq 200 0 0 200 350 50 cm /Im1 Do Q"
+        stream = text.encode("latin-1")
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            b"/Resources << " + resources + b" >> /Contents %d 0 R >>" % content_id)
+        kids.append(page_id)
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = out.tell()
+        out.write(b"%d 0 obj\n" % obj_id + objects[obj_id] + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for obj_id in sorted(objects):
+        out.write(b"%010d 00000 n \n" % offsets[obj_id])
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+
+def make_screenshot(path):
+    Image.new("RGB", (800, 600), (240, 240, 240)).save(path, format="PNG")
+
+def run(args):
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    client = FakeGeminiClient(["Math", "Biology", "Exam", "Schedule"], latency_ms=args.gemini_latency_ms,
+                              upload_mbps=args.upload_mbps)
+    with patch("google.genai.Client", return_value=client):
+        from search.media import UPLOAD
+        from search.tagger import TagGenerator
+        tagger = TagGenerator()
+
+    workdir = tempfile.mkdtemp(prefix="media_bench_")
+    samples = [
+        ("photo (12 MP jpeg)", os.path.join(workdir, "photo.jpg"), "image/jpeg", make_photo),
+        ("pdf (200 pages)", os.path.join(workdir, "notes.pdf"), "application/pdf",
+         lambda p: make_text_pdf(p, pages=200, figure_px=args.figure_px)),
+        ("screenshot (png)", os.path.join(workdir, "screen.png"), "image/png", make_screenshot),
+    ]
+    print(f"{'sample':<20}{'size KB':>9}  {'variant':<14}{'sent KB':>9}{'latency ms':>12}")
+    try:
+        for label, path, mime, make in samples:
+            make(path)
+            size = os.path.getsize(path)
+            for variant in ("original", "preprocessed"):
+                if variant == "original":
+                    # Behaviour before pre-processing: always upload the file as it is
+                    prepare = patch.object(tagger.preprocessor, "prepare", lambda p, m: (UPLOAD, p))
+                else:
+                    prepare = patch.object(tagger.preprocessor, "prepare", tagger.preprocessor.prepare)
+                sent_before = client.bytes_sent
+                with prepare:
+                    t0 = time.perf_counter()
+                    tagger.generate_metadata(path, mime)
+                    elapsed = (time.perf_counter() - t0) * 1000.0
+                print(f"{label:<20}{size / 1024:>9.0f}  {variant:<14}"
+                      f"{(client.bytes_sent - sent_before) / 1024:>9.0f}{elapsed:>12.0f}")
+    finally:
+        for _, path, _, _ in samples:
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(workdir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes sent and analysis latency with media pre-processing")
+    parser.add_argument("--gemini-latency-ms", type=float, default=300.0, help="Simulated latency per Gemini call")
+    parser.add_argument("--upload-mbps", type=float, default=20.0, help="Simulated upload bandwidth to Gemini")
+    parser.add_argument("--figure-px", type=int, default=160, help="Side of the JPEG figure on each PDF page (0: none)")
+    run(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
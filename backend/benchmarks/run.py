@@ -0,0 +1,219 @@
+"""
+Scaling benchmark for the search and upload paths.
+
+Runs the real handlers (main.search_files, main.get_user_files, bot.process_upload)
+in-process against an in-memory RTDB/Storage stand-in and a deterministic fake
+Gemini client, for each corpus size, and reports p50/p95/p99 latency and throughput.
+
+Usage (from backend/):
+    python -m benchmarks.run --sizes 1k,10k,100k,1m
+    python -m benchmarks.run --sizes 10k --gemini-latency-ms 400 --db-latency-ms 30 --concurrency 8
+    python -m benchmarks.run --sizes 10k --db-latency-ms 20 --replica
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+# Dummy credentials so main/bot import without a real environment; all clients are replaced below
+for _key in ("GOOGLE_API_KEY", "LINE_CHANNEL_ACCESS_TOKEN", "LINE_CHANNEL_SECRET"):
+    os.environ.setdefault(_key, "benchmark")
+
+import firebase_config
+from benchmarks.corpus import generate_corpus, sample_queries, tag_vocabulary
+from benchmarks.fakes import FakeDB, FakeStorage, FakeGeminiClient
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    for suffix, factor in (("k", 1_000), ("m", 1_000_000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+class FakeLineBotApi:
+    def reply_message(self, reply_token, messages):
+        pass
+
+    def push_message(self, to, messages):
+        pass
+
+    def get_profile(self, user_id):
+        return SimpleNamespace(display_name=f"Benchmark {user_id}")
+
+    def get_group_summary(self, group_id):
+        return SimpleNamespace(group_name=f"Group {group_id}")
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.db = FakeDB(latency_ms=args.db_latency_ms)
+        self.gemini = FakeGeminiClient(tag_vocabulary(args.tag_pool_size), latency_ms=args.gemini_latency_ms)
+        firebase_config.db = self.db
+        firebase_config.storage = FakeStorage()
+
+        import main
+        import bot
+        self.main = main
+        self.bot = bot
+        for service in (main.tagger, main.deduplicator, main.searcher, bot.tagger, bot.deduplicator):
+            if service is not None:
+                service.model = self.gemini
+        self.line_bot_api = FakeLineBotApi()
+
+    def load(self, size):
+        corpus = generate_corpus(size, seed=self.args.seed, tag_pool_size=self.args.tag_pool_size)
+        self.db.root = corpus
+        self.users = sorted(corpus["users"])
+        self.tags = corpus["tags"]["all"]
+        # Force a cold index and empty caches for every size
+        self.main.tag_index.built_at = None
+        # Backfill the filename and tag indexes now rather than inside the first measured upload
+        firebase_config._ready_indexes.clear()
+        firebase_config._ensure_filename_index()
+        firebase_config._ensure_index('tag_file_index', firebase_config.rebuild_tag_file_index)
+        firebase_config._ensure_index('user_directory', firebase_config.rebuild_user_directory)
+        firebase_config._ensure_index('file_index', firebase_config.rebuild_file_index)
+        if self.main.searcher:
+            self.main.searcher.query_cache.clear()
+        firebase_config.read_cache.clear()
+        if getattr(self.args, "replica", False):
+            # Fresh replica of the new corpus; measured calls start once every root has loaded
+            firebase_config.stop_replica()
+            replica = firebase_config.start_replica()
+            while not all(replica.ready(root) for root in replica.roots):
+                time.sleep(0.01)
+
+    def measure(self, name, make_call, iterations, concurrency, loop):
+        """Runs make_call(i) `iterations` times, `concurrency` at a time. make_call returns a coroutine."""
+        latencies = []
+        reads, writes, calls = self.db.reads, self.db.writes, self.gemini.calls
+
+        async def timed(i):
+            t0 = time.perf_counter()
+            await make_call(i)
+            latencies.append(time.perf_counter() - t0)
+
+        async def run_all():
+            for start in range(0, iterations, concurrency):
+                await asyncio.gather(*[timed(i) for i in range(start, min(iterations, start + concurrency))])
+
+        wall = time.perf_counter()
+        loop.run_until_complete(run_all())
+        wall = time.perf_counter() - wall
+
+        latencies.sort()
+        ms = [x * 1000.0 for x in latencies]
+        return {
+            "op": name,
+            "n": len(ms),
+            "p50_ms": percentile(ms, 50),
+            "p95_ms": percentile(ms, 95),
+            "p99_ms": percentile(ms, 99),
+            "throughput_ops": len(ms) / wall if wall > 0 else 0.0,
+            "db_reads_per_op": (self.db.reads - reads) / max(1, len(ms)),
+            "db_writes_per_op": (self.db.writes - writes) / max(1, len(ms)),
+            "gemini_calls_per_op": (self.gemini.calls - calls) / max(1, len(ms)),
+        }
+
+    def run_size(self, size, loop):
+        args = self.args
+        t0 = time.perf_counter()
+        self.load(size)
+        results = [{"op": "generate_corpus", "n": 1, "p50_ms": (time.perf_counter() - t0) * 1000.0}]
+
+        rng = random.Random(args.seed)
+        queries = sample_queries(self.tags, args.iterations, seed=args.seed)
+        users = [rng.choice(self.users) for _ in range(args.iterations)]
+
+        def search(i):
+            return self.main.search_files(self.main.SearchRequest(
+                query=queries[i], user_id=users[i], limit=args.page_size, compact=True
+            ))
+
+        # First search pays for the full index build
+        results.append(self.measure("search_files (cold)", search, 1, 1, loop))
+        results.append(self.measure("search_files", search, args.iterations, args.concurrency, loop))
+        results.append(self.measure(
+            "get_user_files", lambda i: self.main.get_user_files(users[i]),
+            args.iterations, args.concurrency, loop
+        ))
+
+        # A share of uploads re-send one common file (hits in the content-hash analysis cache)
+        shared_payload = random.Random(args.seed).randbytes(args.upload_bytes)
+        duplicate_rng = random.Random(args.seed + 1)
+
+        def upload(i):
+            duplicate = duplicate_rng.random() < args.duplicate_ratio
+            payload = shared_payload if duplicate else os.urandom(args.upload_bytes)
+            fd, path = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            user_id = users[i % len(users)]
+            groups = list(self.db.root["users"][user_id].get("groups") or {})
+            source = SimpleNamespace(type="group", group_id=groups[0]) if groups else SimpleNamespace(type="user")
+            event = SimpleNamespace(reply_token="benchmark", source=source)
+            data = {"temp_path": path, "extension": "pdf", "mock_name": f"upload_{i}",
+                    "content_hash": hashlib.sha256(payload).hexdigest()}
+            return asyncio.to_thread(self.bot.process_upload, event, self.line_bot_api, user_id, data)
+
+        results.append(self.measure("process_upload", upload, args.upload_iterations, args.concurrency, loop))
+        return results
+
+def print_table(size, results):
+    print(f"\n=== {size:,} files ===")
+    print(f"{'operation':<22}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'ops/s':>10}"
+          f"{'db r/op':>9}{'db w/op':>9}{'llm/op':>8}")
+    for r in results:
+        if r["op"] == "generate_corpus":
+            print(f"{'generate_corpus':<22}{1:>6}{r['p50_ms']:>11.1f}")
+            continue
+        print(f"{r['op']:<22}{r['n']:>6}{r['p50_ms']:>11.2f}{r['p95_ms']:>11.2f}{r['p99_ms']:>11.2f}"
+              f"{r['throughput_ops']:>10.1f}{r['db_reads_per_op']:>9.1f}{r['db_writes_per_op']:>9.1f}"
+              f"{r['gemini_calls_per_op']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark for search and upload")
+    parser.add_argument("--sizes", default="1k,10k,100k,1m", help="Comma-separated corpus sizes (e.g. 1k,10k,1m)")
+    parser.add_argument("--iterations", type=int, default=50, help="Requests per read benchmark")
+    parser.add_argument("--upload-iterations", type=int, default=10, help="Uploads per size")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight at once")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--gemini-latency-ms", type=float, default=0.0, help="Simulated latency per Gemini call")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Simulated round trip per RTDB call")
+    parser.add_argument("--upload-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="Share of uploads that re-send the same file")
+    parser.add_argument("--tag-pool-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--replica", action="store_true", help="Serve reads from the local RTDB replica")
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    bench = Bench(args)
+    loop = asyncio.new_event_loop()
+    report = {"config": vars(args), "sizes": {}}
+    try:
+        for size in [parse_size(s) for s in args.sizes.split(",") if s.strip()]:
+            results = bench.run_size(size, loop)
+            report["sizes"][size] = results
+            print_table(size, results)
+    finally:
+        loop.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
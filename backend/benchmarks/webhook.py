@@ -0,0 +1,137 @@
+"""
+LINE webhook benchmark: /callback latency for upload confirmations.
+
+Each request is a signed postback (action=confirm_upload) from a user with a file
+waiting to be confirmed, so handling it runs bot.process_upload (Gemini analysis,
+Storage upload, metadata). Modes:
+- dispatch: the app as shipped (events queued to the LINE workers, result pushed)
+- inline:   events handled inside the webhook request on the event loop, as before
+            the dispatcher
+Reports webhook latency and the time until every upload's message was sent.
+
+Usage (from backend/):
+    python -m benchmarks.webhook --events 20 --gemini-latency-ms 300 --db-latency-ms 20
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+
+from benchmarks.concurrency import _inline
+from benchmarks.media import make_text_pdf
+from benchmarks.run import Bench, parse_size, percentile
+
+class CountingLineBotApi:
+    """FakeLineBotApi that records when each reply/push goes out."""
+    def __init__(self, inner):
+        self.inner = inner
+        self.sent = 0
+        self.done = threading.Event()
+        self.expected = 0
+        self._lock = threading.Lock()
+
+    def _record(self):
+        with self._lock:
+            self.sent += 1
+            if self.sent >= self.expected:
+                self.done.set()
+
+    def reply_message(self, reply_token, messages):
+        self._record()
+
+    def push_message(self, to, messages, **kwargs):
+        self._record()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+def confirm_body(user_id, n):
+    return json.dumps({"destination": "bench", "events": [{
+        "type": "postback", "mode": "active", "timestamp": int(time.time() * 1000),
+        "webhookEventId": f"bench-{user_id}-{n}", "deliveryContext": {"isRedelivery": False},
+        "source": {"type": "user", "userId": user_id}, "replyToken": f"token-{n}",
+        "postback": {"data": "action=confirm_upload"},
+    }]})
+
+def sign(body):
+    secret = os.environ["LINE_CHANNEL_SECRET"].encode()
+    return base64.b64encode(hmac.new(secret, body.encode(), hashlib.sha256).digest()).decode()
+
+async def measure(bench, args, mode):
+    main, bot = bench.main, bench.bot
+    api = CountingLineBotApi(bench.line_bot_api)
+    api.expected = args.events
+    # One pending confirmation per user (a second confirm from a user would find no state)
+    users = [f"webhook_{mode}_{i}" for i in range(args.events)]
+    workdir = tempfile.mkdtemp(prefix="webhook_bench_")
+    for i, user in enumerate(users):
+        path = os.path.join(workdir, f"upload_{i}.pdf")
+        make_text_pdf(path, pages=args.pages, seed=i)
+        bot.user_states[user] = {"state": bot.STATE_CONFIRMING_UPLOAD,
+                                 "data": {"temp_path": path, "extension": "pdf", "mock_name": f"upload_{i}"}}
+
+    latencies = []
+    patches = [patch.object(main, "line_bot_api", api), patch.object(bot.requests, "post")]
+    if mode == "inline":
+        patches.append(patch.object(main, "enqueue_line_event", main.dispatch_line_event))
+        patches.append(patch.object(main, "run_blocking", _inline))
+    for p in patches:
+        p.start()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def post(i, user):
+                body = confirm_body(user, i)
+                t0 = time.perf_counter()
+                r = await client.post("/callback", content=body, headers={"X-Line-Signature": sign(body)})
+                r.raise_for_status()
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+
+            # Webhooks arrive one after another (LINE waits for each response)
+            t0 = time.perf_counter()
+            for i, user in enumerate(users):
+                await post(i, user)
+            await asyncio.to_thread(api.done.wait, 120)
+            finished = (time.perf_counter() - t0) * 1000.0
+    finally:
+        for p in patches:
+            p.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    latencies.sort()
+    return mode, percentile(latencies, 50), percentile(latencies, 95), latencies[-1], finished
+
+def main():
+    parser = argparse.ArgumentParser(description="LINE webhook latency, inline vs dispatched")
+    parser.add_argument("--size", default="1k", help="Corpus size (e.g. 1k, 10k)")
+    parser.add_argument("--events", type=int, default=20, help="Upload confirmations, sent back to back")
+    parser.add_argument("--gemini-latency-ms", type=float, default=300.0)
+    parser.add_argument("--db-latency-ms", type=float, default=20.0)
+    parser.add_argument("--pages", type=int, default=5, help="Pages per uploaded PDF")
+    parser.add_argument("--tag-pool-size", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    bench = Bench(SimpleNamespace(
+        db_latency_ms=args.db_latency_ms, gemini_latency_ms=args.gemini_latency_ms,
+        tag_pool_size=args.tag_pool_size, seed=args.seed
+    ))
+    bench.load(parse_size(args.size))
+    rows = [asyncio.run(measure(bench, args, mode)) for mode in ("inline", "dispatch")]
+
+    print(f"\n{'mode':<10}{'events':>7}{'webhook p50 ms':>16}{'p95 ms':>9}{'max ms':>9}{'all sent ms':>13}")
+    for mode, p50, p95, worst, finished in rows:
+        print(f"{mode:<10}{args.events:>7}{p50:>16.1f}{p95:>9.1f}{worst:>9.1f}{finished:>13.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,18 @@ import os
 import logging
 import re
 import json
+import uuid
 import requests
+import metrics
+import analysis_cache
 from firebase_config import (
     save_file_metadata, save_user, upload_file_to_storage, 
-    get_tag_pool, save_tag_pool, check_filename_exists,
-    get_candidate_files, update_file_metadata
+    get_tag_pool, add_to_tag_pool, reserve_filename, release_filename,
+    get_tag_aliases, save_tag_aliases
 )
 from search.tagger import TagGenerator
 from search.deduplicator import TagDeduplicator
+from search.canonicalizer import TagCanonicalizer
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,6 +37,11 @@ except Exception as e:
     tagger = None
     deduplicator = None
 
+metrics.instrument_services(tagger, deduplicator)
+
+# Incremental tag canonicalization through the persisted alias map
+canonicalizer = TagCanonicalizer(deduplicator, get_tag_aliases, save_tag_aliases)
+
 # In-memory state management
 # Structure: { user_id: { "state": "STATE_NAME", "data": { ... } } }
 user_states = {}
@@ -47,6 +56,11 @@ def sanitize_filename(name):
     name = name.replace(' ', '_')
     return name
 
+def chat_id(event):
+    """The chat an event came from: group, room or 1:1 user."""
+    source = event.source
+    return getattr(source, 'group_id', None) or getattr(source, 'room_id', None) or source.user_id
+
 def handle_line_event(event, line_bot_api):
     user_id = event.source.user_id
     
@@ -99,8 +113,12 @@ def handle_line_event(event, line_bot_api):
                 except Exception as e:
                     logger.error(f"Failed to send loading animation: {e}")
                 
-                # Process (using original reply_token)
-                process_upload(event, line_bot_api, user_id, state['data'])
+                # Process; the result is pushed to the chat when it is ready
+                try:
+                    process_upload(event, line_bot_api, user_id, state['data'])
+                except Exception as e:
+                    logger.error(f"Upload failed: {e}")
+                    line_bot_api.push_message(chat_id(event), TextSendMessage(text="ขออภัยครับ บันทึกไฟล์ไม่สำเร็จ กรุณาลองใหม่อีกครั้ง"))
                 user_states.pop(user_id, None)
             else:
                 line_bot_api.reply_message(event.reply_token, TextSendMessage(text="หมดเวลาการยืนยันครับ กรุณาเริ่มใหม่"))
@@ -215,8 +233,10 @@ def handle_file_upload_request(event, line_bot_api, user_id):
         extension = "pdf"
     
     temp_path = f"/tmp/{message_id}.{extension}"
+    hasher = analysis_cache.new_hasher() # content hash for the analysis cache
     with open(temp_path, 'wb') as fd:
         for chunk in message_content.iter_content():
+            hasher.update(chunk)
             fd.write(chunk)
             
     # 2. Prepare Data for Confirmation (Skip AI Tagging here)
@@ -232,7 +252,8 @@ def handle_file_upload_request(event, line_bot_api, user_id):
             "extension": extension,
             "original_filename": original_filename,
             "mock_name": mock_name,
-            "file_type": file_type
+            "file_type": file_type,
+            "content_hash": hasher.hexdigest()
         }
     }
     
@@ -289,6 +310,7 @@ def handle_file_upload_request(event, line_bot_api, user_id):
     )
     line_bot_api.reply_message(event.reply_token, flex_message)
 
+@metrics.tracked("process_upload")
 def process_upload(event, line_bot_api, user_id, data):
     temp_path = data['temp_path']
     extension = data['extension']
@@ -297,68 +319,34 @@ def process_upload(event, line_bot_api, user_id, data):
     # 1. Analyze (Tagging) - Now done here to save tokens
     generated_metadata = {"tags": [], "title": mock_name, "summary": ""}
     
-    if tagger:
-        mime_type = "image/jpeg" if extension in ["jpg", "jpeg", "png"] else "application/pdf"
-        try:
-            # Notify user that processing is starting (optional, but good UX)
-            # line_bot_api.push_message(user_id, TextSendMessage(text="กำลังวิเคราะห์ไฟล์... ⏳")) 
-            # Note: push_message might cost, but here we are replying to postback. 
-            # We can't easily send an intermediate message and then another reply token message without push.
-            # Let's just do it and hope it's fast enough.
-            
-            generated_metadata = tagger.generate_metadata(temp_path, mime_type)
-        except Exception as e:
-            logger.error(f"Tagging failed: {e}")
+    mime_type = "image/jpeg" if extension in ["jpg", "jpeg", "png"] else "application/pdf"
+    try:
+        # Files uploaded before (same content hash) reuse their analysis without Gemini
+        generated_metadata = analysis_cache.generate_metadata(
+            tagger, temp_path, mime_type, data.get('content_hash')
+        ) or generated_metadata
+    except Exception as e:
+        logger.error(f"Tagging failed: {e}")
+    metrics.mark("gemini_analysis")
 
-    # 2. Deduplicate Tags
+    # 2. Canonicalize Tags
+    # Tags seen before resolve through the alias map; only new ones go to Gemini,
+    # against similar pool tags. Whole-pool merges run in deduplicate_tags.py.
     tags = generated_metadata.get("tags", [])
-    if deduplicator:
-        try:
-            # Get current pool
-            tag_pool = get_tag_pool() or []
-            
-            # Combine new tags with existing pool for holistic deduplication
-            all_tags_to_process = list(set(tags + tag_pool))
-            
-            # Run Deduplication
-            tag_mapping = deduplicator.deduplicate_and_map(all_tags_to_process)
-            
-            # Update Tag Pool
-            new_pool = sorted(list(set(tag_mapping.values())))
-            save_tag_pool(new_pool)
-            
-            # Update tags for the CURRENT file
-            final_current_tags = []
-            for t in tags:
-                final_current_tags.append(tag_mapping.get(t, t))
-            tags = sorted(list(set(final_current_tags)))
-            
-            # Update tags for ALL EXISTING files
-            # This ensures consistency across the entire database
-            all_files = get_candidate_files()
-            for f in all_files:
-                f_id = f.get('id')
-                f_tags = f.get('tags', [])
-                if not f_tags:
-                    continue
-                    
-                new_f_tags = []
-                changed = False
-                for t in f_tags:
-                    new_t = tag_mapping.get(t, t)
-                    new_f_tags.append(new_t)
-                    if new_t != t:
-                        changed = True
-                
-                if changed:
-                    new_f_tags = sorted(list(set(new_f_tags)))
-                    update_file_metadata(f_id, {'tags': new_f_tags})
-                    logger.info(f"Updated tags for file {f_id} during upload cleanup.")
-                    
-        except Exception as e:
-            logger.error(f"Error during tag deduplication/remapping: {e}")
-            # Fallback: just use generated tags
-            pass
+    try:
+        tag_pool = get_tag_pool() or []
+        tag_mapping, new_canonical = canonicalizer.canonicalize(tags, tag_pool)
+        tags = sorted(set(tag_mapping.values()))
+        metrics.mark("dedup_tags")
+        
+        # Update Tag Pool
+        if new_canonical:
+            add_to_tag_pool(new_canonical)
+    except Exception as e:
+        logger.error(f"Error during tag canonicalization: {e}")
+        # Fallback: just use generated tags
+        pass
+    metrics.mark("tag_pool_update")
         
     if not tags:
         tags = ["Uncategorized"]
@@ -374,53 +362,57 @@ def process_upload(event, line_bot_api, user_id, data):
     elif ai_title and ai_title != "Untitled":
          base_name = sanitize_filename(ai_title)
          
-    count = 0
-    while True:
-        candidate = f"{base_name}.{extension}" if count == 0 else f"{base_name}_{count}.{extension}"
-        if not check_filename_exists(candidate):
-            final_filename = candidate
-            break
-        count += 1
+    # Atomically claims base_name.ext or the next free _N suffix in the filename index
+    token = uuid.uuid4().hex
+    final_filename = reserve_filename(base_name, extension, token=token)
+    metrics.mark("filename_uniqueness")
         
-    # 4. Upload to Storage
-    blob_name = f"uploads/{user_id}/{final_filename}"
-    public_url = upload_file_to_storage(temp_path, blob_name)
-    
-    # 5. Save Metadata
-    # Get User Info
     try:
-        profile = line_bot_api.get_profile(user_id)
-        display_name = profile.display_name
-    except:
-        display_name = "Unknown User"
-        
-    # Get Group Info
-    group_id = None
-    group_name = None
-    if event.source.type == 'group':
-        group_id = event.source.group_id
+        # 4. Upload to Storage
+        blob_name = f"uploads/{user_id}/{final_filename}"
+        public_url = upload_file_to_storage(temp_path, blob_name)
+        metrics.mark("storage_upload")
+    
+        # 5. Save Metadata
+        # Get User Info
         try:
-            summary = line_bot_api.get_group_summary(group_id)
-            group_name = summary.group_name
+            profile = line_bot_api.get_profile(user_id)
+            display_name = profile.display_name
         except:
-            group_name = "Unknown Group"
+            display_name = "Unknown User"
+        
+        # Get Group Info
+        group_id = None
+        group_name = None
+        if event.source.type == 'group':
+            group_id = event.source.group_id
+            try:
+                summary = line_bot_api.get_group_summary(group_id)
+                group_name = summary.group_name
+            except:
+                group_name = "Unknown Group"
             
-    save_user(user_id, display_name, group_id, group_name)
+        save_user(user_id, display_name, group_id, group_name)
     
-    file_data = {
-        "filename": final_filename,
-        "file_type": extension,
-        "storage_path": blob_name,
-        "url": public_url,
-        "owner_id": user_id,
-        "group_id": group_id,
-        "tags": tags,
-        "version": "v1",
-        "detail_summary": generated_metadata.get("summary", ""),
-        "due_date_id": None
-    }
+        file_data = {
+            "filename": final_filename,
+            "file_type": extension,
+            "storage_path": blob_name,
+            "url": public_url,
+            "owner_id": user_id,
+            "group_id": group_id,
+            "tags": tags,
+            "version": "v1",
+            "detail_summary": generated_metadata.get("summary", ""),
+            "due_date_id": None
+        }
     
-    save_file_metadata(file_data)
+        save_file_metadata(file_data)
+    except Exception:
+        # Nothing was saved under the name: free it for other uploads
+        release_filename(final_filename, token)
+        raise
+    metrics.mark("metadata_write")
     
     # Cleanup
     if os.path.exists(temp_path):
@@ -488,4 +480,7 @@ def process_upload(event, line_bot_api, user_id, data):
             }
         }
     )
-    line_bot_api.reply_message(event.reply_token, flex_message)
+    # Pushed rather than replied: events are handled off the webhook request and
+    # analysis can outlive the reply token
+    line_bot_api.push_message(chat_id(event), flex_message)
+    metrics.mark("reply")
@@ -0,0 +1,57 @@
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+# SQLite file used when STORAGE_BACKEND=sqlite (any SQLAlchemy URL works)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./find_dee.db")
+
+Base = declarative_base()
+engine = None
+SessionLocal = sessionmaker(expire_on_commit=False)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a write is in progress
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def configure_engine(url=None):
+    """(Re)creates the engine and binds SessionLocal to it. Returns the engine."""
+    global engine
+    url = url or DATABASE_URL
+    connect_args = {}
+    if url.startswith("sqlite"):
+        # Sessions are used from FastAPI worker threads
+        connect_args["check_same_thread"] = False
+    engine = create_engine(url, connect_args=connect_args)
+    if url.startswith("sqlite"):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    SessionLocal.configure(bind=engine)
+    return engine
+
+def init_db(url=None):
+    """Creates the engine (if needed) and all tables/indexes defined in models.py."""
+    import models  # noqa: F401 (registers the tables on Base)
+    if engine is None or url:
+        configure_engine(url)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+@contextmanager
+def session_scope():
+    """Session that commits on success and rolls back on error."""
+    if engine is None:
+        init_db()
+    session = SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -2,8 +2,14 @@ import os
 import firebase_admin
 from firebase_admin import credentials, db
 from search.deduplicator import TagDeduplicator
-from firebase_config import initialize_firebase, get_tag_pool, save_tag_pool, get_candidate_files, update_file_metadata
+from firebase_config import (
+    initialize_firebase, get_tag_pool, save_tag_pool, get_all_used_tags, remap_file_tags,
+    get_all_tag_aliases, save_tag_aliases
+)
 
+# Periodic reconcile job for the tag pool. Uploads only canonicalize tags they have
+# not seen before (search/canonicalizer.py); merging canonical tags with each other
+# across the whole pool happens here. Run it from cron / Cloud Scheduler.
 def deduplicate_tags_script():
     # 1. Initialize Firebase
     app = initialize_firebase()
@@ -23,18 +29,17 @@ def deduplicate_tags_script():
     print("TagDeduplicator initialized.")
 
     # 3. Fetch Data
-    print("Fetching files and tag pool...")
-    files = get_candidate_files()
+    # Tags in use come from the tag index; no need to download every file record
+    print("Fetching tags in use and tag pool...")
+    used_tags = get_all_used_tags()
     tag_pool = get_tag_pool() or []
     
-    print(f"Found {len(files)} files.")
+    print(f"Found {len(used_tags)} tags in use.")
     print(f"Current tag pool size: {len(tag_pool)}")
 
     # 4. Collect all unique tags
     all_tags = set(tag_pool)
-    for file in files:
-        if 'tags' in file and isinstance(file['tags'], list):
-            all_tags.update(file['tags'])
+    all_tags.update(used_tags)
             
     all_tags_list = list(all_tags)
     print(f"Total unique tags to process: {len(all_tags_list)}")
@@ -56,31 +61,20 @@ def deduplicate_tags_script():
     save_tag_pool(new_tag_pool)
     print("Tag pool updated.")
 
-    # 7. Update Files
+    # 7. Update Alias Map
+    # Every raw tag now maps to its canonical tag; aliases pointing at a merged tag follow it
+    aliases = get_all_tag_aliases()
+    alias_updates = dict(tag_mapping)
+    for alias, canonical in aliases.items():
+        if tag_mapping.get(canonical, canonical) != canonical:
+            alias_updates[alias] = tag_mapping[canonical]
+    save_tag_aliases(alias_updates)
+    print(f"Alias map updated ({len(alias_updates)} entries).")
+
+    # 8. Update Files
+    # Only files carrying a remapped tag are touched, in batched multi-path writes
     print("Updating file tags...")
-    updated_count = 0
-    for file in files:
-        file_id = file.get('id')
-        original_tags = file.get('tags', [])
-        
-        if not original_tags:
-            continue
-            
-        new_tags = []
-        for tag in original_tags:
-            if tag in tag_mapping:
-                new_tags.append(tag_mapping[tag])
-            else:
-                # Should not happen if logic is correct, but keep original if missing
-                new_tags.append(tag)
-        
-        # Deduplicate tags within the file itself
-        new_tags = sorted(list(set(new_tags)))
-        
-        if new_tags != sorted(original_tags):
-            update_file_metadata(file_id, {'tags': new_tags})
-            updated_count += 1
-            print(f"Updated file {file_id}: {original_tags} -> {new_tags}")
+    updated_count = remap_file_tags(tag_mapping)
             
     print(f"Finished. Updated {updated_count} files.")
 
@@ -1,12 +1,22 @@
 import firebase_admin
 from firebase_admin import credentials, storage, db
 import os
+import contextvars
 import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
 
 import base64
 import json
 import tempfile
 
+import metrics
+from replica import RtdbReplica
+
 # Path to the service account key file
 SERVICE_ACCOUNT_KEY_PATH = "serviceAccountKey.json"
 
@@ -54,12 +64,244 @@ def initialize_firebase():
         print(f"Failed to initialize Firebase: {e}")
         return None
 
+class _CountingQuery:
+    """Query wrapper that counts get() as a read for metrics."""
+    def __init__(self, query):
+        self._query = query
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if name in ('order_by_child', 'order_by_key', 'order_by_value', 'equal_to',
+                    'start_at', 'end_at', 'limit_to_first', 'limit_to_last'):
+            return lambda *args, **kwargs: _CountingQuery(attr(*args, **kwargs))
+        return attr
+
+    def get(self, *args, **kwargs):
+        metrics.count(metrics.FIREBASE_READ)
+        return self._query.get(*args, **kwargs)
+
+class _CountingRef:
+    """db.Reference wrapper that counts RTDB reads and writes for metrics."""
+    def __init__(self, ref):
+        self._ref = ref
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+    def get(self, *args, **kwargs):
+        metrics.count(metrics.FIREBASE_READ)
+        return self._ref.get(*args, **kwargs)
+
+    def set(self, value):
+        metrics.count(metrics.FIREBASE_WRITE)
+        return _mirrored(self._ref.path, lambda: self._ref.set(value), value)
+
+    def update(self, value):
+        metrics.count(metrics.FIREBASE_WRITE)
+        return _mirrored(self._ref.path, lambda: self._ref.update(value), value, merge=True)
+
+    def delete(self):
+        metrics.count(metrics.FIREBASE_WRITE)
+        return _mirrored(self._ref.path, self._ref.delete)
+
+    def push(self, *args, **kwargs):
+        metrics.count(metrics.FIREBASE_WRITE)
+        pushed = self._ref.push(*args, **kwargs)
+        value = args[0] if args else kwargs.get('value')
+        if value and _replica is not None:
+            _replica.finish_write(pushed.path, value)
+        return _CountingRef(pushed)
+
+    def transaction(self, update):
+        metrics.count(metrics.FIREBASE_READ)
+        metrics.count(metrics.FIREBASE_WRITE)
+        return _mirrored(self._ref.path, lambda: self._ref.transaction(update), value_from_result=True)
+
+    def child(self, path):
+        return _CountingRef(self._ref.child(path))
+
+    def order_by_child(self, path):
+        return _CountingQuery(self._ref.order_by_child(path))
+
+def _ref(path='/'):
+    return _CountingRef(db.reference(path))
+
+# Optional local replica of files/, users/, tags/ and collections/ (RTDB_REPLICA=1),
+# fed by listen() streams. Started by start_replica(); reads of mirrored data are
+# served from memory once the root's initial snapshot has loaded.
+REPLICA_ENABLED = os.getenv("RTDB_REPLICA", "0") == "1"
+REPLICA_ECHO_TIMEOUT = float(os.getenv("REPLICA_ECHO_TIMEOUT", "30"))
+_replica = None
+
+def start_replica():
+    """Subscribes the local replica to RTDB. Reads switch to it root by root as snapshots load."""
+    global _replica
+    if _replica is None:
+        replica = RtdbReplica(echo_timeout=REPLICA_ECHO_TIMEOUT)
+        _replica = replica
+        replica.start(db.reference)
+    return _replica
+
+def stop_replica():
+    global _replica
+    replica, _replica = _replica, None
+    if replica is not None:
+        replica.stop()
+
+def _replica_for(root):
+    replica = _replica
+    return replica if replica is not None and replica.ready(root) else None
+
+def _mirrored(path, write, value=None, merge=False, value_from_result=False):
+    """Runs an RTDB write and applies it to the local replica (if any) once acknowledged."""
+    replica = _replica
+    if replica is None:
+        return write()
+    token = replica.begin_write(path, value, merge)
+    try:
+        result = write()
+    except Exception:
+        replica.cancel_write(token)
+        raise
+    replica.finish_write(path, result if value_from_result else value, merge)
+    return result
+
+REPLICA_COUNTERS = ('events', 'local_reads', 'echo_timeouts')
+
+def _replica_metrics():
+    if _replica is None:
+        return []
+    stats = _replica.stats()
+    lines = []
+    for stat in REPLICA_COUNTERS:
+        lines += metrics.counter_lines(f"find_dee_replica_{stat}", f"Local RTDB replica: {stat.replace('_', ' ')} since start.",
+                                       {(): stats.pop(stat)})
+    return lines + metrics.gauge_lines("find_dee_replica", "Local RTDB replica: loaded roots, pending echoes and the echo lag of this instance's writes.",
+                                       {(stat,): value for stat, value in stats.items()}, ("stat",))
+
+metrics.register_collector(_replica_metrics)
+
 def get_db_ref(path='/'):
-    return db.reference(path)
+    return _ref(path)
+
+# Callbacks fired after file metadata changes (e.g. the in-memory tag index)
+# Signature: callback(event, file_id, file_data) with event in 'saved' | 'updated' | 'deleted'
+_file_listeners = []
+
+def add_file_listener(callback):
+    """Registers a callback invoked after save/update/delete of file metadata."""
+    _file_listeners.append(callback)
+
+def _notify_file_listeners(event, file_id, file_data):
+    for callback in _file_listeners:
+        try:
+            callback(event, file_id, file_data)
+        except Exception as e:
+            print(f"Error in file listener: {e}")
+
+# Read-through cache for hot, rarely written reads (tag pool, user profiles, the
+# user name map). Entries expire after a per-namespace TTL, which bounds how long
+# writes made by other instances stay invisible; writes made here invalidate at once.
+def _detached(value):
+    """Copy of a JSON-like value, so callers mutating a result do not alter the cached one."""
+    if isinstance(value, dict):
+        return {k: _detached(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_detached(v) for v in value]
+    return value
+
+class _ReadCache:
+    """Size-bounded LRU of loaded values with a TTL per namespace and hit/miss counts."""
+    def __init__(self, max_size, ttls):
+        self.max_size = max_size
+        self.ttls = ttls
+        self._entries = OrderedDict() # (namespace, key) -> (expires_at, value)
+        self._generations = {}        # namespace -> bumped by every invalidation
+        self._lock = threading.Lock()
+        self.hits = dict.fromkeys(ttls, 0)
+        self.misses = dict.fromkeys(ttls, 0)
+
+    def get_or_load(self, namespace, key, loader):
+        """Returns a copy of the cached value, or loader() (cached unless invalidated meanwhile)."""
+        entry_key = (namespace, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(entry_key)
+                self.hits[namespace] += 1
+                return _detached(entry[1])
+            self.misses[namespace] += 1
+            generation = self._generations.get(namespace, 0)
+        value = loader()
+        if self.max_size <= 0 or self.ttls[namespace] <= 0:
+            return value
+        with self._lock:
+            # A write during the load may have made this value stale; do not keep it
+            if self._generations.get(namespace, 0) == generation:
+                self._entries[entry_key] = (time.monotonic() + self.ttls[namespace], _detached(value))
+                self._entries.move_to_end(entry_key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, namespace, key=None):
+        """Drops one entry, or the whole namespace when key is None."""
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            if key is None:
+                for entry_key in [k for k in self._entries if k[0] == namespace]:
+                    del self._entries[entry_key]
+            else:
+                self._entries.pop((namespace, key), None)
+
+    def clear(self):
+        with self._lock:
+            for namespace in self.ttls:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            self._entries.clear()
+
+    def stats(self):
+        """{namespace: {'size', 'hits', 'misses', 'hit_ratio'}}."""
+        with self._lock:
+            sizes = dict.fromkeys(self.ttls, 0)
+            for namespace, _ in self._entries:
+                sizes[namespace] += 1
+            result = {}
+            for namespace in self.ttls:
+                lookups = self.hits[namespace] + self.misses[namespace]
+                result[namespace] = {
+                    'size': sizes[namespace], 'hits': self.hits[namespace], 'misses': self.misses[namespace],
+                    'hit_ratio': self.hits[namespace] / lookups if lookups else 0.0,
+                }
+            return result
+
+read_cache = _ReadCache(
+    max_size=int(os.getenv("READ_CACHE_SIZE", "4096")), # 0 disables the cache
+    ttls={
+        'tag_pool': float(os.getenv("TAG_POOL_CACHE_TTL", "30")),
+        'user': float(os.getenv("USER_CACHE_TTL", "60")),
+        'user_name': float(os.getenv("USER_CACHE_TTL", "60")),
+        'users_map': float(os.getenv("USERS_MAP_CACHE_TTL", "300")),
+    }
+)
+
+def _read_cache_metrics():
+    stats = read_cache.stats()
+    lookups = {(namespace, result): values[key] for namespace, values in stats.items()
+               for result, key in (('hit', 'hits'), ('miss', 'misses'))}
+    gauges = {(namespace, stat): values[stat] for namespace, values in stats.items() for stat in ('size', 'hit_ratio')}
+    return (
+        metrics.counter_lines("find_dee_read_cache_lookups", "Read-through cache of hot RTDB reads: lookups by result (hit, miss).",
+                              lookups, ("cache", "result"))
+        + metrics.gauge_lines("find_dee_read_cache", "Read-through cache of hot RTDB reads: entries and hit ratio.",
+                              gauges, ("cache", "stat"))
+    )
+
+metrics.register_collector(_read_cache_metrics)
 
 def save_user(line_user_id, display_name, group_id=None, group_name=None):
     """Saves or updates user info and tracks group membership."""
-    ref = db.reference(f'users/{line_user_id}')
+    ref = _ref(f'users/{line_user_id}')
     
     # We only update basic info here. 
     # Lists like files_owned should be updated via specific operations, 
@@ -79,7 +321,7 @@ def save_user(line_user_id, display_name, group_id=None, group_name=None):
         }
         if group_id:
             initial_data['groups'][group_id] = group_name or "Unknown Group"
-        ref.set(initial_data)
+        paths = {f'users/{line_user_id}': initial_data}
     else:
         updates = {
             'display_name': display_name,
@@ -87,7 +329,13 @@ def save_user(line_user_id, display_name, group_id=None, group_name=None):
         }
         if group_id:
             updates[f'groups/{group_id}'] = group_name or "Unknown Group"
-        ref.update(updates)
+        paths = {f'users/{line_user_id}/{k}': v for k, v in updates.items()}
+    # The name directory changes in the same multi-path write
+    paths[f'user_directory/{line_user_id}'] = display_name or 'Unknown User'
+    _ref().update(paths)
+    read_cache.invalidate('user', line_user_id)
+    read_cache.invalidate('user_name', line_user_id)
+    read_cache.invalidate('users_map')
 
 def upload_file_to_storage(file_path, destination_blob_name):
     """Uploads a file to the bucket."""
@@ -110,6 +358,29 @@ def upload_bytes_to_storage(file_bytes, destination_blob_name, content_type):
     url = blob.generate_signed_url(datetime.timedelta(days=7), method='GET')
     return url
 
+# Streamed uploads larger than this go to Cloud Storage as a resumable upload,
+# sent in chunks of this size (a multiple of 256 KiB); a failed chunk is retried
+# from the last committed offset instead of restarting the whole file.
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+def upload_stream_to_storage(file_obj, destination_blob_name, content_type, size=None):
+    """Uploads a file object to the bucket without reading it into memory (for API uploads)."""
+    bucket = storage.bucket()
+    resumable = size is None or size > STORAGE_CHUNK_SIZE
+    blob = bucket.blob(destination_blob_name, chunk_size=STORAGE_CHUNK_SIZE if resumable else None)
+    # if_generation_match=0: the path is new, which also makes retries of the upload safe
+    blob.upload_from_file(file_obj, content_type=content_type, size=size, if_generation_match=0)
+    
+    # Generate signed URL
+    url = blob.generate_signed_url(datetime.timedelta(days=7), method='GET')
+    return url
+
+def download_from_storage(storage_path, destination_path):
+    """Downloads a blob to a local file (queued upload analyses read their file back from Storage)."""
+    blob = storage.bucket().blob(storage_path)
+    blob.download_to_filename(destination_path)
+    return destination_path
+
 def save_file_metadata(file_data):
     """
     Saves file metadata.
@@ -119,37 +390,59 @@ def save_file_metadata(file_data):
     - tags (list)
     - detail_summary, version, due_date_id (optional)
     """
-    files_ref = db.reference('files')
+    files_ref = _ref('files')
     new_file_ref = files_ref.push() # Generate unique ID
     file_id = new_file_ref.key
     
     file_data['upload_date'] = str(datetime.datetime.utcnow())
     new_file_ref.set(file_data)
     
-    # Update User's files_owned
-    owner_ref = db.reference(f'users/{file_data["owner_id"]}/files_owned')
+    # Update User's files_owned, the filename index and the tag index in one multi-path write
     # Firebase lists are weird, often easier to use push() or a dict with keys
     # For simplicity in prototype, we'll use a dict where key is file_id
-    owner_ref.update({file_id: True})
+    updates = {f'users/{file_data["owner_id"]}/files_owned/{file_id}': True,
+               f'file_index/{file_id}': _listing_entry(file_data)}
+    if file_data.get('filename'):
+        updates[f'filenames/{_encode_key(file_data["filename"])}'] = file_id
+    updates.update(_tag_index_updates(file_id, [], file_data.get('tags')))
+    _ref().update(updates)
+    read_cache.invalidate('user', file_data["owner_id"])
     
+    _notify_file_listeners('saved', file_id, file_data)
     return file_id
 
 def update_file_metadata(file_id, updates):
     """Updates specific fields of a file."""
-    ref = db.reference(f'files/{file_id}')
+    ref = _ref(f'files/{file_id}')
     # Only allow updating specific fields to prevent overwriting critical data
-    allowed_fields = ['filename', 'tags', 'description', 'detail_summary']
+    allowed_fields = ['filename', 'tags', 'description', 'detail_summary', 'title',
+                      'analysis_status', 'analysis_updated_at']
     safe_updates = {k: v for k, v in updates.items() if k in allowed_fields}
     
     if safe_updates:
         safe_updates['updated_at'] = str(datetime.datetime.utcnow())
-        ref.update(safe_updates)
+        if 'filename' in safe_updates or 'tags' in safe_updates:
+            # Renames and tag changes move their index entries in the same multi-path write
+            paths = {f'files/{file_id}/{k}': v for k, v in safe_updates.items()}
+            paths.update({f'file_index/{file_id}/{k}': v for k, v in safe_updates.items() if k in LISTING_FIELDS})
+            if 'filename' in safe_updates:
+                old_filename = _ref(f'files/{file_id}/filename').get()
+                paths[f'filenames/{_encode_key(safe_updates["filename"])}'] = file_id
+                if old_filename and old_filename != safe_updates['filename']:
+                    paths[f'filenames/{_encode_key(old_filename)}'] = None
+            if 'tags' in safe_updates:
+                old_tags = _ref(f'files/{file_id}/tags').get()
+                paths.update(_tag_index_updates(file_id, old_tags, safe_updates['tags']))
+            _ref().update(paths)
+        else:
+            ref.update(safe_updates)
+        _notify_file_listeners('updated', file_id, safe_updates)
         return True
     return False
 
 def delete_file(file_id):
     """Deletes a file from DB and Storage."""
-    file_ref = db.reference(f'files/{file_id}')
+    file_ref = _ref(f'files/{file_id}')
     file_data = file_ref.get()
     
     if not file_data:
@@ -177,48 +470,192 @@ def delete_file(file_id):
                 print(f"Error deleting from storage: {e}")
                 # Continue to delete metadata even if storage delete fails
             
-    # 2. Remove from User's files_owned
+    # 2. Remove from User's files_owned, the tag index and the filename index
+    paths = _tag_index_updates(file_id, file_data.get('tags'), [])
+    paths[f'file_index/{file_id}'] = None
     if 'owner_id' in file_data:
-        owner_ref = db.reference(f'users/{file_data["owner_id"]}/files_owned/{file_id}')
-        owner_ref.delete()
+        paths[f'users/{file_data["owner_id"]}/files_owned/{file_id}'] = None
+    if paths:
+        _ref().update(paths)
+    if 'owner_id' in file_data:
+        read_cache.invalidate('user', file_data['owner_id'])
+    if file_data.get('filename'):
+        name_ref = _ref(f'filenames/{_encode_key(file_data["filename"])}')
+        name_ref.transaction(lambda current: None if current == file_id else current)
         
     # 3. Delete Metadata
     file_ref.delete()
+    _notify_file_listeners('deleted', file_id, file_data)
     return True
 
+# Dates carry two derived children for ordered range queries (".indexOn" on
+# dates/ in the database rules): date_key, the record's 'date' or 'date_time',
+# and owner_date, "{owner_id}|{date_key}" for one user's dates in date order.
+DATE_INDEX_FIELDS = ('date_key', 'owner_date')
+
+def _date_index_fields(date_data):
+    date_key = date_data.get('date') or date_data.get('date_time') or None
+    owner_id = date_data.get('owner_id')
+    return {
+        'date_key': date_key,
+        'owner_date': f"{owner_id}|{date_key}" if owner_id and date_key else None,
+    }
+
+def _date_items(snapshot):
+    """Date records of a dates/ snapshot or query result, with 'id' and without the index fields."""
+    items = []
+    if isinstance(snapshot, list):
+        entries = [(str(i), val) for i, val in enumerate(snapshot)]
+    elif isinstance(snapshot, dict):
+        entries = snapshot.items()
+    else:
+        return items
+    for key, val in entries:
+        if not isinstance(val, dict):
+            continue
+        for field in DATE_INDEX_FIELDS:
+            val.pop(field, None)
+        val['id'] = key
+        items.append(val)
+    return items
+
+def _sort_by_date(items):
+    items.sort(key=lambda x: x.get('date') or x.get('date_time') or "")
+    return items
+
 def save_date(date_data):
     """
     Saves due date info.
     date_data: due_date, title, description, tags, file_id (optional)
     """
-    dates_ref = db.reference('dates')
+    dates_ref = _ref('dates')
     new_date_ref = dates_ref.push()
     date_id = new_date_ref.key
     
-    new_date_ref.set(date_data)
+    record = {k: v for k, v in date_data.items() if k not in DATE_INDEX_FIELDS}
+    record.update({k: v for k, v in _date_index_fields(record).items() if v is not None})
+    new_date_ref.set(record)
     return date_id
 
+# Upload analyses not finished yet. A record stays in these states only while some
+# instance holds its job; main.recover_analyses re-queues the ones whose job was lost.
+ANALYSIS_PENDING_STATES = ('queued', 'running')
+
+def get_pending_analyses():
+    """File records (with 'id') whose analysis is queued or running, via ordered analysis_status queries."""
+    files = []
+    for state in ANALYSIS_PENDING_STATES:
+        snapshot = _ref('files').order_by_child('analysis_status').equal_to(state).get() or {}
+        files += [{**val, 'id': file_id} for file_id, val in snapshot.items() if isinstance(val, dict)]
+    return files
+
+def claim_stale_analysis(file_id, stale_before):
+    """
+    Atomically takes over the analysis of a file that has been queued or running
+    since before stale_before (epoch seconds): marks it queued again and counts
+    the attempt. Returns the claimed record (with 'id'), or None if the analysis
+    moved on or another instance claimed it first.
+    """
+    token = uuid.uuid4().hex
+    def claim(record):
+        if (not isinstance(record, dict) or record.get('analysis_status') not in ANALYSIS_PENDING_STATES
+                or record.get('analysis_updated_at', 0) >= stale_before):
+            return record
+        return {**record, 'analysis_status': 'queued', 'analysis_updated_at': time.time(),
+                'analysis_attempts': record.get('analysis_attempts', 0) + 1, 'analysis_claim': token}
+    record = _ref(f'files/{file_id}').transaction(claim)
+    if not isinstance(record, dict) or record.get('analysis_claim') != token:
+        return None
+    record['id'] = file_id
+    return record
+
+def get_file_metadata(file_id):
+    """Retrieves a single file record (with 'id'), or None if it does not exist."""
+    replica = _replica_for('files')
+    file_data = replica.get(f'files/{file_id}') if replica else _ref(f'files/{file_id}').get()
+    if not file_data:
+        return None
+    file_data['id'] = file_id
+    # Backfill URL for legacy files
+    if 'url' not in file_data and 'storage_path' in file_data and file_data['storage_path'].startswith('http'):
+        file_data['url'] = file_data['storage_path']
+    return file_data
+
 def get_user_profile(line_user_id):
     """Retrieves user profile including groups."""
-    ref = db.reference(f'users/{line_user_id}')
-    return ref.get()
+    replica = _replica_for('users')
+    if replica:
+        return replica.get(f'users/{line_user_id}')
+    return read_cache.get_or_load('user', line_user_id, lambda: _ref(f'users/{line_user_id}').get())
 
 def get_all_users_map():
     """Retrieves a map of user_id -> display_name for all users."""
-    ref = db.reference('users')
-    snapshot = ref.get()
-    
-    user_map = {}
-    if snapshot:
-        for key, val in snapshot.items():
-            if isinstance(val, dict):
-                user_map[key] = val.get('display_name', 'Unknown User')
-    return user_map
-
-def get_files_by_user(line_user_id):
-    """Retrieves files uploaded by a specific user."""
-    files_ref = db.reference('files')
-    snapshot = files_ref.order_by_child('owner_id').equal_to(line_user_id).get()
+    replica = _replica_for('users')
+    if replica:
+        return replica.project('users', 'display_name', 'Unknown User')
+    _ensure_index('user_directory', rebuild_user_directory)
+    return read_cache.get_or_load('users_map', None, lambda: _ref('user_directory').get() or {})
+
+# user_directory/{user id} = display name: the names alone, so resolving owners
+# does not download user records (groups, files_owned). Written by save_user.
+NAME_FETCH_CONCURRENCY = int(os.getenv("NAME_FETCH_CONCURRENCY", "8"))
+NAME_DIRECTORY_READ_MIN = int(os.getenv("NAME_DIRECTORY_READ_MIN", "64")) # read the directory once above this many
+_name_executor = None
+_name_executor_lock = threading.Lock()
+
+def rebuild_user_directory():
+    """Builds user_directory/ from a full scan of users/ (one-time migration)."""
+    snapshot = _ref('users').get() or {}
+    names = {user_id: val.get('display_name') or 'Unknown User'
+             for user_id, val in snapshot.items() if isinstance(val, dict)}
+    if names:
+        _ref('user_directory').update(names)
+    _ref('meta/user_directory').set(str(datetime.datetime.utcnow()))
+    return len(names)
+
+def get_user_names(user_ids):
+    """
+    Display names for the given user ids ({user_id: name}; unknown ids are left out).
+    One cached read of user_directory/{id} per id, run NAME_FETCH_CONCURRENCY at a time;
+    from NAME_DIRECTORY_READ_MIN ids on, one (cached) read of the whole directory instead.
+    """
+    user_ids = [uid for uid in dict.fromkeys(user_ids) if isinstance(uid, str) and uid]
+    if not user_ids:
+        return {}
+    replica = _replica_for('users')
+    if replica:
+        names = {uid: replica.get(f'users/{uid}/display_name') for uid in user_ids}
+        return {uid: name for uid, name in names.items() if name}
+
+    _ensure_index('user_directory', rebuild_user_directory)
+    if len(user_ids) >= NAME_DIRECTORY_READ_MIN:
+        directory = get_all_users_map()
+        return {uid: directory[uid] for uid in user_ids if uid in directory}
+
+    def load(uid):
+        return read_cache.get_or_load('user_name', uid, lambda: _ref(f'user_directory/{uid}').get())
+
+    if len(user_ids) == 1 or NAME_FETCH_CONCURRENCY <= 1:
+        names = [load(uid) for uid in user_ids]
+    else:
+        global _name_executor
+        with _name_executor_lock:
+            if _name_executor is None:
+                _name_executor = ThreadPoolExecutor(max_workers=NAME_FETCH_CONCURRENCY, thread_name_prefix="names")
+        # Copied contexts keep the reads attributed to the calling request in metrics
+        futures = [_name_executor.submit(contextvars.copy_context().run, load, uid) for uid in user_ids]
+        names = [f.result() for f in futures]
+    return {uid: name for uid, name in zip(user_ids, names) if name}
+
+def get_files_by_user(line_user_id, projected=False):
+    """Retrieves files uploaded by a specific user (only the LISTING_FIELDS of each if projected)."""
+    if projected:
+        return _file_listing('owner_id', line_user_id)
+    replica = _replica_for('files')
+    if replica:
+        snapshot = replica.query('files', 'owner_id', line_user_id)
+    else:
+        snapshot = _ref('files').order_by_child('owner_id').equal_to(line_user_id).get()
     
     files = []
     if snapshot:
@@ -240,10 +677,15 @@ def get_files_by_user(line_user_id):
             files.append(val)
     return files
 
-def get_files_by_group(group_id):
-    """Retrieves files shared in a specific group."""
-    files_ref = db.reference('files')
-    snapshot = files_ref.order_by_child('group_id').equal_to(group_id).get()
+def get_files_by_group(group_id, projected=False):
+    """Retrieves files shared in a specific group (only the LISTING_FIELDS of each if projected)."""
+    if projected:
+        return _file_listing('group_id', group_id)
+    replica = _replica_for('files')
+    if replica:
+        snapshot = replica.query('files', 'group_id', group_id)
+    else:
+        snapshot = _ref('files').order_by_child('group_id').equal_to(group_id).get()
     
     files = []
     if snapshot:
@@ -268,39 +710,30 @@ def get_files_by_group(group_id):
 def get_dates_by_user(line_user_id):
     """Retrieves dates/tasks for a specific user."""
     try:
-        dates_ref = db.reference('dates')
-        snapshot = dates_ref.get()
-        
-        dates = []
-        if snapshot:
-            if isinstance(snapshot, list):
-                # Handle list case (rare but possible if keys are integers)
-                for i, val in enumerate(snapshot):
-                    if val and val.get('owner_id') == line_user_id:
-                        val['id'] = str(i)
-                        dates.append(val)
-            elif isinstance(snapshot, dict):
-                for key, val in snapshot.items():
-                    if val.get('owner_id') == line_user_id:
-                        val['id'] = key
-                        dates.append(val)
-        return dates
+        snapshot = _ref('dates').order_by_child('owner_id').equal_to(line_user_id).get()
+        # Push ids sort by creation time
+        return sorted(_date_items(snapshot), key=lambda d: d['id'])
     except Exception as e:
         print(f"Error in get_dates_by_user: {e}")
         return []
 
 def update_date(date_id, updates):
     """Updates a date/task."""
-    ref = db.reference(f'dates/{date_id}')
-    if ref.get():
-        ref.update(updates)
-        return True
-    return False
+    ref = _ref(f'dates/{date_id}')
+    current = ref.get()
+    if not current:
+        return False
+    updates = {k: v for k, v in updates.items() if k not in DATE_INDEX_FIELDS}
+    if {'date', 'date_time', 'owner_id'} & set(updates):
+        # None removes an index field whose source is gone
+        updates.update(_date_index_fields({**current, **updates}))
+    ref.update(updates)
+    return True
 
 def delete_date(date_id):
     """Deletes a date/task."""
-    ref = db.reference(f'dates/{date_id}')
-    if ref.get():
+    ref = _ref(f'dates/{date_id}')
+    if ref.get(shallow=True):
         ref.delete()
         return True
     return False
@@ -314,7 +747,7 @@ def search_files_by_tags(query_tags, group_id=None, user_id=None):
     if not query_tags:
         return []
         
-    files_ref = db.reference('files')
+    files_ref = _ref('files')
     
     # Optimization: If group_id is provided, we could query by group_id first
     # But for prototype with small data, getting all and filtering is fine.
@@ -371,8 +804,15 @@ def get_candidate_files(group_id=None, user_id=None):
     """
     Retrieves all files accessible to the user/group without tag filtering.
     """
-    files_ref = db.reference('files')
-    snapshot = files_ref.get()
+    replica = _replica_for('files')
+    if replica is None:
+        snapshot = _ref('files').get()
+    elif group_id:
+        snapshot = replica.query('files', 'group_id', group_id)
+    elif user_id:
+        snapshot = replica.query('files', 'owner_id', user_id)
+    else:
+        snapshot = replica.get('files')
     
     candidate_files = []
     if snapshot:
@@ -407,164 +847,355 @@ def get_candidate_files(group_id=None, user_id=None):
             
     return candidate_files
 
+# Callbacks fired after the tag pool is rewritten (e.g. query-tag cache invalidation)
+_tag_pool_listeners = []
+
+def add_tag_pool_listener(callback):
+    """Registers a callback invoked with the new pool whenever save_tag_pool writes."""
+    _tag_pool_listeners.append(callback)
+
+def _notify_tag_pool_listeners(tags):
+    for callback in _tag_pool_listeners:
+        try:
+            callback(tags)
+        except Exception as e:
+            print(f"Error in tag pool listener: {e}")
+
 def get_tag_pool():
     """Retrieves the global tag pool."""
-    ref = db.reference('tags/all')
-    tags = ref.get()
-    if not tags:
-        return []
-    return tags
+    replica = _replica_for('tags')
+    if replica:
+        return replica.get('tags/all') or []
+    return read_cache.get_or_load('tag_pool', None, lambda: _ref('tags/all').get() or [])
 
 def save_tag_pool(tags):
     """Saves the global tag pool."""
-    ref = db.reference('tags/all')
+    ref = _ref('tags/all')
     ref.set(tags)
+    read_cache.invalidate('tag_pool')
+    _notify_tag_pool_listeners(tags)
     return True
 
-def check_filename_exists(filename):
-    """Checks if a filename already exists in the database."""
-    files_ref = db.reference('files')
-    snapshot = files_ref.get()
-    
-    if not snapshot:
+def add_to_tag_pool(new_tags):
+    """Appends tags missing from the global tag pool (transaction, so concurrent uploads do not drop each other's tags)."""
+    def append(current):
+        pool = list(current or [])
+        present = set(pool)
+        return pool + [t for t in dict.fromkeys(new_tags) if t not in present]
+
+    tags = _ref('tags/all').transaction(append)
+    read_cache.invalidate('tag_pool')
+    _notify_tag_pool_listeners(tags)
+    return True
+
+def _alias_key(tag):
+    # Case/whitespace variants of a raw tag share one alias entry
+    return _encode_key(" ".join(tag.casefold().split()))
+
+def get_tag_aliases(tags):
+    """Looks up canonical tags for raw tags in the alias map (tag_aliases/). Returns {tag: canonical} for known tags."""
+    aliases = {}
+    for tag in tags:
+        canonical = _ref(f'tag_aliases/{_alias_key(tag)}').get()
+        if canonical:
+            aliases[tag] = canonical
+    return aliases
+
+def save_tag_aliases(mapping):
+    """Records raw tag -> canonical tag entries in the alias map (one multi-path write)."""
+    if mapping:
+        _ref('tag_aliases').update({_alias_key(tag): canonical for tag, canonical in mapping.items()})
+    return True
+
+def get_all_tag_aliases():
+    """The whole alias map {alias key: canonical} (for the reconcile job)."""
+    return {unquote(key): canonical for key, canonical in (_ref('tag_aliases').get() or {}).items()}
+
+def get_analysis_cache(content_hash):
+    """Retrieves cached AI metadata (tags, title, summary, suggested_filename) for a file's SHA-256."""
+    return _ref(f'analysis_cache/{content_hash}').get()
+
+def save_analysis_cache(content_hash, metadata):
+    """Stores AI metadata for a file's SHA-256 so identical re-uploads skip Gemini."""
+    entry = dict(metadata)
+    entry['created_at'] = str(datetime.datetime.utcnow())
+    _ref(f'analysis_cache/{content_hash}').set(entry)
+    return True
+
+# Filename index: filenames/{encoded name} -> file id (or a reservation token while
+# an upload that claimed the name is in flight). Kept by save/update/delete of file
+# metadata; backfilled from files/ once per database (see _ensure_index).
+
+def _encode_key(value):
+    """RTDB key for a filename or tag ('.', '$', '#', '[', ']', '/', '%' and control characters percent-encoded)."""
+    return ''.join(f'%{ord(c):02X}' if c in '.$#[]/%' or ord(c) < 32 or ord(c) == 127 else c for c in value)
+
+# Indexes derived from files/ that have been backfilled (checked once per process;
+# meta/{name} marks a database as backfilled)
+_ready_indexes = set()
+_index_lock = threading.Lock()
+
+def _ensure_index(name, rebuild):
+    if name in _ready_indexes:
+        return
+    with _index_lock:
+        if name not in _ready_indexes:
+            if not _ref(f'meta/{name}').get():
+                rebuild()
+            _ready_indexes.add(name)
+
+def rebuild_filename_index():
+    """Rebuilds filenames/ from a full scan of files/ (one-time migration). Existing reservations are kept."""
+    snapshot = _ref('files').get() or {}
+    index = {}
+    for file_id, val in snapshot.items():
+        if isinstance(val, dict) and val.get('filename'):
+            index[_encode_key(val['filename'])] = file_id
+    if index:
+        _ref('filenames').update(index)
+    _ref('meta/filename_index').set(str(datetime.datetime.utcnow()))
+    return len(index)
+
+# Tag index: tag_files/{encoded tag}/{file id} = true, so a tag remap only touches
+# the files carrying the tag. Kept by save/update/delete of file metadata.
+REMAP_BATCH_SIZE = int(os.getenv("REMAP_BATCH_SIZE", "1000"))     # files per multi-path write
+REMAP_FULL_READ_MIN = int(os.getenv("REMAP_FULL_READ_MIN", "200")) # read files/ once above this many
+
+def _tag_index_updates(file_id, old_tags, new_tags):
+    """Multi-path entries moving file_id from old_tags to new_tags in tag_files/."""
+    old_tags = {t for t in old_tags or [] if isinstance(t, str) and t}
+    new_tags = {t for t in new_tags or [] if isinstance(t, str) and t}
+    paths = {f'tag_files/{_encode_key(t)}/{file_id}': None for t in old_tags - new_tags}
+    paths.update({f'tag_files/{_encode_key(t)}/{file_id}': True for t in new_tags - old_tags})
+    return paths
+
+def rebuild_tag_file_index():
+    """Rebuilds tag_files/ from a full scan of files/ (one-time migration)."""
+    snapshot = _ref('files').get() or {}
+    index = {}
+    for file_id, val in snapshot.items():
+        if isinstance(val, dict):
+            for t in val.get('tags') or []:
+                if isinstance(t, str) and t:
+                    index.setdefault(_encode_key(t), {})[file_id] = True
+    if index:
+        _ref('tag_files').update(index)
+    _ref('meta/tag_file_index').set(str(datetime.datetime.utcnow()))
+    return len(index)
+
+# File listing index: file_index/{file id} holds only what a file list shows
+# (LISTING_FIELDS), so listings skip summaries, URLs and storage paths. Kept by
+# save/update/delete of file metadata and tag remaps; queried by owner_id/group_id.
+LISTING_FIELDS = ('filename', 'file_type', 'tags', 'owner_id', 'group_id', 'upload_date')
+
+def _listing_entry(file_data):
+    return {k: file_data[k] for k in LISTING_FIELDS if file_data.get(k) is not None}
+
+def rebuild_file_index():
+    """Rebuilds file_index/ from a full scan of files/ (one-time migration)."""
+    snapshot = _ref('files').get() or {}
+    index = {file_id: _listing_entry(val) for file_id, val in snapshot.items() if isinstance(val, dict)}
+    if index:
+        _ref('file_index').update(index)
+    _ref('meta/file_index').set(str(datetime.datetime.utcnow()))
+    return len(index)
+
+def _file_listing(child, value):
+    """Listing entries (with 'id') of the files whose child equals value."""
+    replica = _replica_for('files')
+    if replica:
+        snapshot = {file_id: _listing_entry(val) for file_id, val in replica.query('files', child, value).items()}
+    else:
+        _ensure_index('file_index', rebuild_file_index)
+        snapshot = _ref('file_index').order_by_child(child).equal_to(value).get() or {}
+    return [{'id': file_id, **val} for file_id, val in snapshot.items() if isinstance(val, dict)]
+
+def get_all_used_tags():
+    """Every tag carried by at least one file (shallow read of the tag index)."""
+    _ensure_index('tag_file_index', rebuild_tag_file_index)
+    return [unquote(key) for key in (_ref('tag_files').get(shallow=True) or {})]
+
+def remap_file_tags(tag_mapping):
+    """
+    Applies {old tag: new tag} to every file carrying an old tag, found through the
+    tag index. Changes go out as multi-path writes of REMAP_BATCH_SIZE files each.
+    Returns the number of files updated.
+    """
+    changed = {old: new for old, new in tag_mapping.items() if new and old != new}
+    if not changed:
+        return 0
+    _ensure_index('tag_file_index', rebuild_tag_file_index)
+
+    sources = {} # file id -> old tags it is indexed under
+    for tag in changed:
+        for file_id in _ref(f'tag_files/{_encode_key(tag)}').get(shallow=True) or {}:
+            sources.setdefault(file_id, []).append(tag)
+    if not sources:
+        return 0
+
+    if len(sources) >= REMAP_FULL_READ_MIN:
+        snapshot = _ref('files').get() or {}
+        current = {fid: (snapshot.get(fid) or {}).get('tags') for fid in sources}
+    else:
+        current = {fid: _ref(f'files/{fid}/tags').get() for fid in sources}
+
+    now = str(datetime.datetime.utcnow())
+    per_file = []
+    for file_id, tags in current.items():
+        if not tags:
+            # File is gone: drop its stale index entries
+            per_file.append((file_id, None, {f'tag_files/{_encode_key(t)}/{file_id}': None for t in sources[file_id]}))
+            continue
+        new_tags = sorted(set(changed.get(t, t) for t in tags))
+        if new_tags == sorted(tags):
+            continue
+        paths = {f'files/{file_id}/tags': new_tags, f'files/{file_id}/updated_at': now,
+                 f'file_index/{file_id}/tags': new_tags}
+        paths.update(_tag_index_updates(file_id, tags, new_tags))
+        per_file.append((file_id, new_tags, paths))
+
+    for start in range(0, len(per_file), REMAP_BATCH_SIZE):
+        batch = {}
+        for _, _, paths in per_file[start:start + REMAP_BATCH_SIZE]:
+            batch.update(paths)
+        _ref().update(batch)
+
+    updated = [(file_id, new_tags) for file_id, new_tags, _ in per_file if new_tags is not None]
+    for file_id, new_tags in updated:
+        _notify_file_listeners('updated', file_id, {'tags': new_tags, 'updated_at': now})
+    return len(updated)
+
+def _ensure_filename_index():
+    _ensure_index('filename_index', rebuild_filename_index)
+
+# An unreleased reservation older than this is abandoned (its upload died
+# before saving or releasing it) and the name can be claimed again
+FILENAME_RESERVATION_TTL = int(os.getenv("FILENAME_RESERVATION_TTL", "3600"))
+
+def _name_taken(value):
+    """True for a file id or a live reservation ("reserved:{epoch}:{token}")."""
+    if value is None:
         return False
-        
-    for val in snapshot.values():
-        if val.get('filename') == filename:
-            return True
-            
-    return False
+    if isinstance(value, str) and value.startswith("reserved:"):
+        parts = value.split(":")
+        # Reservations without a timestamp predate expiry and are treated as abandoned
+        return len(parts) == 3 and parts[1].isdigit() and time.time() - int(parts[1]) < FILENAME_RESERVATION_TTL
+    return True
+
+def check_filename_exists(filename):
+    """Checks if a filename already exists in the database (single index lookup)."""
+    _ensure_filename_index()
+    return _name_taken(_ref(f'filenames/{_encode_key(filename)}').get())
+
+def reserve_filename(base_name, ext, current=None, token=None):
+    """
+    Atomically claims the first free name of base_name.ext, base_name_1.ext, ... in
+    the filename index and returns it. `current` is the caller's own name, kept if it
+    comes up. The claim holds `token` until save_file_metadata/update_file_metadata
+    points it at the file; callers release it with release_filename if they fail
+    before that. After a collision, probing starts at a per-name suffix counter so
+    concurrent uploads do not walk the same suffixes.
+    """
+    _ensure_filename_index()
+    claim = f"reserved:{int(time.time())}:{token or uuid.uuid4().hex}"
+    count = 0
+    while True:
+        candidate = f"{base_name}.{ext}" if count == 0 else f"{base_name}_{count}.{ext}"
+        if candidate == current:
+            return candidate
+        claimed = _ref(f'filenames/{_encode_key(candidate)}').transaction(
+            lambda existing: existing if _name_taken(existing) else claim
+        )
+        if claimed == claim:
+            return candidate
+        if count == 0:
+            count = _ref(f'filename_suffixes/{_encode_key(f"{base_name}.{ext}")}').transaction(
+                lambda n: (n or 0) + 1
+            )
+        else:
+            count += 1
 
-def search_dates(query):
+def release_filename(filename, token):
+    """Frees a name claimed by reserve_filename(token=token), unless it has since been saved or re-claimed."""
+    def release(current):
+        held = isinstance(current, str) and current.startswith("reserved:") and current.endswith(f":{token}")
+        return None if held else current
+    return _ref(f'filenames/{_encode_key(filename)}').transaction(release) is None
+
+def search_dates(query, user_id=None):
     """
     Searches for dates/events that match the query string.
-    Searches in 'title' and 'description' fields.
+    Searches in 'title' and 'description' fields. With user_id only that
+    user's dates are read.
     """
     if not query:
         return []
         
-    dates_ref = db.reference('dates')
-    snapshot = dates_ref.get()
-    
+    if user_id:
+        items = get_dates_by_user(user_id)
+    else:
+        items = _date_items(_ref('dates').get())
+
+    query_lower = query.lower()
     matched_dates = []
-    if snapshot:
-        query_lower = query.lower()
+    for val in items:
+        title = val.get('title', '').lower()
+        description = val.get('description', '').lower()
         
-        # Handle both list and dict structures just in case
-        items = []
-        if isinstance(snapshot, list):
-            for i, val in enumerate(snapshot):
-                if val:
-                    val['id'] = str(i)
-                    items.append(val)
-        elif isinstance(snapshot, dict):
-            for key, val in snapshot.items():
-                val['id'] = key
-                items.append(val)
-                
-        for val in items:
-            title = val.get('title', '').lower()
-            description = val.get('description', '').lower()
-            
-            if query_lower in title or query_lower in description:
-                matched_dates.append(val)
+        if query_lower in title or query_lower in description:
+            matched_dates.append(val)
                 
     return matched_dates
 
-def get_upcoming_dates():
-    """Retrieves all upcoming dates (from today onwards)."""
-    dates_ref = db.reference('dates')
-    snapshot = dates_ref.get()
-    
-    if not snapshot:
-        return []
-        
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    upcoming = []
-    
-    items = []
+def rebuild_date_index():
+    """Backfills date_key/owner_date on dates saved before they existed (one-time migration)."""
+    snapshot = _ref('dates').get() or {}
     if isinstance(snapshot, list):
-        for i, val in enumerate(snapshot):
-            if val:
-                val['id'] = str(i)
-                items.append(val)
-    elif isinstance(snapshot, dict):
-        for key, val in snapshot.items():
-            val['id'] = key
-            items.append(val)
-            
-    for val in items:
-        # Check 'date' or 'date_time' field
-        date_str = val.get('date') or val.get('date_time')
-        if date_str and date_str >= today:
-            upcoming.append(val)
-            
-    # Sort by date
-    upcoming.sort(key=lambda x: x.get('date') or x.get('date_time') or "")
-    return upcoming
+        snapshot = {str(i): val for i, val in enumerate(snapshot)}
+    paths = {}
+    for date_id, val in snapshot.items():
+        if not isinstance(val, dict):
+            continue
+        for field, value in _date_index_fields(val).items():
+            if val.get(field) != value:
+                paths[f'dates/{date_id}/{field}'] = value
+    if paths:
+        _ref().update(paths)
+    _ref('meta/date_index').set(str(datetime.datetime.utcnow()))
+    return len(paths)
 
-def get_dates_this_month():
+def _dates_in_range(start, end, user_id=None):
+    """Dates whose date_key lies in [start, end] (optionally one user's), read through the ordered index."""
+    _ensure_index('date_index', rebuild_date_index)
+    if user_id:
+        query = _ref('dates').order_by_child('owner_date').start_at(f"{user_id}|{start}").end_at(f"{user_id}|{end}")
+    else:
+        query = _ref('dates').order_by_child('date_key').start_at(start).end_at(end)
+    return _sort_by_date(_date_items(query.get()))
+
+def get_upcoming_dates(user_id=None):
+    """Retrieves all upcoming dates (from today onwards), optionally only one user's."""
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    return _dates_in_range(today, "\uf8ff", user_id)
+
+def get_dates_in_month(month, user_id=None):
+    """Retrieves the dates of a month ("YYYY-MM"), optionally only one user's."""
+    return _dates_in_range(month, f"{month}\uf8ff", user_id)
+
+def get_dates_this_month(user_id=None):
     """Retrieves all dates in the current month."""
-    dates_ref = db.reference('dates')
-    snapshot = dates_ref.get()
-    
-    if not snapshot:
-        return []
-        
-    now = datetime.datetime.now()
-    current_month = now.strftime("%Y-%m")
-    
-    this_month = []
-    
-    items = []
-    if isinstance(snapshot, list):
-        for i, val in enumerate(snapshot):
-            if val:
-                val['id'] = str(i)
-                items.append(val)
-    elif isinstance(snapshot, dict):
-        for key, val in snapshot.items():
-            val['id'] = key
-            items.append(val)
-            
-    for val in items:
-        date_str = val.get('date') or val.get('date_time')
-        if date_str and date_str.startswith(current_month):
-            this_month.append(val)
-            
-    # Sort by date
-    this_month.sort(key=lambda x: x.get('date') or x.get('date_time') or "")
-    return this_month
+    return get_dates_in_month(datetime.datetime.now().strftime("%Y-%m"), user_id)
 
 def get_all_dates():
     """Retrieves all dates/events."""
-    dates_ref = db.reference('dates')
-    snapshot = dates_ref.get()
-    
-    if not snapshot:
-        return []
-        
-    all_dates = []
-    
-    items = []
-    if isinstance(snapshot, list):
-        for i, val in enumerate(snapshot):
-            if val:
-                val['id'] = str(i)
-                items.append(val)
-    elif isinstance(snapshot, dict):
-        for key, val in snapshot.items():
-            val['id'] = key
-            items.append(val)
-            
-    return items
+    return _date_items(_ref('dates').get())
 
 def save_collection(collection_data):
     """
     Saves a new collection.
     collection_data: name, owner_id, description, file_ids (list)
     """
-    ref = db.reference('collections')
+    ref = _ref('collections')
     new_ref = ref.push()
     collection_id = new_ref.key
     
@@ -578,9 +1209,9 @@ def save_collection(collection_data):
 
 def get_collections_by_user(user_id):
     """Retrieves all collections owned by a user."""
-    ref = db.reference('collections')
+    replica = _replica_for('collections')
     # Fallback to client-side filtering to avoid "Index not defined" errors
-    snapshot = ref.get()
+    snapshot = replica.get('collections') if replica else _ref('collections').get()
     
     collections = []
     if snapshot:
@@ -610,7 +1241,7 @@ def get_collections_by_user(user_id):
 
 def update_collection(collection_id, updates):
     """Updates a collection."""
-    ref = db.reference(f'collections/{collection_id}')
+    ref = _ref(f'collections/{collection_id}')
     if ref.get():
         updates['updated_at'] = str(datetime.datetime.utcnow())
         ref.update(updates)
@@ -619,7 +1250,7 @@ def update_collection(collection_id, updates):
 
 def delete_collection(collection_id):
     """Deletes a collection."""
-    ref = db.reference(f'collections/{collection_id}')
+    ref = _ref(f'collections/{collection_id}')
     if ref.get():
         ref.delete()
         return True
@@ -628,8 +1259,8 @@ def delete_collection(collection_id):
 def get_collection_details(collection_id):
     """Retrieves a single collection with its file details."""
     # 1. Get Collection
-    col_ref = db.reference(f'collections/{collection_id}')
-    collection = col_ref.get()
+    collections = _replica_for('collections')
+    collection = collections.get(f'collections/{collection_id}') if collections else _ref(f'collections/{collection_id}').get()
     
     if not collection:
         return None
@@ -644,9 +1275,9 @@ def get_collection_details(collection_id):
         # In a real app, we might want to batch get or optimize this
         # For prototype, fetching one by one is acceptable or fetching all user files and filtering
         # Let's fetch individual files for accuracy
+        replica = _replica_for('files')
         for f_id in file_ids:
-            f_ref = db.reference(f'files/{f_id}')
-            f_data = f_ref.get()
+            f_data = replica.get(f'files/{f_id}') if replica else _ref(f'files/{f_id}').get()
             if f_data:
                 f_data['id'] = f_id
                 # Backfill URL
@@ -659,7 +1290,7 @@ def get_collection_details(collection_id):
 
 def save_collection_access(collection_id, user_id):
     """Adds a user to the shared_with list of a collection."""
-    ref = db.reference(f'collections/{collection_id}')
+    ref = _ref(f'collections/{collection_id}')
     collection = ref.get()
     
     if not collection:
@@ -671,3 +1302,49 @@ def save_collection_access(collection_id, user_id):
         ref.update({'shared_with': shared_with})
         
     return True
+
+# Storage backend: "firebase" (RTDB + Cloud Storage, default) or "sqlite"
+# (sqlite_backend.py: SQLAlchemy tables with indexes, blobs on local disk).
+# Callers keep importing the functions from this module; selecting a backend
+# rebinds them here, so it must happen before other modules import them.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firebase").lower()
+
+BACKEND_FUNCTIONS = (
+    'save_user', 'upload_file_to_storage', 'upload_bytes_to_storage', 'upload_stream_to_storage',
+    'save_file_metadata', 'update_file_metadata', 'delete_file', 'save_date',
+    'get_file_metadata', 'get_user_profile', 'get_all_users_map', 'get_user_names',
+    'get_files_by_user', 'get_files_by_group', 'get_dates_by_user',
+    'update_date', 'delete_date', 'search_files_by_tags', 'get_candidate_files',
+    'get_tag_pool', 'save_tag_pool', 'add_to_tag_pool', 'check_filename_exists', 'search_dates',
+    'get_upcoming_dates', 'get_dates_in_month', 'get_dates_this_month', 'get_all_dates',
+    'save_collection', 'get_collections_by_user', 'update_collection',
+    'delete_collection', 'get_collection_details', 'save_collection_access',
+    'get_analysis_cache', 'save_analysis_cache', 'reserve_filename', 'release_filename',
+    'get_tag_aliases', 'save_tag_aliases', 'get_all_tag_aliases',
+    'get_all_used_tags', 'remap_file_tags', 'download_from_storage',
+    'get_pending_analyses', 'claim_stale_analysis',
+)
+
+def use_storage_backend(name):
+    """Rebinds the data functions of this module to the named backend."""
+    global initialize_firebase, STORAGE_BACKEND
+    if name == 'firebase':
+        return
+    if name != 'sqlite':
+        raise ValueError(f"Unknown STORAGE_BACKEND: {name}")
+    import sqlite_backend
+    module_globals = globals()
+    for func_name in BACKEND_FUNCTIONS:
+        module_globals[func_name] = getattr(sqlite_backend, func_name)
+    initialize_firebase = sqlite_backend.initialize
+    STORAGE_BACKEND = name
+
+use_storage_backend(STORAGE_BACKEND)
+
+def _instrument_backend_functions():
+    """Records the latency of every data function (whichever backend serves it)."""
+    module_globals = globals()
+    for func_name in BACKEND_FUNCTIONS:
+        module_globals[func_name] = metrics.timed(func_name)(module_globals[func_name])
+
+_instrument_backend_functions()
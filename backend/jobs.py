@@ -0,0 +1,145 @@
+import contextvars
+import datetime
+import queue
+import threading
+import uuid
+from collections import OrderedDict, deque
+
+# Job states reported by JobQueue.get
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class QueueFull(Exception):
+    pass
+
+class JobQueue:
+    """
+    In-process background job queue served by a fixed number of worker threads.
+    handler(payload) runs on a worker; its return value becomes the job's result.
+    Finished jobs are kept (most recent max_finished) so their status can be polled.
+    Jobs submitted with the same key run one at a time, in submission order.
+    """
+    def __init__(self, handler, workers: int = 2, max_pending: int = 1000, max_finished: int = 1000, name: str = "jobs"):
+        self.handler = handler
+        self.workers = workers
+        self.max_finished = max_finished
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._jobs = OrderedDict() # job_id -> record
+        self.max_pending = max_pending
+        self._keyed = {} # key -> deque of (job_id, payload) waiting behind that key's current job
+        self._keyed_waiting = 0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, payload, job_id: str = None, info: dict = None, key: str = None) -> str:
+        """Queues a job and returns its id. Raises QueueFull when max_pending jobs are waiting."""
+        self.start()
+        job_id = job_id or uuid.uuid4().hex
+        record = {
+            "job_id": job_id,
+            "status": QUEUED,
+            "submitted_at": str(datetime.datetime.utcnow()),
+            "result": None,
+            "error": None,
+        }
+        record.update(info or {})
+        with self._lock:
+            if key is not None and key in self._keyed:
+                # Another job with this key is queued or running: wait behind it
+                if self._keyed_waiting >= self.max_pending:
+                    raise QueueFull(f"{self.name} queue is full")
+                self._jobs[job_id] = record
+                self._keyed[key].append((job_id, payload))
+                self._keyed_waiting += 1
+                return job_id
+            self._jobs[job_id] = record
+            if key is not None:
+                self._keyed[key] = deque()
+        try:
+            self._queue.put_nowait((job_id, payload, key))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                if key is not None and not self._keyed.get(key):
+                    self._keyed.pop(key, None)
+            raise QueueFull(f"{self.name} queue is full")
+        return job_id
+
+    def get(self, job_id: str):
+        """Returns a copy of the job record, or None if unknown (or already evicted)."""
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record else None
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._queue.qsize() + self._keyed_waiting
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for record in self._jobs.values():
+                counts[record["status"]] += 1
+        return counts
+
+    def join(self):
+        """Blocks until every queued job has been processed (tests, shutdown)."""
+        self._queue.join()
+
+    def _set(self, job_id, **fields):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is not None:
+                record.update(fields)
+
+    def _evict_finished(self):
+        with self._lock:
+            finished = [j for j, r in self._jobs.items() if r["status"] in (DONE, FAILED)]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+
+    def _next_for_key(self, key):
+        """The next job waiting behind `key`, or (None, None) once the key is idle."""
+        if key is None:
+            return None, None
+        with self._lock:
+            waiting = self._keyed.get(key)
+            if waiting:
+                self._keyed_waiting -= 1
+                return waiting.popleft()
+            self._keyed.pop(key, None)
+            return None, None
+
+    def _run(self, job_id, payload):
+        try:
+            self._set(job_id, status=RUNNING, started_at=str(datetime.datetime.utcnow()))
+            # Fresh context per job so request-scoped state (metrics) never leaks between jobs
+            result = contextvars.Context().run(self.handler, payload)
+            self._set(job_id, status=DONE, result=result, finished_at=str(datetime.datetime.utcnow()))
+        except Exception as e:
+            print(f"Error in {self.name} job {job_id}: {e}")
+            self._set(job_id, status=FAILED, error=str(e), finished_at=str(datetime.datetime.utcnow()))
+
+    def _worker(self):
+        while True:
+            job_id, payload, key = self._queue.get()
+            try:
+                # Jobs that queued up behind this one's key run here, in order
+                while job_id is not None:
+                    self._run(job_id, payload)
+                    job_id, payload = self._next_for_key(key)
+            finally:
+                self._queue.task_done()
+                self._evict_finished()
@@ -1,9 +1,20 @@
 import os
 import uuid
-from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Form
+import asyncio
+import base64
+import contextvars
+import functools
+import json
+import datetime
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional, Literal
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import MessageEvent, TextMessage, TextSendMessage, ImageMessage, FileMessage, PostbackEvent
@@ -12,26 +23,86 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import metrics
+import analysis_cache
+from jobs import JobQueue, QueueFull, QUEUED, RUNNING, DONE, FAILED
 from bot import handle_line_event
 from firebase_config import (
     initialize_firebase, 
     save_file_metadata, 
-    upload_bytes_to_storage, 
+    upload_stream_to_storage,
     update_file_metadata, 
     delete_file,
     get_user_profile, 
+    get_file_metadata,
     get_files_by_group, 
     get_files_by_user,
-    get_all_users_map,
+    get_user_names,
     save_collection,
     get_collections_by_user,
     update_collection,
     delete_collection,
-    get_collection_details
+    get_collection_details,
+    save_date,
+    get_dates_by_user,
+    update_date,
+    delete_date,
+    search_dates,
+    get_upcoming_dates,
+    get_dates_in_month,
+    download_from_storage,
+    get_pending_analyses,
+    claim_stale_analysis,
+    start_replica,
+    REPLICA_ENABLED,
+    STORAGE_BACKEND
 )
 
 app = FastAPI()
 
+# Uploads are read (hashed, size-checked) in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_MB", "200")) * 1024 * 1024
+# Room for the form fields and part headers around the files
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+class BodySizeLimit:
+    """
+    Answers 413 to POST bodies over a per-path limit before they are parsed.
+    Starlette spools multipart files to disk as they arrive, so a check in the
+    handler comes after the whole body was received and written. A declared
+    Content-Length is checked up front; otherwise bytes are counted as they arrive.
+    """
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        detail = f"Request body exceeds {limit} bytes"
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(BodySizeLimit, limits={
+    "/api/upload": MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/api/upload/batch": MAX_BATCH_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for development
@@ -40,14 +111,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Firebase
+# Initialize Firebase (or the SQLite backend when STORAGE_BACKEND=sqlite)
 firebase_app = initialize_firebase()
 
+# Optional in-memory replica of files/users/tags/collections, fed by RTDB listeners
+if firebase_app and STORAGE_BACKEND == "firebase" and REPLICA_ENABLED:
+    start_replica()
+
+# Self-hosted mode: blobs live on local disk and are served from here
+if STORAGE_BACKEND == "sqlite":
+    from fastapi.staticfiles import StaticFiles
+    from sqlite_backend import LOCAL_STORAGE_DIR, LOCAL_STORAGE_URL
+    os.makedirs(LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount(LOCAL_STORAGE_URL, StaticFiles(directory=LOCAL_STORAGE_DIR), name="storage")
+
 # Initialize Services
 from search.tagger import TagGenerator
 from search.deduplicator import TagDeduplicator
 from search.search import TagSearch
-from firebase_config import get_tag_pool, save_tag_pool, check_filename_exists, get_candidate_files
+from search.tag_index import TagIndex
+from search.ranker import BM25Ranker
+from search.vector_index import VectorIndex
+from search.canonicalizer import TagCanonicalizer
+from firebase_config import (
+    get_tag_pool, add_to_tag_pool, reserve_filename, release_filename, get_candidate_files,
+    add_tag_pool_listener, add_file_listener, get_tag_aliases, save_tag_aliases
+)
 
 try:
     tagger = TagGenerator()
@@ -59,6 +148,50 @@ except Exception as e:
     deduplicator = None
     searcher = None
 
+# Count and time every Gemini call made through these services
+metrics.instrument_services(tagger, deduplicator, searcher)
+
+# Upload tags resolve through the persisted alias map (see search/canonicalizer.py)
+canonicalizer = TagCanonicalizer(deduplicator, get_tag_aliases, save_tag_aliases)
+
+# Drop memoized query tags whenever the tag pool is rewritten
+if searcher:
+    add_tag_pool_listener(searcher.query_cache.clear)
+
+def search_metrics():
+    """Query-tag resolution paths, query cache and media pre-processing stats, exported at /metrics."""
+    lines = []
+    if searcher:
+        resolution = {(source,): n for source, n in searcher.resolution_counts.items()}
+        cache = searcher.query_cache.stats()
+        lines += (
+            metrics.counter_lines("find_dee_query_tag_resolutions", "Query tags resolved per source (local, cache, model).", resolution, ("source",))
+            + metrics.counter_lines("find_dee_query_cache_lookups", "Query tag cache lookups by result (hit, miss).",
+                                    {("hit",): cache["hits"], ("miss",): cache["misses"]}, ("result",))
+            + metrics.gauge_lines("find_dee_query_cache", "Query tag cache size.", {("size",): cache["size"]}, ("stat",))
+        )
+    if tagger:
+        media = tagger.preprocessor.stats()
+        lines += (
+            metrics.counter_lines("find_dee_media_preprocess_bytes", "Bytes received vs sent to Gemini.",
+                                  {("in",): media.pop("bytes_in"), ("sent",): media.pop("bytes_sent")}, ("direction",))
+            + metrics.counter_lines("find_dee_media_preprocess_files", "Files per send mode (text, inline, upload).",
+                                    {(key[len("files_"):],): n for key, n in media.items()}, ("mode",))
+        )
+    return lines
+
+metrics.register_collector(search_metrics)
+
+# Inverted tag index + BM25 ranker + vector index for search; kept current by file
+# writes in this process (so uploads are embedded as they are saved) and rebuilt
+# in the background every TAG_INDEX_MAX_AGE seconds to pick up other instances' writes
+tag_index = TagIndex(
+    max_age_seconds=float(os.getenv("TAG_INDEX_MAX_AGE", "300")),
+    ranker=BM25Ranker(),
+    vectors=VectorIndex(dim=int(os.getenv("VECTOR_DIM", "128")))
+)
+add_file_listener(tag_index.on_file_event)
+
 # LINE Bot configuration
 LINE_CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
 LINE_CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET")
@@ -75,20 +208,76 @@ class FileUpdate(BaseModel):
 async def root():
     return {"message": "LINE File Management Bot API is running"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Max number of Firebase queries issued in parallel for a single request
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+
+# Bounded thread pools for blocking work: Firebase/Gemini calls of regular requests
+# run on io_executor; the upload pipeline (temp file, Gemini analysis, storage upload)
+# runs on its own small pool so a burst of uploads cannot take the threads that
+# serve /api/files and /api/search. Nothing blocking runs on the event loop.
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+async def run_blocking(func, *args, limit=None, executor=None):
+    """
+    Runs a blocking call on a bounded pool (io_executor unless given), optionally
+    also bounded by a semaphore. Context variables (request metrics) carry over.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    if limit is None:
+        return await loop.run_in_executor(executor or io_executor, call)
+    async with limit:
+        return await loop.run_in_executor(executor or io_executor, call)
+
+async def fetch_group_files(group_ids, limit=None, projected=False):
+    """Fetches files for every group concurrently. Returns {group_id: files}."""
+    if limit is None:
+        limit = asyncio.Semaphore(FETCH_CONCURRENCY)
+    results = await asyncio.gather(*[
+        run_blocking(get_files_by_group, group_id, projected, limit=limit) for group_id in group_ids
+    ])
+    return dict(zip(group_ids, results))
+
 @app.get("/api/files/{user_id}")
-async def get_user_files(user_id: str):
-    # 1. Get User Profile to find groups
-    user_profile = get_user_profile(user_id)
+@metrics.tracked("get_user_files")
+async def get_user_files(user_id: str, compact: bool = False):
+    """
+    Personal and group files of a user. With compact=true each file has only the
+    listing fields (id, filename, file_type, tags, owner_id, group_id, upload_date);
+    summary, URL, ... come from /api/files/detail/{file_id} when a file is opened.
+    """
+    limit = asyncio.Semaphore(FETCH_CONCURRENCY)
+    
+    # 1. Get User Profile (to find groups) and Personal Files in parallel
+    user_profile, personal_files = await asyncio.gather(
+        run_blocking(get_user_profile, user_id, limit=limit),
+        run_blocking(get_files_by_user, user_id, compact, limit=limit)
+    )
+    metrics.mark("profile_and_personal_files")
     if not user_profile:
         return {"files": []}
     
     groups = user_profile.get('groups', {})
     
-    # 2. Fetch files for each group
+    # 2. Fetch files for every group, then the names of the owners of the files shown
+    files_by_group = await fetch_group_files(list(groups.keys()), limit=limit, projected=compact)
+    metrics.mark("group_files")
+    owner_ids = [f.get('owner_id') for files in [personal_files or []] + list(files_by_group.values())
+                 for f in files or []]
+    known_users = await run_blocking(get_user_names, owner_ids, limit=limit)
+    metrics.mark("owner_names")
+    
     grouped_files = []
     
     # 2.1 Personal Files (uploaded by user)
-    personal_files = get_files_by_user(user_id)
     if personal_files:
         grouped_files.append({
             "group_name": "My Uploads",
@@ -101,221 +290,646 @@ async def get_user_files(user_id: str):
         if group_name is True: 
             group_name = "Unknown Group"
             
-        files = get_files_by_group(group_id)
+        files = files_by_group.get(group_id)
         if files:
             grouped_files.append({
                 "group_name": group_name,
                 "files": files
             })
             
-    # 3. Get User Map for resolving owner names
-    known_users = get_all_users_map()
-            
     return {"groups": grouped_files, "known_users": known_users}
 
 import re
 
+# Fields returned for each hit when a search asks for compact results;
+# the rest (summary, url, ...) is loaded on demand from /api/files/detail/{file_id}
+SEARCH_DISPLAY_FIELDS = ('id', '_score', 'filename', 'file_type', 'tags', 'owner_id', 'group_id', 'upload_date')
+
 class SearchRequest(BaseModel):
     query: str
     user_id: str
     group_id: Optional[str] = None
     owner_id: Optional[str] = None # For filtering by uploader
+    limit: Optional[int] = Field(None, ge=1, le=100) # Page size; omit for all results
+    cursor: Optional[str] = None # next_cursor from the previous page
+    compact: bool = False # Only ids, scores and display fields
+    mode: Literal["tags", "vector"] = "tags" # "vector": offline embedding search, no Gemini call
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+def decode_cursor(cursor):
+    """Returns the offset stored in a search cursor, or raises HTTP 400."""
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())["offset"]
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError(offset)
+        return offset
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.post("/api/search")
+@metrics.tracked("search_files")
 async def search_files(request: SearchRequest):
+    offset = decode_cursor(request.cursor) if request.cursor else 0
     try:
-        if not searcher:
+        if not searcher and request.mode == "tags":
              raise HTTPException(status_code=503, detail="Search service unavailable")
              
-        # 1. Fetch Tag Pool
-        tag_pool = get_tag_pool()
-        
-        # 2. Extract Tags
-        query_tags = searcher.extract_query_tags(request.query, tag_pool)
+        # 1. Fetch Tag Pool and User Profile in parallel
+        limit = asyncio.Semaphore(FETCH_CONCURRENCY)
+        profile_task = None
+        if request.user_id:
+            profile_task = asyncio.ensure_future(run_blocking(get_user_profile, request.user_id, limit=limit))
         
-        # 3. Get Candidate Files
-        candidate_files = []
+        # 2. Extract Tags (local n-gram match -> cache -> Gemini); vector mode needs none
+        query_tags, tag_source = [], None
+        if request.mode == "tags":
+            tag_pool = await run_blocking(get_tag_pool, limit=limit)
+            metrics.mark("tag_pool")
+            # May call Gemini: keep it off the event loop
+            query_tags, tag_source = await run_blocking(searcher.resolve_query_tags, request.query, tag_pool)
+            metrics.mark(f"resolve_tags_{tag_source}")
         
-        if request.group_id:
-            # Scoped Search: Only files in this group
-            group_files = get_files_by_group(request.group_id)
-            candidate_files.extend(group_files)
+        # 3. Resolve the files this user can see (personal + groups)
+        owner_ids = []
+        group_ids = []
         if request.user_id:
-            # Global Search: All files accessible to user (Personal + Groups)
-            # 3.1 Personal Files
-            personal_files = get_files_by_user(request.user_id)
-            candidate_files.extend(personal_files)
-            
-            # 3.2 Group Files
-            user_profile = get_user_profile(request.user_id)
+            owner_ids.append(request.user_id)
+            user_profile = await profile_task
             if user_profile:
                 groups = user_profile.get('groups', {})
                 for group_id, group_name in groups.items():
                     if group_name is True: continue # Legacy check
-                    group_files = get_files_by_group(group_id)
-                    candidate_files.extend(group_files)
-                    
-        # Deduplicate candidates by ID (just in case)
-        seen_ids = set()
-        unique_candidates = []
-        for f in candidate_files:
-            f_id = f.get('id')
-            if f_id and f_id not in seen_ids:
-                seen_ids.add(f_id)
-                unique_candidates.append(f)
+                    group_ids.append(group_id)
+            metrics.mark("profile")
         
-        # 4. Search & Rank
-        found_files = searcher.search_documents(
-            request.query, 
-            unique_candidates,
-            tag_pool, 
+        # 4. Search & Rank (BM25 over tags, filename and summary, or embedding similarity)
+        # Only the very first search waits for a build; later rebuilds run in the
+        # background while searches keep using the current index
+        if tag_index.built_at is None:
+            await run_blocking(tag_index.refresh, get_candidate_files)
+            metrics.mark("index_rebuild")
+        elif tag_index.is_stale():
+            tag_index.refresh_in_background(get_candidate_files)
+            
+        # Top-k: only rank up to the end of this page (+1 to know if there is more)
+        top_k = offset + request.limit + 1 if request.limit else None
+        scope = dict(
+            owner_ids=owner_ids,
+            group_ids=group_ids,
             group_id=request.group_id, 
-            owner_id=request.owner_id # Use the filter provided by frontend
+            owner_id=request.owner_id, # Use the filter provided by frontend
+            limit=top_k
         )
+        if request.mode == "vector":
+            found_files = await run_blocking(functools.partial(tag_index.nearest, request.query, **scope))
+        else:
+            found_files = await run_blocking(functools.partial(tag_index.rank, request.query, query_tags, **scope))
+        metrics.mark(f"rank_{request.mode}")
+        
+        # 5. Paginate
+        next_cursor = None
+        if request.limit:
+            if len(found_files) > offset + request.limit:
+                next_cursor = encode_cursor(offset + request.limit)
+            found_files = found_files[offset:offset + request.limit]
+        elif offset:
+            found_files = found_files[offset:]
+            
+        if request.compact:
+            found_files = [{k: f[k] for k in SEARCH_DISPLAY_FIELDS if k in f} for f in found_files]
         
         return {
             "query": request.query,
             "extracted_tags": query_tags,
-            "results": found_files
+            "tag_source": tag_source,
+            "results": found_files,
+            "next_cursor": next_cursor
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/upload")
+@metrics.tracked("upload_file")
 async def upload_file(
     file: UploadFile = File(...),
     user_id: str = Form(...),
     group_id: Optional[str] = Form(None),
     tags: Optional[str] = Form(None) # Comma separated, optional manual tags
 ):
-    try:
-        # 1. Validate file type
-        filename = file.filename
-        ext = os.path.splitext(filename)[1].lower().replace('.', '')
-        if not ext:
-            ext = "jpg" # Default
-            
-        file_type = 'other'
-        mime_type = file.content_type
-        
-        if ext in ['jpg', 'jpeg', 'png']:
-            file_type = 'image'
-            if not mime_type: mime_type = "image/jpeg"
-        elif ext == 'pdf':
-            file_type = 'pdf'
-            if not mime_type: mime_type = "application/pdf"
-            
-        # 2. Save temporarily for AI analysis
-        temp_save_path = f"temp_{uuid.uuid4()}.{ext}"
-        with open(temp_save_path, "wb") as buffer:
-            import shutil
-            shutil.copyfileobj(file.file, buffer)
-            
-        # 3. AI Analysis (Tagging & Summarization)
-        generated_metadata = {"tags": [], "title": "Untitled", "summary": ""}
+    # Storing the file is blocking (disk, Firebase, Storage): run it on the upload pool.
+    # AI analysis happens later on the analysis workers; poll GET /api/upload/{job_id}.
+    return await run_blocking(process_api_upload, file, user_id, group_id, tags, executor=upload_executor)
+
+def prepare_upload(file: UploadFile) -> dict:
+    """
+    Reads an uploaded file chunk by chunk, hashing (analysis cache) and
+    size-checking on the way, then rewinds it for the storage upload. The file is
+    Starlette's own spool: it is streamed from there, never copied again.
+    """
+    # 1. Validate file type
+    filename = file.filename or ""
+    stem, ext = os.path.splitext(filename)
+    ext = ext.lower().replace('.', '')
+    if not ext:
+        ext = "jpg" # Default
         
-        if tagger:
-            try:
-                generated_metadata = tagger.generate_metadata(temp_save_path, mime_type)
-            except Exception as e:
-                print(f"Tag generation failed: {e}")
-                
-        raw_tags = generated_metadata.get("tags", [])
+    file_type = 'other'
+    mime_type = file.content_type
+    
+    if ext in ['jpg', 'jpeg', 'png']:
+        file_type = 'image'
+        if not mime_type: mime_type = "image/jpeg"
+    elif ext == 'pdf':
+        file_type = 'pdf'
+        if not mime_type: mime_type = "application/pdf"
         
-        # Merge manual tags if provided
-        if tags:
-            manual_tags = [t.strip() for t in tags.split(',')]
-            raw_tags.extend(manual_tags)
-            
-        # 4. Deduplication & Tag Pool Update
-        final_tags = raw_tags
-        if deduplicator and raw_tags:
-            final_tags = deduplicator.deduplicate(raw_tags)
-            
-        # Update Global Tag Pool
-        tag_pool = get_tag_pool() or []
-        if deduplicator and final_tags:
-            combined_pool = list(set(tag_pool + final_tags))
-            tag_pool = deduplicator.deduplicate(combined_pool)
-            save_tag_pool(tag_pool)
-        elif final_tags:
-            tag_pool.extend(final_tags)
-            tag_pool = list(set(tag_pool))
-            save_tag_pool(tag_pool)
-            
-        if not final_tags:
-            final_tags = ["Uncategorized"]
-            
-        # 5. Smart Renaming
-        mock_name = generated_metadata.get("title", filename)
-        mock_summary = generated_metadata.get("summary", "No summary available")
-        suggested_filename = generated_metadata.get("suggested_filename", "")
+    # 2. Hash and measure
+    hasher = analysis_cache.new_hasher()
+    size = 0
+    file.file.seek(0)
+    while True:
+        chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"File exceeds {MAX_UPLOAD_BYTES} bytes")
+        hasher.update(chunk)
+    file.file.seek(0)
+    metrics.mark("hash_upload")
+    return {
+        'original_filename': filename,
+        'stem': stem,
+        'ext': ext,
+        'file_type': file_type,
+        'mime_type': mime_type,
+        'file': file.file,
+        'size': size,
+        'content_hash': hasher.hexdigest(),
+    }
+
+def store_upload(upload: dict, user_id: str, group_id: Optional[str], manual_tags: List[str]) -> dict:
+    """
+    Streams an upload to Storage and saves its provisional record (original
+    name, manual tags, analysis_status "queued"). Returns the analysis job. The
+    record holds everything the job needs, so a lost job can be rebuilt from it.
+    """
+    ext = upload['ext']
+    upload_id = uuid.uuid4().hex
+    provisional_filename = reserve_filename(re.sub(r'[<>:"/\\|?*]', '', upload['stem']) or "untitled_file", ext,
+                                            token=upload_id)
+    metrics.mark("filename_uniqueness")
         
-        base_name = "untitled_file"
-        if suggested_filename:
-            base_name = suggested_filename
-        elif file_type == 'pdf':
-             base_name = os.path.splitext(filename)[0]
-        else:
-             # Sanitize title
-             base_name = re.sub(r'[<>:"/\\|?*]', '', mock_name).replace(' ', '_')
-             
-        # Ensure uniqueness
-        count = 0
-        while True:
-            candidate_name = f"{base_name}.{ext}" if count == 0 else f"{base_name}_{count}.{ext}"
-            if not check_filename_exists(candidate_name):
-                final_filename = candidate_name
-                break
-            count += 1
-            
-        # 6. Upload to Storage
-        # Re-open temp file to upload
-        with open(temp_save_path, "rb") as f:
-            file_bytes = f.read()
-            
-        storage_path = f"uploads/{user_id}/{final_filename}"
-        public_url = upload_bytes_to_storage(file_bytes, storage_path, mime_type)
+    try:
+        # 3. Upload to Storage. The path does not carry the display name, so the
+        # analysis job can rename the file without moving the blob.
+        storage_path = f"uploads/{user_id}/{upload_id}.{ext}"
+        public_url = upload_stream_to_storage(upload['file'], storage_path, upload['mime_type'], upload['size'])
+        metrics.mark("storage_upload")
         
-        # 7. Save Metadata
+        # 4. Save provisional Metadata
         file_data = {
-            'filename': final_filename,
+            'filename': provisional_filename,
             'file_type': ext,
             'storage_path': storage_path,
             'url': public_url,
             'owner_id': user_id,
             'group_id': group_id,
-            'tags': final_tags,
+            'tags': manual_tags,
             'version': 'v1',
-            'detail_summary': mock_summary,
+            'detail_summary': "",
+            'mime_type': upload['mime_type'],
+            'content_hash': upload['content_hash'],
+            'analysis_status': QUEUED,
+            'analysis_updated_at': time.time(),
             'due_date_id': None
         }
         
         file_id = save_file_metadata(file_data)
+    except Exception:
+        # The name was never saved: free it for other uploads
+        release_filename(provisional_filename, upload_id)
+        raise
+    metrics.mark("metadata_write")
+    return upload_job(file_id, file_data)
+
+def upload_job(file_id: str, record: dict) -> dict:
+    """The analysis job of an upload, built from its provisional file record."""
+    ext = record.get('file_type', '')
+    return {
+        'file_id': file_id,
+        'url': record.get('url'),
+        'storage_path': record.get('storage_path'),
+        'content_hash': record.get('content_hash'),
+        'mime_type': record.get('mime_type') or ("application/pdf" if ext == 'pdf' else "image/jpeg"),
+        'file_type': 'pdf' if ext == 'pdf' else 'image' if ext in ('jpg', 'jpeg', 'png') else 'other',
+        'ext': ext,
+        'filename': record.get('filename'),
+        'manual_tags': record.get('tags') or [],
+    }
+
+def parse_manual_tags(tags: Optional[str]) -> List[str]:
+    return [t.strip() for t in tags.split(',') if t.strip()] if tags else []
+
+def process_api_upload(file: UploadFile, user_id: str, group_id: Optional[str], tags: Optional[str]):
+    """
+    Stores an uploaded file with a provisional record and queues its AI analysis.
+    Blocking; runs on upload_executor.
+    """
+    try:
+        job = store_upload(prepare_upload(file), user_id, group_id, parse_manual_tags(tags))
+        file_id = job['file_id']
         
-        # Cleanup
-        if os.path.exists(temp_save_path):
-            os.remove(temp_save_path)
+        # 5. Queue the analysis; the job id is the file id
+        try:
+            analysis_jobs.submit(job, job_id=file_id, info={'file_id': file_id})
+            status = QUEUED
+        except QueueFull:
+            # Backlogged: analyze in this request, as uploads used to
+            print(f"Analysis queue full, analyzing {file_id} inline")
+            analyze_upload(job)
+            status = DONE
         
         return {
+            "job_id": file_id,
             "file_id": file_id, 
-            "url": public_url, 
-            "filename": final_filename,
-            "tags": final_tags,
-            "summary": mock_summary,
-            "message": "File uploaded and analyzed successfully"
+            "url": job['url'], 
+            "filename": job['filename'],
+            "tags": job['manual_tags'],
+            "status": status,
+            "message": "File uploaded, analysis queued" if status == QUEUED else "File uploaded and analyzed successfully"
         }
         
     except Exception as e:
-        if 'temp_save_path' in locals() and os.path.exists(temp_save_path):
-            os.remove(temp_save_path)
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(status_code=500, detail=str(e))
+
+def generate_upload_metadata(job: dict, file_path: str = None) -> dict:
+    """
+    AI tagging & summarization of an upload (analysis cache first). Without a
+    local file_path, the file is downloaded from Storage only on a cache miss.
+    """
+    generated_metadata = {"tags": [], "title": "Untitled", "summary": ""}
+    downloaded = []
+
+    def local_file():
+        if file_path:
+            return file_path
+        fd, path = tempfile.mkstemp(suffix=f".{job['ext']}")
+        os.close(fd)
+        downloaded.append(path)
+        download_from_storage(job['storage_path'], path)
+        metrics.mark("storage_download")
+        return path
+
+    try:
+        # Identical files uploaded before reuse their analysis (no Gemini call)
+        generated_metadata = analysis_cache.generate_metadata(
+            tagger, local_file, job['mime_type'], job.get('content_hash')
+        ) or generated_metadata
+    except Exception as e:
+        print(f"Tag generation failed: {e}")
+    finally:
+        for path in downloaded:
+            os.remove(path)
+    metrics.mark("gemini_analysis")
+    return generated_metadata
+
+def canonicalize_upload_tags(raw_tags: List[str]):
+    """
+    Canonicalization & Tag Pool Update: known tags resolve through the alias map,
+    only unseen ones go to Gemini (O(new tags), not O(pool)).
+    Returns ({raw tag: canonical tag}, canonical tags added to the pool).
+    """
+    tag_pool = get_tag_pool() or []
+    try:
+        tag_mapping, new_canonical = canonicalizer.canonicalize(raw_tags, tag_pool)
+    except Exception as e:
+        print(f"Tag canonicalization failed: {e}")
+        tag_mapping, new_canonical = {t: t for t in raw_tags}, []
+    metrics.mark("dedup_tags")
+        
+    # Update Global Tag Pool
+    if new_canonical:
+        add_to_tag_pool(new_canonical)
+    metrics.mark("tag_pool_update")
+    return tag_mapping, new_canonical
+
+def apply_tag_mapping(raw_tags: List[str], tag_mapping: dict) -> List[str]:
+    """A file's canonical tags, in order, without duplicates."""
+    tags = (t.strip() for t in raw_tags if isinstance(t, str) and t.strip())
+    return list(dict.fromkeys(tag_mapping.get(t, t) for t in tags))
+
+def finish_upload(job: dict, generated_metadata: dict, final_tags: List[str]) -> dict:
+    """Smart renaming, then the provisional record is updated in place."""
+    if not final_tags:
+        final_tags = ["Uncategorized"]
+        
+    # 3. Smart Renaming
+    title = generated_metadata.get("title", job['filename'])
+    summary = generated_metadata.get("summary", "No summary available")
+    suggested_filename = generated_metadata.get("suggested_filename", "")
+    
+    if suggested_filename:
+        base_name = suggested_filename
+    elif job['file_type'] == 'pdf':
+        base_name = os.path.splitext(job['filename'])[0]
+    else:
+        # Sanitize title
+        base_name = re.sub(r'[<>:"/\\|?*]', '', title).replace(' ', '_') or "untitled_file"
+    token = uuid.uuid4().hex
+    final_filename = reserve_filename(base_name, job['ext'], current=job['filename'], token=token)
+    metrics.mark("filename_uniqueness")
+    
+    # 4. Update the provisional record
+    try:
+        update_file_metadata(job['file_id'], {
+            'filename': final_filename,
+            'tags': final_tags,
+            'title': title,
+            'detail_summary': summary,
+            'analysis_status': DONE
+        })
+    except Exception:
+        # The file keeps its provisional name; the new one was never saved
+        if final_filename != job['filename']:
+            release_filename(final_filename, token)
+        raise
+    metrics.mark("metadata_write")
+    
+    return {
+        "file_id": job['file_id'],
+        "filename": final_filename,
+        "tags": final_tags,
+        "title": title,
+        "summary": summary
+    }
+
+def fail_upload(job: dict):
+    update_file_metadata(job['file_id'], {'tags': job['manual_tags'] or ["Uncategorized"], 'analysis_status': FAILED})
+
+@metrics.tracked("upload_analysis")
+def analyze_upload(job: dict):
+    """
+    Background half of an upload: AI tagging & summarization, tag deduplication,
+    tag pool update and smart renaming, then the file record is updated in place.
+    Runs on an analysis worker. Returns the final metadata (the job result).
+    """
+    try:
+        # Progress timestamp: recover_analyses leaves running analyses alone until it goes stale
+        update_file_metadata(job['file_id'], {'analysis_status': RUNNING, 'analysis_updated_at': time.time()})
+        generated_metadata = generate_upload_metadata(job)
+        raw_tags = generated_metadata.get("tags", []) + job['manual_tags']
+        tag_mapping, _ = canonicalize_upload_tags(raw_tags)
+        final_tags = apply_tag_mapping(raw_tags, tag_mapping)
+        return finish_upload(job, generated_metadata, final_tags)
+    except Exception:
+        fail_upload(job)
+        raise
+
+# Background AI analysis of uploads, ANALYSIS_WORKERS jobs at a time. At most
+# ANALYSIS_QUEUE_SIZE jobs wait; beyond that uploads are analyzed inline.
+analysis_jobs = JobQueue(
+    analyze_upload,
+    workers=int(os.getenv("ANALYSIS_WORKERS", "2")),
+    max_pending=int(os.getenv("ANALYSIS_QUEUE_SIZE", "1000")),
+    name="analysis"
+)
+
+def analysis_metrics():
+    """Analysis job counts by state, exported at /metrics."""
+    samples = {(state,): n for state, n in analysis_jobs.stats().items()}
+    return metrics.gauge_lines("find_dee_analysis_jobs", "Upload analysis jobs by state (finished jobs are retained up to a limit).", samples, ("state",))
+
+metrics.register_collector(analysis_metrics)
+
+# Jobs live in this process only. A restart, redeploy or scale-in loses the queued
+# ones, leaving their records "queued"/"running". A sweep at startup and every
+# ANALYSIS_SWEEP_INTERVAL seconds re-queues records that made no progress for
+# ANALYSIS_STALE_SECONDS (their file is read back from Storage), at most
+# ANALYSIS_MAX_RETRIES times; after that they are marked failed.
+ANALYSIS_STALE_SECONDS = float(os.getenv("ANALYSIS_STALE_SECONDS", "900"))
+ANALYSIS_MAX_RETRIES = int(os.getenv("ANALYSIS_MAX_RETRIES", "3"))
+ANALYSIS_SWEEP_INTERVAL = float(os.getenv("ANALYSIS_SWEEP_INTERVAL", "300")) # 0 disables the sweep
+
+def recover_analyses() -> dict:
+    """Re-queues (or fails) uploads whose analysis job was lost. Returns {"requeued": n, "failed": n}."""
+    recovered = {"requeued": 0, "failed": 0}
+    stale_before = time.time() - ANALYSIS_STALE_SECONDS
+    for record in get_pending_analyses():
+        file_id = record['id']
+        # Still ours, or maybe still waiting in another instance's queue
+        if analysis_jobs.get(file_id) or record.get('analysis_updated_at', 0) >= stale_before:
+            continue
+        claimed = claim_stale_analysis(file_id, stale_before)
+        if claimed is None:
+            continue
+        job = upload_job(file_id, claimed)
+        if claimed['analysis_attempts'] > ANALYSIS_MAX_RETRIES or not job['storage_path']:
+            fail_upload(job)
+            recovered["failed"] += 1
+            continue
+        try:
+            analysis_jobs.submit(job, job_id=file_id, info={'file_id': file_id})
+        except QueueFull:
+            # Claimed with a fresh timestamp: a later sweep picks it up again
+            break
+        recovered["requeued"] += 1
+    return recovered
+
+def _analysis_sweeper():
+    while True:
+        try:
+            recovered = recover_analyses()
+            if any(recovered.values()):
+                print(f"Recovered lost upload analyses: {recovered}")
+        except Exception as e:
+            print(f"Error recovering upload analyses: {e}")
+        time.sleep(ANALYSIS_SWEEP_INTERVAL)
+
+if firebase_app and ANALYSIS_SWEEP_INTERVAL > 0:
+    threading.Thread(target=_analysis_sweeper, name="analysis-sweep", daemon=True).start()
+
+# Batch uploads: files of one batch are stored and analyzed this many at a time
+# (each also takes an upload_executor thread); MAX_BATCH_FILES files per request
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "4"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "50"))
+# Running batches, referenced so they finish even if the client disconnects
+_batch_tasks = set()
+
+@metrics.tracked("upload_batch_file")
+def analyze_batch_file(job: dict) -> dict:
+    """Per-file half of a batch: AI analysis of a stored upload. Returns its metadata."""
+    try:
+        return generate_upload_metadata(job)
+    except Exception:
+        fail_upload(job)
+        raise
+
+@metrics.tracked("upload_batch_reconcile")
+def reconcile_batch(analyzed: list):
+    """
+    One tag canonicalization and tag pool update for the tags of every file in
+    the batch, then each provisional record gets its final tags and name.
+    """
+    raw_by_file = [(job, meta, meta.get("tags", []) + job['manual_tags']) for job, meta in analyzed]
+    tag_mapping, new_canonical = canonicalize_upload_tags([t for _, _, raw in raw_by_file for t in raw])
+    results = []
+    for job, meta, raw_tags in raw_by_file:
+        try:
+            results.append({**finish_upload(job, meta, apply_tag_mapping(raw_tags, tag_mapping)), "status": DONE})
+        except Exception as e:
+            print(f"Error finishing batch upload {job['file_id']}: {e}")
+            fail_upload(job)
+            results.append({"file_id": job['file_id'], "status": FAILED, "error": str(e)})
+    return results, new_canonical
+
+async def run_upload_batch(stored: list, manual_tags: List[str], events: asyncio.Queue):
+    """
+    Drives a batch of stored uploads ((original filename, job or storage error) pairs),
+    putting one event per finished file and a final batch event on `events` (None ends it).
+    """
+    limit = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+
+    async def one(original_filename, job):
+        try:
+            meta = await run_blocking(analyze_batch_file, job, limit=limit, executor=upload_executor)
+            return original_filename, job, meta, None
+        except Exception as e:
+            print(f"Error in batch upload of {original_filename}: {e}")
+            return original_filename, None, None, e
+
+    async def not_stored(original_filename, error):
+        return original_filename, None, None, error
+
+    analyzed = []
+    try:
+        pending = [one(name, job) if isinstance(job, dict) else not_stored(name, job) for name, job in stored]
+        for next_done in asyncio.as_completed(pending):
+            original_filename, job, meta, error = await next_done
+            if error is not None:
+                await events.put({"event": "file", "filename": original_filename, "status": FAILED, "error": str(error)})
+                continue
+            analyzed.append((job, meta))
+            await events.put({
+                "event": "file",
+                "file_id": job['file_id'],
+                "filename": job['filename'],
+                "url": job['url'],
+                "status": "analyzed",
+                "title": meta.get("title"),
+                "tags": meta.get("tags", []) + manual_tags,
+            })
+        results, new_tags = [], []
+        if analyzed:
+            results, new_tags = await run_blocking(reconcile_batch, analyzed, executor=upload_executor)
+        await events.put({
+            "event": "batch",
+            "files": results,
+            "new_tags": new_tags,
+            "failed": len(stored) - sum(1 for r in results if r["status"] == DONE),
+        })
+    finally:
+        await events.put(None)
+
+@app.post("/api/upload/batch")
+@metrics.tracked("upload_batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    user_id: str = Form(...),
+    group_id: Optional[str] = Form(None),
+    tags: Optional[str] = Form(None) # Comma separated, applied to every file
+):
+    """
+    Uploads several files at once (e.g. a set of lecture photos). Files are stored
+    and analyzed BATCH_UPLOAD_CONCURRENCY at a time; all their tags then go through
+    one canonicalization and one tag pool update. Streams NDJSON: a "file" line per
+    file as its analysis finishes (raw tags), then a "batch" line with final tags and
+    filenames.
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FILES} files per batch")
+    manual_tags = parse_manual_tags(tags)
+
+    # Check every file before storing any: one oversized file rejects the batch
+    results = await asyncio.gather(
+        *[run_blocking(prepare_upload, file, executor=upload_executor) for file in files],
+        return_exceptions=True
+    )
+    error = next((r for r in results if isinstance(r, BaseException)), None)
+    if error is not None:
+        if isinstance(error, HTTPException):
+            raise error
+        raise HTTPException(status_code=500, detail=str(error))
+
+    # Store every file before responding: uploaded files are closed once the response
+    # ends (or the client goes away), the analysis then reads them back from Storage
+    limit = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+    jobs = await asyncio.gather(
+        *[run_blocking(store_upload, upload, user_id, group_id, manual_tags, limit=limit, executor=upload_executor)
+          for upload in results],
+        return_exceptions=True
+    )
+    stored = [(upload['original_filename'], job) for upload, job in zip(results, jobs)]
+
+    events = asyncio.Queue()
+    task = asyncio.create_task(run_upload_batch(stored, manual_tags, events))
+    _batch_tasks.add(task)
+    task.add_done_callback(_batch_tasks.discard)
+
+    async def stream():
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/api/upload/{job_id}")
+async def get_upload_status(job_id: str):
+    """Status of an upload's analysis: queued, running, done (with final metadata) or failed."""
+    job = analysis_jobs.get(job_id)
+    if job:
+        return job
+    # Not queued on this instance (other worker or restart): answer from the file record
+    try:
+        file_data = await run_blocking(get_file_metadata, job_id)
+    except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not file_data:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    status = file_data.get('analysis_status', DONE)
+    result = None
+    if status == DONE:
+        result = {
+            "file_id": job_id,
+            "filename": file_data.get('filename'),
+            "tags": file_data.get('tags', []),
+            "title": file_data.get('title'),
+            "summary": file_data.get('detail_summary', "")
+        }
+    error = "Analysis failed" if status == FAILED else None
+    return {"job_id": job_id, "file_id": job_id, "status": status, "result": result, "error": error}
+
+@app.get("/api/files/detail/{file_id}")
+async def get_file_detail(file_id: str):
+    try:
+        file_data = await run_blocking(get_file_metadata, file_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not file_data:
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_data
 
 @app.put("/api/files/{file_id}")
 async def update_file(file_id: str, updates: FileUpdate):
     try:
         update_dict = updates.dict(exclude_unset=True)
-        success = update_file_metadata(file_id, update_dict)
+        success = await run_blocking(update_file_metadata, file_id, update_dict)
         if not success:
             raise HTTPException(status_code=404, detail="File not found")
         return {"message": "File updated successfully"}
@@ -325,7 +939,7 @@ async def update_file(file_id: str, updates: FileUpdate):
 @app.delete("/api/files/{file_id}")
 async def delete_file_endpoint(file_id: str):
     try:
-        success = delete_file(file_id)
+        success = await run_blocking(delete_file, file_id)
         if not success:
             raise HTTPException(status_code=404, detail="File not found")
         return {"message": "File deleted successfully"}
@@ -333,7 +947,42 @@ async def delete_file_endpoint(file_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# LINE events are handled on LINE_WORKERS background threads, so /callback answers
+# as soon as the signature is checked. Events of one user run in order (the bot's
+# conversation state depends on it); long work (process_upload) ends with a push message.
+@metrics.tracked("line_event")
+def dispatch_line_event(event):
+    handle_line_event(event, line_bot_api)
+
+line_events = JobQueue(
+    dispatch_line_event,
+    workers=int(os.getenv("LINE_WORKERS", "4")),
+    max_pending=int(os.getenv("LINE_QUEUE_SIZE", "1000")),
+    name="line"
+)
+
+def line_event_metrics():
+    """LINE event counts by state, exported at /metrics."""
+    samples = {(state,): n for state, n in line_events.stats().items()}
+    samples[("pending",)] = line_events.pending()
+    return metrics.gauge_lines("find_dee_line_events", "LINE webhook events by state (finished events are retained up to a limit).", samples, ("state",))
+
+metrics.register_collector(line_event_metrics)
+
+def enqueue_line_event(event):
+    event_id = getattr(event, 'webhook_event_id', None)
+    if event_id and line_events.get(event_id):
+        return # LINE redelivered an event this instance already has
+    try:
+        line_events.submit(event, job_id=event_id, key=getattr(event.source, 'user_id', None),
+                           info={'type': event.type})
+    except QueueFull:
+        # Backlogged: handle it in the webhook request, as events used to be
+        print(f"LINE event queue full, handling {event_id} inline")
+        dispatch_line_event(event)
+
 @app.post("/callback")
+@metrics.tracked("line_webhook")
 async def callback(request: Request):
     # get X-Line-Signature header value
     signature = request.headers.get("X-Line-Signature")
@@ -342,9 +991,9 @@ async def callback(request: Request):
     body = await request.body()
     body_text = body.decode("utf-8")
 
-    # handle webhook body
+    # handle webhook body: validates the signature and queues each event
     try:
-        handler.handle(body_text, signature)
+        await run_blocking(handler.handle, body_text, signature)
     except InvalidSignatureError:
         raise HTTPException(status_code=400, detail="Invalid signature")
 
@@ -352,11 +1001,11 @@ async def callback(request: Request):
 
 @handler.add(MessageEvent, message=(TextMessage, ImageMessage, FileMessage))
 def handle_message(event):
-    handle_line_event(event, line_bot_api)
+    enqueue_line_event(event)
 
 @handler.add(PostbackEvent)
 def handle_postback(event):
-    handle_line_event(event, line_bot_api)
+    enqueue_line_event(event)
 
 # --- Collections API ---
 
@@ -375,7 +1024,7 @@ class CollectionUpdate(BaseModel):
 async def create_collection(collection: CollectionCreate):
     try:
         data = collection.dict()
-        collection_id = save_collection(data)
+        collection_id = await run_blocking(save_collection, data)
         return {"collection_id": collection_id, "message": "Collection created successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -383,7 +1032,7 @@ async def create_collection(collection: CollectionCreate):
 @app.get("/api/collections/{user_id}")
 async def get_user_collections(user_id: str):
     try:
-        collections = get_collections_by_user(user_id)
+        collections = await run_blocking(get_collections_by_user, user_id)
         return {"collections": collections}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -391,7 +1040,7 @@ async def get_user_collections(user_id: str):
 @app.get("/api/collections/detail/{collection_id}")
 async def get_collection(collection_id: str):
     try:
-        collection = get_collection_details(collection_id)
+        collection = await run_blocking(get_collection_details, collection_id)
         if not collection:
             raise HTTPException(status_code=404, detail="Collection not found")
         return collection
@@ -402,7 +1051,7 @@ async def get_collection(collection_id: str):
 async def update_collection_endpoint(collection_id: str, updates: CollectionUpdate):
     try:
         update_dict = updates.dict(exclude_unset=True)
-        success = update_collection(collection_id, update_dict)
+        success = await run_blocking(update_collection, collection_id, update_dict)
         if not success:
             raise HTTPException(status_code=404, detail="Collection not found")
         return {"message": "Collection updated successfully"}
@@ -412,7 +1061,7 @@ async def update_collection_endpoint(collection_id: str, updates: CollectionUpda
 @app.delete("/api/collections/{collection_id}")
 async def delete_collection_endpoint(collection_id: str):
     try:
-        success = delete_collection(collection_id)
+        success = await run_blocking(delete_collection, collection_id)
         if not success:
             raise HTTPException(status_code=404, detail="Collection not found")
         return {"message": "Collection deleted successfully"}
@@ -423,13 +1072,87 @@ async def delete_collection_endpoint(collection_id: str):
 async def save_collection_endpoint(collection_id: str, user_id: str = Form(...)):
     try:
         from firebase_config import save_collection_access
-        success = save_collection_access(collection_id, user_id)
+        success = await run_blocking(save_collection_access, collection_id, user_id)
         if not success:
             raise HTTPException(status_code=404, detail="Collection not found")
         return {"message": "Collection saved successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- Planner / Dates API ---
+
+class DateCreate(BaseModel):
+    title: str
+    owner_id: str
+    date: Optional[str] = None       # "YYYY-MM-DD"
+    date_time: Optional[str] = None  # "YYYY-MM-DDTHH:MM", when the task has a time
+    description: Optional[str] = ""
+    tags: Optional[List[str]] = []
+    color: Optional[str] = None
+    file_id: Optional[str] = None
+    is_complete: Optional[bool] = False
+
+class DateUpdate(BaseModel):
+    title: Optional[str] = None
+    date: Optional[str] = None
+    date_time: Optional[str] = None
+    description: Optional[str] = None
+    tags: Optional[List[str]] = None
+    color: Optional[str] = None
+    file_id: Optional[str] = None
+    is_complete: Optional[bool] = None
+
+@app.post("/api/dates")
+async def create_date(date: DateCreate):
+    try:
+        data = {k: v for k, v in date.dict().items() if v is not None}
+        date_id = await run_blocking(save_date, data)
+        return {"date_id": date_id, "message": "Date created successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/dates/{user_id}")
+async def get_user_dates(
+    user_id: str,
+    view: Literal["all", "upcoming", "month"] = "all",
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"), # view=month, default: this month
+    q: Optional[str] = None,
+):
+    """A user's dates: all (creation order), upcoming or one month (date order), or matching q."""
+    try:
+        if q:
+            dates = await run_blocking(search_dates, q, user_id)
+        elif view == "upcoming":
+            dates = await run_blocking(get_upcoming_dates, user_id)
+        elif view == "month":
+            month = month or datetime.datetime.now().strftime("%Y-%m")
+            dates = await run_blocking(get_dates_in_month, month, user_id)
+        else:
+            dates = await run_blocking(get_dates_by_user, user_id)
+        return {"dates": dates}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/api/dates/{date_id}")
+async def update_date_endpoint(date_id: str, updates: DateUpdate):
+    try:
+        success = await run_blocking(update_date, date_id, updates.dict(exclude_unset=True))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not success:
+        raise HTTPException(status_code=404, detail="Date not found")
+    return {"message": "Date updated successfully"}
+
+@app.delete("/api/dates/{date_id}")
+async def delete_date_endpoint(date_id: str):
+    try:
+        success = await run_blocking(delete_date, date_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not success:
+        raise HTTPException(status_code=404, detail="Date not found")
+    return {"message": "Date deleted successfully"}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,255 @@
+"""
+In-process metrics with Prometheus text exposition (served at /metrics by main.py).
+
+- tracked(op): decorator for a request handler; records total latency, outcome and the
+  number of Firebase reads/writes and Gemini calls made while it ran.
+- mark(stage): inside a tracked handler, records the time since the previous mark
+  (or the start) as that stage.
+- timed(function): decorator recording the latency of a storage call.
+- count(kind): counts a Firebase read/write or Gemini call for the current request.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+# Per-request counters
+FIREBASE_READ = "firebase_reads"
+FIREBASE_WRITE = "firebase_writes"
+GEMINI_CALL = "gemini_calls"
+REQUEST_COUNTS = (FIREBASE_READ, FIREBASE_WRITE, GEMINI_CALL)
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {} # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, c in zip(self.buckets, counts):
+                    cumulative += c
+                    lines.append(f"{self.name}_bucket{_label_str(names, key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_str(names, key + ('+Inf',))} {n}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, key)} {n}")
+        return lines
+
+REQUEST_SECONDS = Histogram("find_dee_request_seconds", "Handler latency.", ("op",))
+REQUESTS_TOTAL = Counter("find_dee_requests_total", "Handler invocations by outcome.", ("op", "status"))
+STAGE_SECONDS = Histogram("find_dee_stage_seconds", "Latency of each stage of a handler.", ("op", "stage"))
+REQUEST_OPS = Histogram(
+    "find_dee_request_backend_calls", "Firebase reads/writes and Gemini calls per handler invocation.",
+    ("op", "kind"), buckets=COUNT_BUCKETS
+)
+BACKEND_CALLS_TOTAL = Counter("find_dee_backend_calls_total", "Firebase reads/writes and Gemini calls.", ("kind",))
+STORAGE_CALL_SECONDS = Histogram("find_dee_storage_call_seconds", "Latency of firebase_config functions.", ("function",))
+GEMINI_CALL_SECONDS = Histogram("find_dee_gemini_call_seconds", "Latency of Gemini API calls.", ("method",))
+
+METRICS = [
+    REQUEST_SECONDS, REQUESTS_TOTAL, STAGE_SECONDS, REQUEST_OPS,
+    BACKEND_CALLS_TOTAL, STORAGE_CALL_SECONDS, GEMINI_CALL_SECONDS,
+]
+
+# Extra sources rendered at scrape time (e.g. search cache stats); each returns lines
+_collectors = []
+
+def register_collector(callback):
+    _collectors.append(callback)
+
+class _RequestState:
+    def __init__(self, op):
+        self.op = op
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.counts = dict.fromkeys(REQUEST_COUNTS, 0)
+        self.lock = threading.Lock()
+
+_current = contextvars.ContextVar("find_dee_request", default=None)
+
+def count(kind, amount=1):
+    """Counts a backend call globally and for the current tracked request."""
+    BACKEND_CALLS_TOTAL.inc(amount, kind=kind)
+    state = _current.get()
+    if state is not None:
+        with state.lock:
+            state.counts[kind] += amount
+
+def mark(stage):
+    """Records the time since the previous mark as `stage` of the current request."""
+    state = _current.get()
+    if state is None:
+        return
+    now = time.perf_counter()
+    with state.lock:
+        elapsed, state.last = now - state.last, now
+    STAGE_SECONDS.observe(elapsed, op=state.op, stage=stage)
+
+def _begin(op):
+    state = _RequestState(op)
+    return state, _current.set(state)
+
+def _end(state, token, status):
+    _current.reset(token)
+    REQUEST_SECONDS.observe(time.perf_counter() - state.start, op=state.op)
+    REQUESTS_TOTAL.inc(op=state.op, status=status)
+    for kind, n in state.counts.items():
+        REQUEST_OPS.observe(n, op=state.op, kind=kind)
+
+def tracked(op):
+    """Decorator for sync or async handlers. Keeps the signature (FastAPI reads it)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                state, token = _begin(op)
+                status = "error"
+                try:
+                    result = await func(*args, **kwargs)
+                    status = "ok"
+                    return result
+                finally:
+                    _end(state, token, status)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            state, token = _begin(op)
+            status = "error"
+            try:
+                result = func(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                _end(state, token, status)
+        return wrapper
+    return decorator
+
+def timed(function_name, histogram=STORAGE_CALL_SECONDS, label="function"):
+    """Decorator recording the latency of a blocking call."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - t0, **{label: function_name})
+        return wrapper
+    return decorator
+
+class _GeminiSection:
+    def __init__(self, target, section):
+        self._target = target
+        self._section = section
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        method = f"{self._section}.{name}"
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            count(GEMINI_CALL)
+            t0 = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                GEMINI_CALL_SECONDS.observe(time.perf_counter() - t0, method=method)
+        return call
+
+class InstrumentedGeminiClient:
+    """Wraps a genai.Client so models.* and files.* calls are counted and timed."""
+    def __init__(self, client):
+        self._client = client
+        self.models = _GeminiSection(client.models, "models")
+        self.files = _GeminiSection(client.files, "files")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+def instrument_services(*services):
+    """Wraps the Gemini client (`.model`) of each TagGenerator/TagDeduplicator/TagSearch."""
+    for service in services:
+        if service is not None and not isinstance(service.model, InstrumentedGeminiClient):
+            service.model = InstrumentedGeminiClient(service.model)
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for callback in _collectors:
+        try:
+            lines.extend(callback())
+        except Exception as e:
+            print(f"Error in metrics collector: {e}")
+    return "\n".join(lines) + "\n"
+
+def _sample_lines(name, help_text, kind, samples, labels):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for key, value in sorted(samples.items()):
+        lines.append(f"{name}{_label_str(labels, key)} {value}")
+    return lines
+
+def gauge_lines(name, help_text, samples, labels=()):
+    """Formats {label values tuple: value} as a Prometheus gauge (for collectors)."""
+    return _sample_lines(name, help_text, "gauge", samples, labels)
+
+def counter_lines(name, help_text, samples, labels=()):
+    """Formats {label values tuple: value} as a Prometheus counter named name_total (for collectors' monotonic totals)."""
+    return _sample_lines(f"{name}_total", help_text, "counter", samples, labels)
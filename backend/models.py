@@ -1,16 +1,42 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Index, func
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
 
+# Tables for the SQLite storage backend (sqlite_backend.py). Records are returned in
+# the same shape as the RTDB nodes; keys without a column are kept in `extra`/`data`.
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
     line_user_id = Column(String, unique=True, index=True)
     display_name = Column(String)
-    
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
     files = relationship("File", back_populates="owner")
+    memberships = relationship("GroupMember", back_populates="user", cascade="all, delete-orphan")
+
+class Group(Base):
+    __tablename__ = "groups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    line_group_id = Column(String, unique=True, index=True)
+    name = Column(String)
+
+    files = relationship("File", back_populates="group")
+    members = relationship("GroupMember", back_populates="group", cascade="all, delete-orphan")
+
+class GroupMember(Base):
+    __tablename__ = "group_members"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    group_id = Column(Integer, ForeignKey("groups.id"), primary_key=True, index=True)
+    group_name = Column(String) # As saved for this user (users/{id}/groups/{group_id} in RTDB)
+
+    user = relationship("User", back_populates="memberships")
+    group = relationship("Group", back_populates="members")
 
 class File(Base):
     __tablename__ = "files"
@@ -19,17 +45,102 @@ class File(Base):
     filename = Column(String, index=True)
     file_type = Column(String) # pdf, image
     storage_path = Column(String)
+    url = Column(String)
     upload_date = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime)
     owner_id = Column(Integer, ForeignKey("users.id"))
-    
+    group_id = Column(Integer, ForeignKey("groups.id"), nullable=True)
+    version = Column(String)
+    detail_summary = Column(Text)
+    description = Column(Text)
+    due_date_id = Column(String)
+    extra = Column(JSON) # Any other keys of the file record
+
     owner = relationship("User", back_populates="files")
-    tags = relationship("Tag", back_populates="file")
+    group = relationship("Group", back_populates="files")
+    tags = relationship("Tag", back_populates="file", cascade="all, delete-orphan", order_by="Tag.id")
+
+    __table_args__ = (
+        Index("ix_files_owner_upload", "owner_id", "upload_date"),
+        Index("ix_files_group_upload", "group_id", "upload_date"),
+    )
 
 class Tag(Base):
     __tablename__ = "tags"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    file_id = Column(Integer, ForeignKey("files.id"))
-    
+    file_id = Column(Integer, ForeignKey("files.id"), index=True)
+
     file = relationship("File", back_populates="tags")
+
+# Case-insensitive tag lookups (search_files_by_tags)
+Index("ix_tags_name_lower", func.lower(Tag.name), Tag.file_id)
+
+class PoolTag(Base):
+    """The global tag pool (tags/all in RTDB), in saved order."""
+    __tablename__ = "tag_pool"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True)
+
+class TagAlias(Base):
+    """Raw tag (case-folded) -> canonical pool tag (tag_aliases/ in RTDB)."""
+    __tablename__ = "tag_aliases"
+
+    alias = Column(String, primary_key=True)
+    canonical = Column(String, nullable=False)
+
+class FilenameReservation(Base):
+    """Names claimed by in-flight uploads (reserve_filename), until the file record is saved."""
+    __tablename__ = "filename_reservations"
+
+    name = Column(String, primary_key=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class AnalysisCacheEntry(Base):
+    """Gemini metadata keyed by file content SHA-256 (analysis_cache/{hash} in RTDB)."""
+    __tablename__ = "analysis_cache"
+
+    content_hash = Column(String, primary_key=True)
+    data = Column(JSON) # tags, title, summary, suggested_filename
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class DateEntry(Base):
+    __tablename__ = "dates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(String, index=True) # LINE user id
+    date = Column(String, index=True) # 'date' or 'date_time' of the record, ISO formatted
+    title = Column(String)
+    description = Column(Text)
+    data = Column(JSON) # Full record as saved
+
+    __table_args__ = (
+        Index("ix_dates_owner_date", "owner_id", "date"),
+    )
+
+class Collection(Base):
+    __tablename__ = "collections"
+
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(String, index=True) # LINE user id
+    name = Column(String)
+    updated_at = Column(String, index=True)
+    data = Column(JSON) # Remaining fields (description, created_at, ...)
+
+    files = relationship("CollectionFile", cascade="all, delete-orphan", order_by="CollectionFile.position")
+    shares = relationship("CollectionShare", cascade="all, delete-orphan")
+
+class CollectionFile(Base):
+    __tablename__ = "collection_files"
+
+    collection_id = Column(Integer, ForeignKey("collections.id"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    file_id = Column(String, index=True)
+
+class CollectionShare(Base):
+    __tablename__ = "collection_shares"
+
+    collection_id = Column(Integer, ForeignKey("collections.id"), primary_key=True)
+    user_id = Column(String, primary_key=True, index=True) # LINE user id
@@ -0,0 +1,296 @@
+"""
+In-process replica of RTDB subtrees, kept current by listen() streams.
+
+Each mirrored root (files, users, tags, collections) is loaded by the initial
+snapshot of its stream, then patched by every change event. Writes made through
+firebase_config are also applied locally as soon as RTDB acknowledges them, so a
+process always reads its own writes even before their events come back. A write
+is registered before it is sent; while a later local write to the same path is
+still waiting for its echo, older events for that path are not applied over it.
+The latest such event per path is held back instead of dropped: it is applied
+once no local write to its path is pending (the write failed or its echo never
+came), unless newer data for the path arrived meanwhile.
+
+files/ is indexed by owner_id and group_id, so per-user and per-group listings
+do not scan the whole tree.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+DEFAULT_ROOTS = ('files', 'users', 'tags', 'collections')
+INDEXED_CHILDREN = {'files': ('owner_id', 'group_id')}
+
+def _split(path):
+    return tuple(p for p in (path or '').strip('/').split('/') if p)
+
+def _detached(value):
+    if isinstance(value, dict):
+        return {k: _detached(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_detached(v) for v in value]
+    return value
+
+def _overlaps(a, b):
+    # One path is the other or contains it
+    n = min(len(a), len(b))
+    return a[:n] == b[:n]
+
+def _with_child(value, parts, child):
+    """Copy of value with child set at the relative path parts (None deletes; empty parents disappear)."""
+    if isinstance(value, list):
+        value = {str(i): v for i, v in enumerate(value) if v is not None}
+    node = dict(value) if isinstance(value, dict) else {}
+    sub = child if len(parts) == 1 else _with_child(node.get(parts[0]), parts[1:], child)
+    if sub is None:
+        node.pop(parts[0], None)
+    else:
+        node[parts[0]] = _detached(sub)
+    return node or None
+
+class RtdbReplica:
+    def __init__(self, roots=DEFAULT_ROOTS, echo_timeout=30.0):
+        self.roots = tuple(roots)
+        self.echo_timeout = echo_timeout
+        self._tree = {}
+        self._ready = set()
+        self._index = {(root, child): defaultdict(set) for root, children in INDEXED_CHILDREN.items()
+                       for child in children}
+        self._indexed_values = {key: {} for key in self._index} # (root, child) -> {id: value}
+        self._pending = {} # path parts -> deque of local write times not yet echoed by the stream
+        self._deferred = {} # path parts -> latest event value held back by a pending local write
+        self._registrations = []
+        self._lock = threading.RLock()
+        self.events = 0
+        self.local_reads = 0
+        self.echo_timeouts = 0
+        self.last_event_at = None
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+        self._lag_total = 0.0
+        self._lag_count = 0
+
+    # --- Streams ---
+
+    def start(self, reference):
+        """Subscribes to every root. reference(path) returns an object with listen(callback)."""
+        for root in self.roots:
+            self._registrations.append(
+                reference(root).listen(lambda event, root=root: self.on_event(root, event))
+            )
+
+    def stop(self):
+        for registration in self._registrations:
+            registration.close()
+        self._registrations = []
+
+    def ready(self, root):
+        return root in self._ready
+
+    def on_event(self, root, event):
+        """Applies one stream event (event_type 'put' or 'patch', path relative to root, data)."""
+        base = (root,) + _split(event.path)
+        if event.event_type == 'put':
+            changes = [(base, event.data)]
+        elif event.event_type == 'patch':
+            changes = [(base + _split(key), value) for key, value in (event.data or {}).items()]
+        else:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self.events += 1
+            self.last_event_at = now
+            for parts, value in changes:
+                self._supersede(parts, value)
+                if self._echoed(parts, now):
+                    self._set(parts, value)
+                elif not any(parts[:len(path)] == path for path in self._deferred):
+                    self._deferred[parts] = _detached(value)
+            self._apply_deferred()
+            if event.event_type == 'put' and base == (root,):
+                self._ready.add(root)
+
+    def _echoed(self, parts, now):
+        """Matches an event to the oldest unechoed local write it overlaps. False while newer local writes are pending."""
+        blocked = False
+        for path in [p for p in self._pending if _overlaps(p, parts)]:
+            times = self._pending[path]
+            while times and now - times[0] > self.echo_timeout:
+                times.popleft()
+                self.echo_timeouts += 1
+            if times:
+                lag = now - times.popleft()
+                self.lag_last = lag
+                self.lag_max = max(self.lag_max, lag)
+                self._lag_total += lag
+                self._lag_count += 1
+            if times:
+                blocked = True
+            else:
+                del self._pending[path]
+        return not blocked
+
+    def _supersede(self, parts, value):
+        """Newer data at parts replaces what held-back events carry for it."""
+        for path in list(self._deferred):
+            if path[:len(parts)] == parts:
+                del self._deferred[path]
+            elif parts[:len(path)] == path:
+                self._deferred[path] = _with_child(self._deferred[path], parts[len(path):], value)
+
+    def _apply_deferred(self):
+        """Applies held-back events no pending local write overlaps anymore."""
+        for path in list(self._deferred):
+            if not any(_overlaps(pending, path) for pending in self._pending):
+                self._set(path, self._deferred.pop(path))
+
+    # --- Local writes (read-your-writes) ---
+
+    def _changes(self, path, value, merge):
+        """(parts, value) pairs under mirrored, loaded roots touched by a set (or update when merge) at path."""
+        base = _split(path)
+        if merge:
+            changes = [(base + _split(key), v) for key, v in (value or {}).items()]
+        elif not base:
+            # Set of the whole database
+            changes = [((root,), (value or {}).get(root)) for root in self.roots]
+        else:
+            changes = [(base, value)]
+        # Roots not loaded yet get the write from their initial snapshot or a later event
+        return [(parts, v) for parts, v in changes if parts and parts[0] in self._ready]
+
+    def begin_write(self, path, value=None, merge=False):
+        """Registers a write about to be sent, so its echo is recognized even if it beats the acknowledgement."""
+        now = time.monotonic()
+        with self._lock:
+            parts_list = [parts for parts, _ in self._changes(path, value, merge)]
+            for parts in parts_list:
+                self._pending.setdefault(parts, deque()).append(now)
+        return now, parts_list
+
+    def finish_write(self, path, value, merge=False):
+        """Applies a write RTDB acknowledged: set (None deletes), or update when merge."""
+        with self._lock:
+            for parts, v in self._changes(path, value, merge):
+                # Events held back for this path predate the write
+                self._supersede(parts, v)
+                self._set(parts, v)
+
+    def cancel_write(self, token):
+        """Forgets a write that failed (no echo will come)."""
+        started, parts_list = token
+        with self._lock:
+            for parts in parts_list:
+                times = self._pending.get(parts)
+                if times and started in times:
+                    times.remove(started)
+                    if not times:
+                        del self._pending[parts]
+            self._apply_deferred()
+
+    # --- Tree ---
+
+    def _set(self, parts, value):
+        root = parts[0]
+        if len(parts) == 1:
+            self._tree[root] = _detached(value) if value is not None else {}
+        else:
+            node = self._tree.setdefault(root, {})
+            if value is None:
+                self._remove(node, parts[1:])
+            else:
+                for p in parts[1:-1]:
+                    child = node.get(p)
+                    if isinstance(child, list):
+                        # Arrays are objects with integer keys in RTDB
+                        child = node[p] = {str(i): v for i, v in enumerate(child) if v is not None}
+                    elif not isinstance(child, dict):
+                        child = node[p] = {}
+                    node = child
+                node[parts[-1]] = _detached(value)
+        if root in INDEXED_CHILDREN:
+            if len(parts) == 1:
+                for key in self._indexed_values:
+                    if key[0] == root:
+                        self._index[key].clear()
+                        self._indexed_values[key].clear()
+                for item_id in list(self._tree.get(root) or {}):
+                    self._reindex(root, item_id)
+            else:
+                self._reindex(root, parts[1])
+
+    @staticmethod
+    def _remove(node, parts):
+        # Empty parents disappear, as in RTDB
+        trail = []
+        for p in parts[:-1]:
+            child = node.get(p) if isinstance(node, dict) else None
+            if not isinstance(child, dict):
+                return
+            trail.append((node, p))
+            node = child
+        node.pop(parts[-1], None)
+        while trail and not node:
+            node, p = trail.pop()
+            node.pop(p, None)
+
+    def _reindex(self, root, item_id):
+        item = (self._tree.get(root) or {}).get(item_id)
+        for child in INDEXED_CHILDREN[root]:
+            key = (root, child)
+            old = self._indexed_values[key].pop(item_id, None)
+            if old is not None:
+                self._index[key][old].discard(item_id)
+                if not self._index[key][old]:
+                    del self._index[key][old]
+            new = item.get(child) if isinstance(item, dict) else None
+            if isinstance(new, str):
+                self._index[key][new].add(item_id)
+                self._indexed_values[key][item_id] = new
+
+    # --- Reads ---
+
+    def get(self, path):
+        """Detached copy of the node at path (None if absent)."""
+        parts = _split(path)
+        with self._lock:
+            self.local_reads += 1
+            node = self._tree
+            for p in parts:
+                if not isinstance(node, dict) or p not in node:
+                    return None
+                node = node[p]
+            return _detached(node)
+
+    def query(self, root, child, value):
+        """{id: record} of the children of root whose child equals value, like order_by_child().equal_to()."""
+        with self._lock:
+            self.local_reads += 1
+            items = self._tree.get(root) or {}
+            if (root, child) in self._index:
+                ids = self._index[(root, child)].get(value, ())
+                return {item_id: _detached(items[item_id]) for item_id in ids}
+            return {k: _detached(v) for k, v in items.items()
+                    if isinstance(v, dict) and v.get(child) == value}
+
+    def project(self, root, child, default=None):
+        """{id: record.get(child, default)} over the children of root, without copying whole records."""
+        with self._lock:
+            self.local_reads += 1
+            return {k: _detached(v.get(child, default)) for k, v in (self._tree.get(root) or {}).items()
+                    if isinstance(v, dict)}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready_roots': len(self._ready),
+                'events': self.events,
+                'local_reads': self.local_reads,
+                'pending_echoes': sum(len(t) for t in self._pending.values()),
+                'deferred_events': len(self._deferred),
+                'echo_timeouts': self.echo_timeouts,
+                'echo_lag_last_seconds': self.lag_last,
+                'echo_lag_max_seconds': self.lag_max,
+                'echo_lag_avg_seconds': self._lag_total / self._lag_count if self._lag_count else 0.0,
+                'seconds_since_event': time.monotonic() - self.last_event_at if self.last_event_at else -1,
+            }
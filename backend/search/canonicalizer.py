@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+
+try:
+    from .query_cache import normalize_query, tag_pool_version
+    from .local_matcher import LocalTagMatcher
+except ImportError:
+    from query_cache import normalize_query, tag_pool_version
+    from local_matcher import LocalTagMatcher
+
+class TagCanonicalizer:
+    """
+    Incremental tag canonicalization for uploads.
+    Raw tags resolve through a persisted alias map (raw tag -> canonical tag); a tag
+    matching a pool tag up to case/whitespace resolves locally. Only tags never seen
+    before go to the model, compared against a shortlist of similar canonical tags
+    (the whole pool only while it is small), so an upload costs O(new tags) instead
+    of O(pool). Only answers the model actually gave are persisted: a tag it did not
+    resolve (error, omission, no deduplicator) keeps its raw form for this upload,
+    stays out of the alias map and the pool, and goes to the model again next time. Merging canonical tags with each other
+    is left to the periodic reconcile job (deduplicate_tags.py).
+    """
+    def __init__(self, deduplicator, load_aliases: Callable[[List[str]], Dict[str, str]],
+                 save_aliases: Callable[[Dict[str, str]], object], shortlist_size: int = None,
+                 full_pool_max: int = None):
+        self.deduplicator = deduplicator
+        self.load_aliases = load_aliases
+        self.save_aliases = save_aliases
+        # Canonical tags offered to the model per new tag once the pool is large
+        self.shortlist_size = shortlist_size or int(os.environ.get("CANONICAL_SHORTLIST", "10"))
+        # Up to this pool size the whole pool is offered (catches cross-language synonyms)
+        self.full_pool_max = full_pool_max if full_pool_max is not None else int(os.environ.get("CANONICAL_FULL_POOL_MAX", "200"))
+        self._matcher = None
+        self._matcher_version = None
+        # How tags were resolved: "alias", "pool", "model" or "unresolved" (kept raw, not persisted)
+        self.resolution_counts = Counter()
+        self._lock = threading.Lock()
+
+    def _get_matcher(self, tag_pool: List[str]) -> LocalTagMatcher:
+        version = tag_pool_version(tag_pool)
+        with self._lock:
+            if self._matcher is None or self._matcher_version != version:
+                self._matcher = LocalTagMatcher(tag_pool or [])
+                self._matcher_version = version
+            return self._matcher
+
+    def candidates(self, new_tags: List[str], tag_pool: List[str]) -> List[str]:
+        """Canonical tags the model compares new tags against."""
+        if len(tag_pool) <= self.full_pool_max:
+            return list(tag_pool)
+        matcher = self._get_matcher(tag_pool)
+        shortlist = {}
+        for tag in new_tags:
+            for candidate, _ in matcher.score(tag)[:self.shortlist_size]:
+                shortlist.setdefault(candidate, None)
+        return list(shortlist)
+
+    def canonicalize(self, tags: List[str], tag_pool: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Returns ({raw tag: canonical tag}, canonical tags not yet in the pool).
+        Newly resolved tags are written to the alias map; unresolved ones map to
+        themselves and are neither persisted nor offered for the pool.
+        """
+        tag_pool = [t for t in tag_pool or [] if isinstance(t, str)]
+        tags = list(dict.fromkeys(t.strip() for t in tags or [] if isinstance(t, str) and t.strip()))
+        if not tags:
+            return {}, []
+
+        pool_by_norm = {}
+        for tag in tag_pool:
+            pool_by_norm.setdefault(normalize_query(tag), tag)
+
+        mapping = {}
+        learned = {}
+        unseen = []
+        unresolved = set()
+        known = self.load_aliases(tags) or {}
+        for tag in tags:
+            if known.get(tag):
+                mapping[tag] = known[tag]
+                self._count("alias")
+            elif normalize_query(tag) in pool_by_norm:
+                mapping[tag] = learned[tag] = pool_by_norm[normalize_query(tag)]
+                self._count("pool")
+            else:
+                unseen.append(tag)
+
+        if unseen:
+            resolved = {}
+            if self.deduplicator:
+                resolved = self.deduplicator.canonicalize(unseen, self.candidates(unseen, tag_pool))
+            for tag in unseen:
+                if tag not in resolved:
+                    mapping[tag] = tag
+                    unresolved.add(tag)
+                    self._count("unresolved")
+                    continue
+                # Use the pool's spelling when the model returns a case variant of a pool tag
+                canonical = pool_by_norm.get(normalize_query(resolved[tag]), resolved[tag])
+                mapping[tag] = learned[tag] = canonical
+                learned.setdefault(canonical, canonical)
+                self._count("model")
+
+        if learned:
+            self.save_aliases(learned)
+
+        new_canonical = list(dict.fromkeys(
+            c for t, c in mapping.items() if t not in unresolved and normalize_query(c) not in pool_by_norm
+        ))
+        return mapping, new_canonical
+
+    def _count(self, source: str):
+        with self._lock:
+            self.resolution_counts[source] += 1
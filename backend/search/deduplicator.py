@@ -75,3 +75,50 @@ class TagDeduplicator:
             print(f"Error deduplicating tags: {e}")
             # Fallback: map each tag to itself
             return {tag: tag for tag in tags}
+
+    def canonicalize(self, new_tags: List[str], canonical_tags: List[str]) -> dict:
+        """
+        Maps tags not seen before onto an existing set of canonical tags.
+        The prompt carries only the new tags and the given canonical tags (not the whole pool).
+        Returns only the tags the model resolved: none on a model or parse error, and
+        tags it left out are missing, so callers can tell "no answer" from "no match".
+        """
+        if not new_tags:
+            return {}
+
+        prompt = f"""
+        Map each new tag to a canonical tag, ignoring the language of the tags.
+        If a new tag means the same as one of the existing canonical tags, use that existing tag exactly as written.
+        Otherwise use the most canonical/common form of the new tag; new tags that mean the same map to the same value.
+        Return ONLY a JSON object where the key is the new tag and the value is its canonical tag.
+        Every new tag MUST be present as a key in the returned JSON.
+
+        Existing canonical tags:
+        {json.dumps(canonical_tags)}
+
+        New tags:
+        {json.dumps(new_tags)}
+        """
+        try:
+            response = self.model.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=0,
+                    thinking_config=types.ThinkingConfig(thinking_budget=0) # Disables thinking
+                )
+            )
+            text = response.text.strip()
+            if text.startswith("```json"):
+                text = text[7:-3]
+            elif text.startswith("```"):
+                text = text[3:-3]
+            mapping = json.loads(text)
+        except Exception as e:
+            print(f"Error canonicalizing tags: {e}")
+            return {}
+        if not isinstance(mapping, dict):
+            print(f"Error canonicalizing tags: expected a JSON object, got {type(mapping).__name__}")
+            return {}
+        return {tag: mapping[tag].strip() for tag in new_tags
+                if isinstance(mapping.get(tag), str) and mapping[tag].strip()}
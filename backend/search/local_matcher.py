@@ -0,0 +1,91 @@
+import re
+from typing import List, Tuple
+
+try:
+    from .query_cache import normalize_query
+except ImportError:
+    from query_cache import normalize_query
+
+# Tags at or below this length are only matched exactly (n-grams are too noisy)
+MIN_FUZZY_LENGTH = 4
+# Thai has no word spaces, so a non-Latin tag found inside a longer run may be part of
+# an unrelated word (ภาพ in ภาพยนตร์, งาน in งานวิจัย). Tags shorter than this only
+# score 1.0 as a whole space-separated query word; inside a run they get
+# SHORT_SUBSTRING_CONFIDENCE, below the default LOCAL_MATCH_THRESHOLD, so the
+# query goes on to the cache / Gemini
+MIN_SUBSTRING_LENGTH = 5
+SHORT_SUBSTRING_CONFIDENCE = 0.5
+
+_LATIN_RE = re.compile(r'[a-z0-9]')
+
+def char_ngrams(text: str, n: int = 3) -> set:
+    """Character n-grams of a space-padded string. Script-agnostic (Thai has no word spaces)."""
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+class LocalTagMatcher:
+    """
+    Resolves query tags against the tag pool without a model call.
+    A tag scores 1.0 when it appears verbatim in the query (on word boundaries
+    for Latin script, as a plain substring for Thai tags of MIN_SUBSTRING_LENGTH
+    characters or more, as a whole word for shorter ones), otherwise the fraction
+    of its character trigrams found in the query.
+    """
+    def __init__(self, tag_pool: List[str], n: int = 3):
+        self.n = n
+        self.tags = []       # (original, normalized, grams)
+        self.gram_index = {} # gram -> set(tag position)
+        for tag in tag_pool or []:
+            if not isinstance(tag, str):
+                continue
+            norm = normalize_query(tag)
+            if not norm:
+                continue
+            grams = char_ngrams(norm, n)
+            pos = len(self.tags)
+            self.tags.append((tag, norm, grams))
+            for g in grams:
+                self.gram_index.setdefault(g, set()).add(pos)
+
+    @staticmethod
+    def _verbatim(query: str, tag: str) -> float:
+        """Confidence of a verbatim occurrence of tag in query (0.0 when there is none)."""
+        if _LATIN_RE.match(tag[0]) or _LATIN_RE.match(tag[-1]):
+            pattern = r'(?<![a-z0-9])' + re.escape(tag) + r'(?![a-z0-9])'
+            return 1.0 if re.search(pattern, query) else 0.0
+        if tag not in query:
+            return 0.0
+        if len(tag) >= MIN_SUBSTRING_LENGTH or tag in query.split():
+            return 1.0
+        return SHORT_SUBSTRING_CONFIDENCE
+
+    def score(self, query: str) -> List[Tuple[str, float]]:
+        """Returns (tag, confidence) pairs for every tag that shares grams with the query, best first."""
+        q = normalize_query(query)
+        if not q:
+            return []
+        q_grams = char_ngrams(q, self.n)
+
+        # Only tags sharing at least one gram with the query are candidates
+        overlap = {}
+        for g in q_grams:
+            for pos in self.gram_index.get(g, ()):
+                overlap[pos] = overlap.get(pos, 0) + 1
+
+        scored = []
+        for pos, shared in overlap.items():
+            tag, norm, grams = self.tags[pos]
+            confidence = self._verbatim(q, norm)
+            if not confidence:
+                if len(norm) <= MIN_FUZZY_LENGTH:
+                    continue
+                confidence = shared / len(grams)
+            scored.append((tag, confidence))
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return scored
+
+    def match(self, query: str, threshold: float = 0.8) -> List[str]:
+        """Returns the pool tags whose confidence is at or above threshold."""
+        return [tag for tag, confidence in self.score(query) if confidence >= threshold]
@@ -0,0 +1,111 @@
+import io
+import os
+import threading
+from collections import Counter
+from typing import Tuple
+
+from google.genai import types
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# Modes a file can be sent to Gemini in
+TEXT = "text"       # extracted text sample (PDFs with a text layer, plain text)
+INLINE = "inline"   # bytes inlined in the generate call (downscaled images, small files)
+UPLOAD = "upload"   # Files API upload of the original (large files we cannot shrink)
+
+class MediaPreprocessor:
+    """
+    Shrinks a file before analysis. Images are downscaled to max_image_edge and
+    re-encoded as JPEG; PDFs are reduced to the text of their first pdf_pages pages.
+    Anything that ends up at most inline_max_bytes is sent inline with the generate
+    call, so only large files still pay for the Files API upload round trip.
+    Pillow / pypdf are optional: without them files are sent as they are.
+    """
+    def __init__(self, max_image_edge: int = None, jpeg_quality: int = None, pdf_pages: int = None,
+                 pdf_chars: int = None, inline_max_bytes: int = None):
+        self.max_image_edge = max_image_edge or int(os.environ.get("MEDIA_MAX_IMAGE_EDGE", "1536"))
+        self.jpeg_quality = jpeg_quality or int(os.environ.get("MEDIA_JPEG_QUALITY", "85"))
+        self.pdf_pages = pdf_pages or int(os.environ.get("PDF_SAMPLE_PAGES", "10"))
+        self.pdf_chars = pdf_chars or int(os.environ.get("PDF_SAMPLE_CHARS", "20000"))
+        # Gemini accepts inline payloads up to 20 MB per request; stay well below it
+        self.inline_max_bytes = inline_max_bytes or int(os.environ.get("INLINE_MAX_BYTES", str(4 * 1024 * 1024)))
+        self.bytes_in = 0
+        self.bytes_sent = 0
+        self.mode_counts = Counter()
+        self._lock = threading.Lock()
+
+    def prepare(self, file_path: str, mime_type: str = None) -> Tuple[str, object]:
+        """
+        Returns (mode, payload): the text sample (TEXT), an inline types.Part (INLINE)
+        or the original path for the caller to upload (UPLOAD).
+        """
+        mime_type = mime_type or "application/octet-stream"
+        size = os.path.getsize(file_path)
+        mode, payload, sent = UPLOAD, file_path, size
+        try:
+            if mime_type.startswith("image/") and Image is not None:
+                data = self._downscale_image(file_path)
+                if data is not None and len(data) < size:
+                    mode, payload, sent = INLINE, types.Part.from_bytes(data=data, mime_type="image/jpeg"), len(data)
+            elif mime_type == "application/pdf" and PdfReader is not None:
+                text = self._pdf_text(file_path)
+                if text:
+                    mode, payload, sent = TEXT, text, len(text.encode("utf-8"))
+            elif mime_type.startswith("text/"):
+                with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                    text = f.read(self.pdf_chars)
+                mode, payload, sent = TEXT, text, len(text.encode("utf-8"))
+        except Exception as e:
+            # Unreadable or corrupt media: fall back to sending the original
+            print(f"Error pre-processing {file_path}: {e}")
+
+        if mode == UPLOAD and size <= self.inline_max_bytes:
+            with open(file_path, "rb") as f:
+                mode, payload = INLINE, types.Part.from_bytes(data=f.read(), mime_type=mime_type)
+
+        with self._lock:
+            self.bytes_in += size
+            self.bytes_sent += sent
+            self.mode_counts[mode] += 1
+        return mode, payload
+
+    def _downscale_image(self, file_path: str):
+        with Image.open(file_path) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((self.max_image_edge, self.max_image_edge))
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=self.jpeg_quality, optimize=True)
+            return out.getvalue()
+
+    def _pdf_text(self, file_path: str) -> str:
+        """Text of the first pdf_pages pages, capped at pdf_chars; empty for scanned PDFs."""
+        reader = PdfReader(file_path)
+        parts, length = [], 0
+        for page in reader.pages[:self.pdf_pages]:
+            text = (page.extract_text() or "").strip()
+            if text:
+                parts.append(text)
+                length += len(text)
+            if length >= self.pdf_chars:
+                break
+        text = "\n\n".join(parts)[:self.pdf_chars]
+        # A few characters is a scanned PDF's stray OCR noise, not a usable sample
+        return text if len(text.strip()) >= 200 else ""
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "bytes_in": self.bytes_in,
+                "bytes_sent": self.bytes_sent,
+                **{f"files_{mode}": n for mode, n in self.mode_counts.items()},
+            }
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query for cache lookups: unicode NFKC, case-folded,
+    with surrounding and repeated whitespace collapsed.
+    """
+    if not query:
+        return ""
+    query = unicodedata.normalize("NFKC", query)
+    return " ".join(query.casefold().split())
+
+def tag_pool_version(tag_pool: List[str] = None) -> str:
+    """Returns a stable hash of the tag pool (order-insensitive)."""
+    pool = sorted(set(tag_pool or []))
+    payload = json.dumps(pool, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+class QueryTagCache:
+    """
+    LRU + TTL memo for query-tag extraction.
+    Entries are keyed on (normalized query, tag pool version), so a changed
+    pool never serves stale tags; clear() is wired to save_tag_pool as well.
+    """
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, query: str, tag_pool: List[str] = None):
+        return (normalize_query(query), tag_pool_version(tag_pool))
+
+    def get(self, query: str, tag_pool: List[str] = None) -> Optional[List[str]]:
+        key = self._key(query, tag_pool)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, tags = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(tags)
+
+    def put(self, query: str, tag_pool: List[str], tags: List[str]):
+        if self.max_size <= 0:
+            return
+        key = self._key(query, tag_pool)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, list(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self, *args, **kwargs):
+        """Drops every entry. Accepts (and ignores) listener arguments."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
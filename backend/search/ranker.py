@@ -0,0 +1,225 @@
+import math
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try:
+    from .query_cache import normalize_query
+except ImportError:
+    from query_cache import normalize_query
+
+# Relative weight of a term occurrence in each field (BM25F-style)
+FIELD_WEIGHTS = {
+    "tags": 3.0,
+    "filename": 2.0,
+    "detail_summary": 1.0,
+}
+
+# Exact tag tokens are prefixed so they never collide with plain words
+TAG_PREFIX = "#"
+
+_SPLIT_RE = re.compile(r"[\s_\-\.,;:!?/\\()\[\]{}\"'`#|+*&%$@<>=~]+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into terms. ASCII words are kept whole; other runs (e.g. Thai,
+    which has no spaces between words) become character trigrams.
+    """
+    terms = []
+    for piece in _SPLIT_RE.split(normalize_query(text or "")):
+        if not piece:
+            continue
+        if piece.isascii() or len(piece) <= 3:
+            terms.append(piece)
+        else:
+            terms.extend(piece[i:i + 3] for i in range(len(piece) - 2))
+    return terms
+
+def document_terms(doc: dict, field_weights: Dict[str, float] = None) -> Tuple[Dict[str, float], float]:
+    """Returns ({term: weighted tf}, weighted length) for a file record."""
+    weights = field_weights or FIELD_WEIGHTS
+    tf = {}
+    length = 0.0
+
+    def add(term, w):
+        tf[term] = tf.get(term, 0.0) + w
+
+    tags = doc.get("tags") or []
+    if isinstance(tags, list):
+        w = weights.get("tags", 0.0)
+        for tag in tags:
+            if not isinstance(tag, str):
+                continue
+            add(TAG_PREFIX + normalize_query(tag), w)
+            for term in tokenize(tag):
+                add(term, w)
+                length += w
+    for field in ("filename", "detail_summary"):
+        w = weights.get(field, 0.0)
+        value = doc.get(field)
+        if w and isinstance(value, str):
+            for term in tokenize(value):
+                add(term, w)
+                length += w
+    return tf, length
+
+class BM25Ranker:
+    """
+    BM25 over tags, filename and detail_summary with NumPy posting arrays.
+    Rows are append-only; removed files are tombstoned until the next rebuild
+    (TagIndex rebuilds periodically, which also compacts).
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75, field_weights: Dict[str, float] = None):
+        self.k1 = k1
+        self.b = b
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        self.clear()
+
+    def clear(self):
+        self._file_ids = []        # row -> file id
+        self._row_of = {}          # file id -> live row
+        self._alive = []
+        self._doc_len = []
+        self._owner = []           # row -> owner code
+        self._group = []           # row -> group code
+        self._codes = {}           # owner/group id -> int code
+        self._postings = {}        # term -> ([rows], [weighted tf])
+        self._compiled = {}        # term -> (np rows, np tf)
+        self._arrays = None        # compiled per-row arrays
+        self._live_count = 0
+        self._live_len = 0.0
+
+    def __len__(self):
+        return self._live_count
+
+    def empty(self) -> "BM25Ranker":
+        """A new, empty ranker with the same parameters (filled aside by TagIndex.rebuild)."""
+        return BM25Ranker(self.k1, self.b, self.field_weights)
+
+    def _code(self, value) -> int:
+        if not value:
+            return -1
+        return self._codes.setdefault(value, len(self._codes))
+
+    def add(self, file_id: str, doc: dict):
+        self.remove(file_id)
+        tf, length = document_terms(doc, self.field_weights)
+        row = len(self._file_ids)
+        self._file_ids.append(file_id)
+        self._row_of[file_id] = row
+        self._alive.append(True)
+        self._doc_len.append(length)
+        self._owner.append(self._code(doc.get("owner_id")))
+        self._group.append(self._code(doc.get("group_id")))
+        for term, w in tf.items():
+            rows, tfs = self._postings.setdefault(term, ([], []))
+            rows.append(row)
+            tfs.append(w)
+            self._compiled.pop(term, None)
+        self._arrays = None
+        self._live_count += 1
+        self._live_len += length
+
+    def remove(self, file_id: str):
+        row = self._row_of.pop(file_id, None)
+        if row is None:
+            return
+        self._alive[row] = False
+        self._arrays = None
+        self._live_count -= 1
+        self._live_len -= self._doc_len[row]
+
+    def rebuild(self, docs: List[dict]):
+        self.clear()
+        for doc in docs:
+            if doc.get("id"):
+                self.add(doc["id"], doc)
+
+    def _row_arrays(self):
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self._alive, dtype=bool),
+                np.array(self._doc_len, dtype=np.float64),
+                np.array(self._owner, dtype=np.int64),
+                np.array(self._group, dtype=np.int64),
+            )
+        return self._arrays
+
+    def _term_arrays(self, term: str):
+        arrays = self._compiled.get(term)
+        if arrays is None:
+            rows, tfs = self._postings[term]
+            arrays = (np.array(rows, dtype=np.int64), np.array(tfs, dtype=np.float64))
+            self._compiled[term] = arrays
+        return arrays
+
+    def query_terms(self, query: str = "", query_tags: List[str] = None) -> List[str]:
+        terms = tokenize(query)
+        for tag in query_tags or []:
+            if isinstance(tag, str):
+                terms.append(TAG_PREFIX + normalize_query(tag))
+                terms.extend(tokenize(tag))
+        return terms
+
+    def search(self, query: str = "", query_tags: List[str] = None,
+               owner_ids: List[str] = None, group_ids: List[str] = None,
+               group_id: str = None, owner_id: str = None, limit: int = None) -> List[Tuple[str, float]]:
+        """
+        Returns up to `limit` (file_id, score) pairs, best first, restricted to rows
+        owned by owner_ids or shared in group_ids (or only group_id when given),
+        optionally narrowed to owner_id.
+        """
+        if self._live_count == 0:
+            return []
+        terms = set(self.query_terms(query, query_tags))
+        terms = [t for t in terms if t in self._postings]
+        if not terms:
+            return []
+
+        alive, doc_len, owner, group = self._row_arrays()
+        n = self._live_count
+        avgdl = (self._live_len / n) or 1.0
+        k1, b = self.k1, self.b
+
+        row_parts = []
+        score_parts = []
+        for term in terms:
+            rows, tf = self._term_arrays(term)
+            live = alive[rows]
+            df = int(np.count_nonzero(live))
+            if df == 0:
+                continue
+            rows, tf = rows[live], tf[live]
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = k1 * (1.0 - b + b * doc_len[rows] / avgdl)
+            row_parts.append(rows)
+            score_parts.append(idf * tf * (k1 + 1.0) / (tf + norm))
+        if not row_parts:
+            return []
+        rows = np.concatenate(row_parts)
+        contrib = np.concatenate(score_parts)
+
+        # Access control on the gathered rows only
+        if group_id:
+            allowed = group[rows] == self._codes.get(group_id, -2)
+        else:
+            owner_codes = [self._codes[o] for o in owner_ids or [] if o in self._codes]
+            group_codes = [self._codes[g] for g in group_ids or [] if g in self._codes]
+            allowed = np.isin(owner[rows], owner_codes) | np.isin(group[rows], group_codes)
+        if owner_id:
+            allowed &= owner[rows] == self._codes.get(owner_id, -2)
+        rows, contrib = rows[allowed], contrib[allowed]
+        if rows.size == 0:
+            return []
+
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=contrib)
+
+        # Top-k selection: partial partition, then sort only the selected k
+        if limit is not None and 0 < limit < scores.size:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(scores.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._file_ids[unique_rows[i]], float(scores[i])) for i in top]
@@ -1,8 +1,17 @@
 import os
 from google import genai
 from google.genai import types
-from typing import List
+from typing import List, Tuple
 import json
+import threading
+from collections import Counter
+
+try:
+    from .query_cache import QueryTagCache, tag_pool_version
+    from .local_matcher import LocalTagMatcher
+except ImportError:
+    from query_cache import QueryTagCache, tag_pool_version
+    from local_matcher import LocalTagMatcher
 
 class TagSearch:
     def __init__(self):
@@ -11,8 +20,53 @@ class TagSearch:
             raise ValueError("GOOGLE_API_KEY environment variable not set")
         client = genai.Client(api_key=api_key)
         self.model = client
+        self.query_cache = QueryTagCache(
+            max_size=int(os.environ.get("QUERY_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.environ.get("QUERY_CACHE_TTL", "3600"))
+        )
+        # Local n-gram matcher, rebuilt whenever the tag pool changes
+        self.local_match_threshold = float(os.environ.get("LOCAL_MATCH_THRESHOLD", "0.8"))
+        self._matcher = None
+        self._matcher_version = None
+        # How queries were resolved: "local", "cache" or "model"
+        self.resolution_counts = Counter()
+        self._lock = threading.Lock()
+
+    def _get_matcher(self, tag_pool: List[str]) -> LocalTagMatcher:
+        version = tag_pool_version(tag_pool)
+        with self._lock:
+            if self._matcher is None or self._matcher_version != version:
+                self._matcher = LocalTagMatcher(tag_pool or [])
+                self._matcher_version = version
+            return self._matcher
+
+    def _count(self, source: str):
+        with self._lock:
+            self.resolution_counts[source] += 1
+
+    def resolve_query_tags(self, query: str, tag_pool: List[str] = None) -> Tuple[List[str], str]:
+        """
+        Resolves query tags, cheapest path first. Returns (tags, source) where source is
+        "local" (n-gram match above LOCAL_MATCH_THRESHOLD), "cache" or "model" (Gemini).
+        """
+        local_tags = self._get_matcher(tag_pool).match(query, self.local_match_threshold)
+        if local_tags:
+            self._count("local")
+            return local_tags, "local"
+
+        cached = self.query_cache.get(query, tag_pool)
+        if cached is not None:
+            self._count("cache")
+            return cached, "cache"
+
+        self._count("model")
+        return self._extract_with_model(query, tag_pool), "model"
 
     def extract_query_tags(self, query: str, tag_pool: List[str] = None) -> List[str]:
+        query_tags, _ = self.resolve_query_tags(query, tag_pool)
+        return query_tags
+
+    def _extract_with_model(self, query: str, tag_pool: List[str] = None) -> List[str]:
         pool_str = json.dumps(tag_pool) if tag_pool else "[]"
         prompt = f"""
         Extract key topics/tags from this query.
@@ -44,7 +98,10 @@ class TagSearch:
                 text = text[7:-3]
             elif text.startswith("```"):
                 text = text[3:-3]
-            return json.loads(text)
+            query_tags = json.loads(text)
+            # Only successful extractions are memoized; failures retry next time
+            self.query_cache.put(query, tag_pool, query_tags)
+            return query_tags
         except Exception as e:
             print(f"Error extracting query tags: {e}")
             return ["other"]
@@ -62,13 +119,15 @@ class TagSearch:
         # Return number of matches to allow sorting by relevance
         return float(len(intersection))
 
-    def search_documents(self, query: str, documents: List[dict], tag_pool: List[str], group_id: str = None, owner_id: str = None) -> List[dict]:
+    def search_documents(self, query: str, documents: List[dict], tag_pool: List[str], group_id: str = None, owner_id: str = None, query_tags: List[str] = None) -> List[dict]:
         """
         Searches documents by extracting tags from the query and matching them against document tags.
         Optional: filters by group_id or owner_id if provided.
+        Pass query_tags when they were already extracted to skip the model call.
         """
         # 1. Extract tags from query using the pool
-        query_tags = self.extract_query_tags(query, tag_pool)
+        if query_tags is None:
+            query_tags = self.extract_query_tags(query, tag_pool)
         print("DEBUG: g_id", group_id)
         print("DEBUG o_id:", owner_id)
         
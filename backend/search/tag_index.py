@@ -0,0 +1,260 @@
+import threading
+import time
+from collections import Counter
+from typing import Callable, Iterable, List
+
+class TagIndex:
+    """
+    In-memory inverted index: lowercase tag -> set of file ids, plus
+    owner/group attribute postings for access control.
+    Kept current incrementally via on_file_event (wired to firebase_config's
+    file listeners) and rebuilt from a full scan once it is older than max_age,
+    as a safety net for writes made elsewhere. A rebuild is built aside and
+    swapped in, so searches keep using the old index while it runs.
+    An optional ranker (e.g. BM25Ranker) is kept in sync and used by rank(),
+    and an optional vector index (VectorIndex) is used by nearest().
+    """
+    def __init__(self, max_age_seconds: float = 300, ranker=None, vectors=None):
+        self.max_age_seconds = max_age_seconds
+        self.ranker = ranker
+        self.vectors = vectors
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.RLock() # one rebuild at a time; searches never wait on it
+        self._changes = None                   # file events seen while a rebuild runs
+        self._refresher = None
+        self._reset()
+
+    def _reset(self):
+        self.postings = {}   # tag -> set(file_id)
+        self.by_owner = {}   # owner_id -> set(file_id)
+        self.by_group = {}   # group_id -> set(file_id)
+        self.docs = {}       # file_id -> file record (with 'id')
+        self.built_at = None
+        if self.ranker is not None:
+            self.ranker.clear()
+        if self.vectors is not None:
+            self.vectors.clear()
+
+    @staticmethod
+    def _norm_tags(tags) -> set:
+        if not isinstance(tags, list):
+            return set()
+        return set(t.lower() for t in tags if isinstance(t, str))
+
+    def is_stale(self) -> bool:
+        with self._lock:
+            if self.built_at is None:
+                return True
+            return time.monotonic() - self.built_at > self.max_age_seconds
+
+    def rebuild(self, files: Iterable[dict]):
+        """
+        Replaces the index contents with the given file records. The new postings
+        and ranker are built without the lock, then swapped in; file events seen
+        meanwhile are replayed on them.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._changes = []
+            try:
+                fresh = TagIndex(self.max_age_seconds, ranker=self.ranker.empty() if self.ranker is not None else None)
+                for f in files:
+                    f_id = f.get('id')
+                    if f_id:
+                        fresh._add(f_id, f)
+                if self.vectors is not None:
+                    self.vectors.rebuild(list(fresh.docs.values()))
+                with self._lock:
+                    self.postings, self.by_owner, self.by_group = fresh.postings, fresh.by_owner, fresh.by_group
+                    self.docs, self.ranker = fresh.docs, fresh.ranker
+                    for change in self._changes:
+                        self._apply(*change)
+                    self.built_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._changes = None
+
+    def refresh(self, load_files: Callable[[], Iterable[dict]]) -> bool:
+        """
+        Rebuilds from load_files(). A caller that arrives while a rebuild runs waits
+        for it and does not start another. Returns whether this call rebuilt.
+        """
+        requested = time.monotonic()
+        with self._rebuild_lock:
+            if self.built_at is not None and self.built_at >= requested:
+                return False
+            self.rebuild(load_files())
+            return True
+
+    def refresh_in_background(self, load_files: Callable[[], Iterable[dict]]) -> bool:
+        """Starts refresh() on a background thread unless one is already running."""
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return False
+            self._refresher = threading.Thread(target=self._background_refresh, args=(load_files,),
+                                               name="tag-index-refresh", daemon=True)
+            self._refresher.start()
+            return True
+
+    def _background_refresh(self, load_files):
+        try:
+            self.refresh(load_files)
+        except Exception as e:
+            print(f"Error rebuilding the tag index: {e}")
+
+    def join_refresh(self, timeout: float = None):
+        """Waits for a background refresh, if one is running."""
+        refresher = self._refresher
+        if refresher is not None:
+            refresher.join(timeout)
+
+    def _add(self, file_id, file_data):
+        doc = dict(file_data)
+        doc['id'] = file_id
+        self.docs[file_id] = doc
+        for tag in self._norm_tags(doc.get('tags')):
+            self.postings.setdefault(tag, set()).add(file_id)
+        if doc.get('owner_id'):
+            self.by_owner.setdefault(doc['owner_id'], set()).add(file_id)
+        if doc.get('group_id'):
+            self.by_group.setdefault(doc['group_id'], set()).add(file_id)
+        if self.ranker is not None:
+            self.ranker.add(file_id, doc)
+        if self.vectors is not None:
+            self.vectors.add(file_id, doc)
+
+    def _remove(self, file_id):
+        doc = self.docs.pop(file_id, None)
+        if not doc:
+            return None
+        if self.ranker is not None:
+            self.ranker.remove(file_id)
+        if self.vectors is not None:
+            self.vectors.remove(file_id)
+        for tag in self._norm_tags(doc.get('tags')):
+            ids = self.postings.get(tag)
+            if ids is not None:
+                ids.discard(file_id)
+                if not ids:
+                    del self.postings[tag]
+        for attr, table in (('owner_id', self.by_owner), ('group_id', self.by_group)):
+            ids = table.get(doc.get(attr))
+            if ids is not None:
+                ids.discard(file_id)
+                if not ids:
+                    del table[doc.get(attr)]
+        return doc
+
+    def on_file_event(self, event: str, file_id: str, file_data: dict = None):
+        """Applies a 'saved', 'updated' or 'deleted' change from firebase_config."""
+        with self._lock:
+            self._apply(event, file_id, file_data)
+            if self._changes is not None:
+                self._changes.append((event, file_id, file_data))
+
+    def _apply(self, event, file_id, file_data):
+        if event == 'deleted':
+            self._remove(file_id)
+        elif event == 'saved':
+            self._remove(file_id)
+            self._add(file_id, file_data or {})
+        elif event == 'updated':
+            doc = self._remove(file_id)
+            if doc is None:
+                # Unknown file (not indexed yet); the next rebuild picks it up
+                return
+            doc.update(file_data or {})
+            self._add(file_id, doc)
+
+    def accessible_ids(self, owner_ids: List[str] = None, group_ids: List[str] = None) -> set:
+        with self._lock:
+            ids = set()
+            for o in owner_ids or []:
+                ids |= self.by_owner.get(o, set())
+            for g in group_ids or []:
+                ids |= self.by_group.get(g, set())
+            return ids
+
+    def search(self, query_tags: List[str], owner_ids: List[str] = None, group_ids: List[str] = None,
+               group_id: str = None, owner_id: str = None) -> List[dict]:
+        """
+        Returns copies of matching file records with '_score' (number of matched
+        query tags), sorted by score descending.
+        Candidates are files owned by any of owner_ids or shared in any of group_ids
+        (or, when group_id is given, that group's files); owner_id narrows further,
+        matching the filters of TagSearch.search_documents.
+        """
+        if not query_tags:
+            return []
+        q_set = set(t.lower() for t in query_tags if isinstance(t, str))
+
+        with self._lock:
+            # A scoped group search only ever sees that group's files
+            if group_id:
+                access = set(self.by_group.get(group_id, set()))
+            else:
+                access = self.accessible_ids(owner_ids, group_ids)
+            if owner_id:
+                access &= self.by_owner.get(owner_id, set())
+            if not access:
+                return []
+
+            scores = Counter()
+            for tag in q_set:
+                ids = self.postings.get(tag)
+                if ids:
+                    scores.update(ids & access)
+
+            results = []
+            for f_id, score in scores.items():
+                doc = self.docs[f_id].copy()
+                doc['_score'] = float(score)
+                results.append(doc)
+
+        results.sort(key=lambda x: x['_score'], reverse=True)
+        return results
+
+    def rank(self, query: str, query_tags: List[str], owner_ids: List[str] = None, group_ids: List[str] = None,
+             group_id: str = None, owner_id: str = None, limit: int = None) -> List[dict]:
+        """
+        Like search(), but scored by the ranker over tags, filename and summary
+        (so text hits count even without a tag match). Falls back to search().
+        """
+        if self.ranker is None:
+            results = self.search(query_tags, owner_ids, group_ids, group_id=group_id, owner_id=owner_id)
+            return results[:limit] if limit is not None else results
+
+        with self._lock:
+            ranked = self.ranker.search(
+                query, query_tags,
+                owner_ids=owner_ids, group_ids=group_ids,
+                group_id=group_id, owner_id=owner_id, limit=limit
+            )
+            results = []
+            for f_id, score in ranked:
+                doc = self.docs[f_id].copy()
+                doc['_score'] = score
+                results.append(doc)
+        return results
+
+    def nearest(self, query: str, owner_ids: List[str] = None, group_ids: List[str] = None,
+                group_id: str = None, owner_id: str = None, limit: int = None) -> List[dict]:
+        """Semantic (embedding) retrieval with the same access rules as rank(). Needs a vector index."""
+        if self.vectors is None:
+            return []
+        with self._lock:
+            hits = self.vectors.search(
+                query,
+                owner_ids=owner_ids, group_ids=group_ids,
+                group_id=group_id, owner_id=owner_id, limit=limit
+            )
+            results = []
+            for f_id, score in hits:
+                # The vector index swaps in a rebuild just before the docs do
+                doc = self.docs.get(f_id)
+                if doc is None:
+                    continue
+                doc = doc.copy()
+                doc['_score'] = score
+                results.append(doc)
+        return results
@@ -4,6 +4,11 @@ from google.genai import types
 from typing import List
 import json
 
+try:
+    from .media import MediaPreprocessor, TEXT, UPLOAD
+except ImportError:
+    from media import MediaPreprocessor, TEXT, UPLOAD
+
 class TagGenerator:
     def __init__(self):
         api_key = os.environ.get("GOOGLE_API_KEY")
@@ -11,6 +16,7 @@ class TagGenerator:
             raise ValueError("GOOGLE_API_KEY environment variable not set")
         client = genai.Client(api_key=api_key)
         self.model = client
+        self.preprocessor = MediaPreprocessor()
 
     def generate_metadata(self, file_path: str, mime_type: str) -> dict:
         """
@@ -27,14 +33,18 @@ class TagGenerator:
         """
         
         try:
-            # Upload the file to Gemini
-            sample_file = self.model.files.upload(
-            file=file_path,
-            )
+            # Shrink the file first; only large files still go through the Files API
+            mode, payload = self.preprocessor.prepare(file_path, mime_type)
+            if mode == UPLOAD:
+                payload = self.model.files.upload(
+                file=file_path,
+                )
+            elif mode == TEXT:
+                payload = f"Text extracted from the file (first pages):\n{payload}"
             
             response = self.model.models.generate_content(
                 model="gemini-2.0-flash",
-                contents=[sample_file, prompt],
+                contents=[payload, prompt],
                 config=types.GenerateContentConfig(
                 temperature=0,
                 thinking_config=types.ThinkingConfig(thinking_budget=0) # Disables thinking
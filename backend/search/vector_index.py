@@ -0,0 +1,350 @@
+import itertools
+import threading
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try:
+    from .query_cache import normalize_query
+    from .ranker import FIELD_WEIGHTS
+except ImportError:
+    from query_cache import normalize_query
+    from ranker import FIELD_WEIGHTS
+
+def embed_text(text: str, dim: int = 128, n: int = 3) -> np.ndarray:
+    """
+    Hashed character n-gram embedding (signed feature hashing), L2-normalized.
+    Uses crc32 so vectors are identical across processes and restarts.
+    Works the same for Thai and Latin script since it never splits on words.
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    add_text(vec, text, 1.0, n)
+    return _normalize(vec)
+
+def add_text(vec: np.ndarray, text: str, weight: float = 1.0, n: int = 3):
+    text = normalize_query(text or "").replace("_", " ")
+    if not text:
+        return
+    padded = f" {text} "
+    dim = vec.shape[0]
+    for i in range(max(1, len(padded) - n + 1)):
+        h = zlib.crc32(padded[i:i + n].encode("utf-8"))
+        vec[h % dim] += weight if (h >> 31) & 1 else -weight
+
+def _normalize(vec: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    return vec
+
+def embed_document(doc: dict, dim: int = 128, field_weights: Dict[str, float] = None) -> np.ndarray:
+    """Embeds a file record from its tags, filename and detail_summary."""
+    weights = field_weights or FIELD_WEIGHTS
+    vec = np.zeros(dim, dtype=np.float32)
+    tags = doc.get("tags") or []
+    if isinstance(tags, list):
+        for tag in tags:
+            if isinstance(tag, str):
+                add_text(vec, tag, weights.get("tags", 0.0))
+    for field in ("filename", "detail_summary"):
+        value = doc.get(field)
+        if isinstance(value, str):
+            add_text(vec, value, weights.get(field, 0.0))
+    return _normalize(vec)
+
+def _content_key(doc: dict) -> int:
+    """Identifies what embed_document reads from a record (tags, filename, detail_summary)."""
+    return hash(repr((doc.get("tags"), doc.get("filename"), doc.get("detail_summary"))))
+
+def _code(codes: dict, value) -> int:
+    if not value:
+        return -1
+    return codes.setdefault(value, len(codes))
+
+def _assign(matrix: np.ndarray, rows: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Closest centroid of each row, in blocks."""
+    labels = np.empty(rows.size, dtype=np.int64)
+    for start in range(0, rows.size, 65536):
+        block = rows[start:start + 65536]
+        labels[start:start + block.size] = np.argmax(matrix[block] @ centroids.T, axis=1)
+    return labels
+
+def _partition(rows: np.ndarray, labels: np.ndarray, nlist: int) -> List[list]:
+    """IVF lists: the rows of each label."""
+    order = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+    return [rows[order[bounds[c]:bounds[c + 1]]].tolist() for c in range(nlist)]
+
+class VectorIndex:
+    """
+    Local, network-free nearest-neighbour search over file embeddings.
+    Brute force over the caller's rows when they can see at most brute_force_max
+    files; otherwise an IVF index (k-means partitions, probing the nprobe closest
+    ones) once the corpus reaches ivf_min_rows. Training runs on a background
+    thread and the new lists are swapped in when done, so no search pays for it.
+    Removed rows are tombstoned until the next rebuild, which reuses the vectors
+    of unchanged files and keeps the trained partitions.
+    """
+    def __init__(self, dim: int = 128, ivf_min_rows: int = 50000, brute_force_max: int = 20000,
+                 nprobe: int = 8, min_score: float = 0.1):
+        self.dim = dim
+        self.ivf_min_rows = ivf_min_rows
+        self.brute_force_max = brute_force_max
+        self.nprobe = nprobe
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._trainer = None
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._generation = getattr(self, "_generation", 0) + 1 # discards trainings of older contents
+            self._n = 0
+            self._matrix = np.zeros((1024, self.dim), dtype=np.float32)
+            self._alive = np.zeros(1024, dtype=bool)
+            self._owner = np.full(1024, -1, dtype=np.int64)
+            self._group = np.full(1024, -1, dtype=np.int64)
+            self._file_ids = []
+            self._row_of = {}
+            self._content = {}       # file id -> _content_key of its live row
+            self._codes = {}
+            self._rows_by_owner = {} # owner code -> rows (tombstones included)
+            self._rows_by_group = {}
+            self._centroids = None
+            self._lists = []         # IVF list -> rows
+            self._trained_rows = 0
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def _code(self, value) -> int:
+        return _code(self._codes, value)
+
+    def _grow(self):
+        cap = self._matrix.shape[0] * 2
+        matrix = np.zeros((cap, self.dim), dtype=np.float32)
+        matrix[:self._n] = self._matrix[:self._n]
+        # Rows are never rewritten, so a trainer holding the old matrix still reads valid rows
+        self._matrix = matrix
+        for name, fill in (("_alive", False), ("_owner", -1), ("_group", -1)):
+            old = getattr(self, name)
+            new = np.full(cap, fill, dtype=old.dtype)
+            new[:old.shape[0]] = old
+            setattr(self, name, new)
+
+    def add(self, file_id: str, doc: dict, vector: np.ndarray = None):
+        if vector is None:
+            vector = embed_document(doc, self.dim)
+        with self._lock:
+            self._remove(file_id)
+            if self._n == self._matrix.shape[0]:
+                self._grow()
+            row = self._n
+            self._n += 1
+            self._matrix[row] = vector
+            self._alive[row] = True
+            owner, group = self._code(doc.get("owner_id")), self._code(doc.get("group_id"))
+            self._owner[row] = owner
+            self._group[row] = group
+            if owner >= 0:
+                self._rows_by_owner.setdefault(owner, []).append(row)
+            if group >= 0:
+                self._rows_by_group.setdefault(group, []).append(row)
+            self._file_ids.append(file_id)
+            self._row_of[file_id] = row
+            self._content[file_id] = _content_key(doc)
+            if self._centroids is not None:
+                self._lists[int(np.argmax(self._centroids @ vector))].append(row)
+        self._maybe_train()
+
+    def _remove(self, file_id: str):
+        row = self._row_of.pop(file_id, None)
+        if row is not None:
+            self._alive[row] = False
+            self._content.pop(file_id, None)
+
+    def remove(self, file_id: str):
+        with self._lock:
+            self._remove(file_id)
+
+    def rebuild(self, docs: List[dict]):
+        """
+        Replaces the contents with docs (compacting tombstones). Files whose tags,
+        filename and summary did not change keep their vector; only the others are
+        embedded. The new rows are built without the lock and swapped in, assigned
+        to the current IVF partitions. Files added while a rebuild runs are not
+        carried over: the caller replays them (TagIndex does).
+        """
+        with self._lock:
+            old_matrix, old_rows, old_content = self._matrix, dict(self._row_of), dict(self._content)
+            centroids = self._centroids
+        docs = list({doc["id"]: doc for doc in docs if doc.get("id")}.values())
+
+        n = len(docs)
+        cap = max(1024, n)
+        matrix = np.zeros((cap, self.dim), dtype=np.float32)
+        alive = np.zeros(cap, dtype=bool)
+        alive[:n] = True
+        owner = np.full(cap, -1, dtype=np.int64)
+        group = np.full(cap, -1, dtype=np.int64)
+        codes, file_ids, row_of, content = {}, [], {}, {}
+        rows_by_owner, rows_by_group = {}, {}
+        for row, doc in enumerate(docs):
+            file_id, key = doc["id"], _content_key(doc)
+            old = old_rows.get(file_id)
+            # Rows are never rewritten, so the old matrix still holds valid vectors
+            matrix[row] = old_matrix[old] if old is not None and old_content.get(file_id) == key \
+                else embed_document(doc, self.dim)
+            owner[row] = o = _code(codes, doc.get("owner_id"))
+            group[row] = g = _code(codes, doc.get("group_id"))
+            if o >= 0:
+                rows_by_owner.setdefault(o, []).append(row)
+            if g >= 0:
+                rows_by_group.setdefault(g, []).append(row)
+            file_ids.append(file_id)
+            row_of[file_id] = row
+            content[file_id] = key
+        rows = np.arange(n)
+        lists = _partition(rows, _assign(matrix, rows, centroids), centroids.shape[0]) if centroids is not None else []
+
+        with self._lock:
+            if self._centroids is not centroids:
+                # A training finished meanwhile: use its partitions
+                centroids = self._centroids
+                lists = _partition(rows, _assign(matrix, rows, centroids), centroids.shape[0]) if centroids is not None else []
+            self._generation += 1 # trainings still running saw the old rows
+            self._n, self._matrix, self._alive, self._owner, self._group = n, matrix, alive, owner, group
+            self._file_ids, self._row_of, self._content, self._codes = file_ids, row_of, content, codes
+            self._rows_by_owner, self._rows_by_group = rows_by_owner, rows_by_group
+            self._lists = lists
+        self._maybe_train()
+
+    # --- IVF training ---
+
+    def _needs_training(self) -> bool:
+        live = len(self._row_of)
+        return live >= self.ivf_min_rows and (self._centroids is None or live > 2 * self._trained_rows)
+
+    def _maybe_train(self):
+        with self._lock:
+            if not self._needs_training() or (self._trainer is not None and self._trainer.is_alive()):
+                return
+            self._trainer = threading.Thread(target=self._train_loop, name="vector-ivf-train", daemon=True)
+            self._trainer.start()
+
+    def _train_loop(self):
+        # Rows added while a training ran may call for another one
+        while True:
+            self.train()
+            with self._lock:
+                if not self._needs_training():
+                    return
+
+    def join_training(self, timeout: float = None):
+        """Waits for a background training, if one is running."""
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+
+    def train(self, iterations: int = 10, sample_size: int = 20000, seed: int = 0):
+        """
+        Fits k-means centroids (spherical, ~sqrt(n) lists) on a sample of the live
+        rows and assigns every row. Only the snapshot and the final swap hold the
+        lock; searches keep using the previous lists meanwhile.
+        """
+        with self._lock:
+            generation, matrix, n = self._generation, self._matrix, self._n
+            live = np.nonzero(self._alive[:n])[0]
+            if live.size == 0:
+                return
+            rng = np.random.default_rng(seed)
+            sample = matrix[rng.choice(live, size=min(sample_size, live.size), replace=False)]
+
+        nlist = int(min(1024, max(1, np.sqrt(live.size))))
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if members.shape[0]:
+                    centroids[c] = _normalize(members.sum(axis=0))
+        labels = _assign(matrix, live, centroids)
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            # Rows added since the snapshot
+            tail = np.arange(n, self._n)
+            if tail.size:
+                live = np.concatenate([live, tail])
+                labels = np.concatenate([labels, np.argmax(self._matrix[tail] @ centroids.T, axis=1)])
+            self._lists = _partition(live, labels, nlist)
+            self._centroids = centroids
+            self._trained_rows = live.size
+
+    # --- Search ---
+
+    def _scope_rows(self, owner_ids, group_ids, group_id) -> Tuple[List[list], int]:
+        """Row lists that can hold the caller's files, and their total length (an upper bound on visible rows)."""
+        if group_id:
+            lists = [self._rows_by_group.get(self._codes.get(group_id), [])]
+        else:
+            lists = [self._rows_by_owner[self._codes[o]] for o in owner_ids or []
+                     if self._codes.get(o) in self._rows_by_owner]
+            lists += [self._rows_by_group[self._codes[g]] for g in group_ids or []
+                      if self._codes.get(g) in self._rows_by_group]
+        return lists, sum(len(rows) for rows in lists)
+
+    def _allowed(self, rows: np.ndarray, owner_ids, group_ids, group_id, owner_id) -> np.ndarray:
+        """Access mask over the given rows only."""
+        allowed = self._alive[rows]
+        if group_id:
+            allowed &= self._group[rows] == self._codes.get(group_id, -2)
+        else:
+            owner_codes = [self._codes[o] for o in owner_ids or [] if o in self._codes]
+            group_codes = [self._codes[g] for g in group_ids or [] if g in self._codes]
+            allowed &= np.isin(self._owner[rows], owner_codes) | np.isin(self._group[rows], group_codes)
+        if owner_id:
+            allowed &= self._owner[rows] == self._codes.get(owner_id, -2)
+        return allowed
+
+    def search(self, query: str, owner_ids: List[str] = None, group_ids: List[str] = None,
+               group_id: str = None, owner_id: str = None, limit: int = None) -> List[Tuple[str, float]]:
+        """Returns (file_id, cosine similarity) pairs, best first, with the same access rules as BM25Ranker."""
+        if not self._row_of:
+            return []
+        q = embed_text(query, self.dim)
+        if not q.any():
+            return []
+
+        with self._lock:
+            scope, bound = self._scope_rows(owner_ids, group_ids, group_id)
+            if bound == 0:
+                return []
+            if self._centroids is None or bound <= self.brute_force_max:
+                rows = np.unique(np.fromiter(itertools.chain.from_iterable(scope), dtype=np.int64, count=bound))
+                rows = rows[self._allowed(rows, owner_ids, group_ids, group_id, owner_id)]
+            else:
+                # IVF: probe the closest lists, widening until enough candidates are found
+                order = np.argsort(-(self._centroids @ q))
+                want = limit or 1
+                nprobe = self.nprobe
+                while True:
+                    probe = [self._lists[c] for c in order[:nprobe]]
+                    rows = np.fromiter(itertools.chain.from_iterable(probe), dtype=np.int64,
+                                       count=sum(len(r) for r in probe))
+                    rows = rows[self._allowed(rows, owner_ids, group_ids, group_id, owner_id)]
+                    if rows.size >= want or nprobe >= order.size:
+                        break
+                    nprobe *= 2
+
+            scores = self._matrix[rows] @ q
+            keep = scores >= self.min_score
+            rows, scores = rows[keep], scores[keep]
+            if limit is not None and 0 < limit < scores.size:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                top = np.arange(scores.size)
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self._file_ids[rows[i]], float(scores[i])) for i in top]
@@ -0,0 +1,690 @@
+"""
+SQLite (SQLAlchemy) implementation of the firebase_config data functions.
+Selected with STORAGE_BACKEND=sqlite; every function keeps the name, arguments
+and return shape of its RTDB counterpart so callers do not change.
+Blobs are written to LOCAL_STORAGE_DIR and served by main.py under LOCAL_STORAGE_URL.
+"""
+import datetime
+import os
+import shutil
+import time
+
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+import database
+from database import session_scope
+from models import (
+    User, Group, GroupMember, File, Tag, PoolTag,
+    DateEntry, Collection, CollectionFile, CollectionShare, AnalysisCacheEntry,
+    FilenameReservation, TagAlias
+)
+
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "storage")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "/storage")
+
+# File record keys stored in columns (everything else goes to File.extra)
+FILE_COLUMNS = ('filename', 'file_type', 'storage_path', 'url', 'version',
+                'detail_summary', 'description', 'due_date_id')
+# Fields of a projected file listing (as in firebase_config)
+LISTING_FIELDS = ('filename', 'file_type', 'tags', 'owner_id', 'group_id', 'upload_date')
+
+def _notify_file(event, file_id, file_data):
+    import firebase_config
+    firebase_config._notify_file_listeners(event, file_id, file_data)
+
+def _notify_tag_pool(tags):
+    import firebase_config
+    firebase_config._notify_tag_pool_listeners(tags)
+
+def _int_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _now():
+    return datetime.datetime.utcnow()
+
+def _get_user(session, line_user_id, create=False):
+    user = session.query(User).filter(User.line_user_id == line_user_id).one_or_none()
+    if user is None and create:
+        user = User(line_user_id=line_user_id)
+        session.add(user)
+        session.flush()
+    return user
+
+def _get_group(session, line_group_id, create=False):
+    group = session.query(Group).filter(Group.line_group_id == line_group_id).one_or_none()
+    if group is None and create:
+        group = Group(line_group_id=line_group_id)
+        session.add(group)
+        session.flush()
+    return group
+
+def _files_query(session):
+    return session.query(File).options(
+        selectinload(File.tags),
+        selectinload(File.owner),
+        selectinload(File.group),
+    )
+
+def _file_dict(f):
+    """Builds the RTDB-shaped record (null/empty values omitted, like RTDB)."""
+    data = dict(f.extra or {})
+    for key in FILE_COLUMNS:
+        value = getattr(f, key)
+        if value is not None:
+            data[key] = value
+    if f.owner is not None:
+        data['owner_id'] = f.owner.line_user_id
+    if f.group is not None:
+        data['group_id'] = f.group.line_group_id
+    tags = [t.name for t in f.tags]
+    if tags:
+        data['tags'] = tags
+    if f.upload_date is not None:
+        data['upload_date'] = str(f.upload_date)
+    if f.updated_at is not None:
+        data['updated_at'] = str(f.updated_at)
+    data['id'] = str(f.id)
+    # Backfill URL for legacy files
+    if 'url' not in data and data.get('storage_path', '').startswith('http'):
+        data['url'] = data['storage_path']
+    return data
+
+def _set_tags(f, tags):
+    f.tags = [Tag(name=t) for t in tags or [] if isinstance(t, str)]
+
+def initialize():
+    """Creates the database schema; stands in for initialize_firebase."""
+    database.init_db()
+    os.makedirs(LOCAL_STORAGE_DIR, exist_ok=True)
+    print(f"Initialized SQLite storage backend ({database.engine.url}).")
+    return None
+
+def save_user(line_user_id, display_name, group_id=None, group_name=None):
+    """Saves or updates user info and tracks group membership."""
+    with session_scope() as session:
+        user = _get_user(session, line_user_id, create=True)
+        user.display_name = display_name
+        user.updated_at = _now()
+        if group_id:
+            group = _get_group(session, group_id, create=True)
+            name = group_name or "Unknown Group"
+            group.name = name
+            member = session.get(GroupMember, (user.id, group.id))
+            if member is None:
+                session.add(GroupMember(user_id=user.id, group_id=group.id, group_name=name))
+            else:
+                member.group_name = name
+
+def _local_path(destination_blob_name):
+    path = os.path.normpath(os.path.join(LOCAL_STORAGE_DIR, destination_blob_name))
+    if not path.startswith(os.path.normpath(LOCAL_STORAGE_DIR) + os.sep):
+        raise ValueError(f"Invalid blob name: {destination_blob_name}")
+    return path
+
+def upload_file_to_storage(file_path, destination_blob_name):
+    """Copies a file into local storage and returns its URL."""
+    with open(file_path, 'rb') as f:
+        return upload_stream_to_storage(f, destination_blob_name, None)
+
+def upload_bytes_to_storage(file_bytes, destination_blob_name, content_type):
+    """Writes bytes into local storage and returns its URL."""
+    path = _local_path(destination_blob_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(file_bytes)
+    return f"{LOCAL_STORAGE_URL}/{destination_blob_name}"
+
+def upload_stream_to_storage(file_obj, destination_blob_name, content_type, size=None):
+    """Copies a file object into local storage chunk by chunk and returns its URL."""
+    path = _local_path(destination_blob_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(file_obj, f, 1024 * 1024)
+    return f"{LOCAL_STORAGE_URL}/{destination_blob_name}"
+
+def download_from_storage(storage_path, destination_path):
+    """Copies a blob from local storage to destination_path."""
+    shutil.copyfile(_local_path(storage_path), destination_path)
+    return destination_path
+
+def save_file_metadata(file_data):
+    """Saves file metadata. Same fields as the RTDB version; returns the new file id."""
+    now = _now()
+    file_data['upload_date'] = str(now)
+    with session_scope() as session:
+        owner = _get_user(session, file_data['owner_id'], create=True)
+        group = _get_group(session, file_data['group_id'], create=True) if file_data.get('group_id') else None
+        f = File(
+            owner=owner,
+            group=group,
+            upload_date=now,
+            extra={k: v for k, v in file_data.items()
+                   if k not in FILE_COLUMNS + ('owner_id', 'group_id', 'tags', 'upload_date') and v is not None}
+        )
+        for key in FILE_COLUMNS:
+            setattr(f, key, file_data.get(key))
+        _set_tags(f, file_data.get('tags'))
+        session.add(f)
+        if file_data.get('filename'):
+            session.query(FilenameReservation).filter(FilenameReservation.name == file_data['filename']).delete()
+        session.flush()
+        file_id = str(f.id)
+
+    _notify_file('saved', file_id, file_data)
+    return file_id
+
+def update_file_metadata(file_id, updates):
+    """Updates specific fields of a file."""
+    allowed_fields = ['filename', 'tags', 'description', 'detail_summary', 'title',
+                      'analysis_status', 'analysis_updated_at']
+    safe_updates = {k: v for k, v in updates.items() if k in allowed_fields}
+    if not safe_updates:
+        return False
+
+    now = _now()
+    with session_scope() as session:
+        f = session.get(File, _int_id(file_id)) if _int_id(file_id) is not None else None
+        if f is None:
+            return False
+        for key, value in safe_updates.items():
+            if key == 'tags':
+                _set_tags(f, value)
+            elif key in FILE_COLUMNS:
+                setattr(f, key, value)
+                if key == 'filename':
+                    session.query(FilenameReservation).filter(FilenameReservation.name == value).delete()
+            else:
+                f.extra = {**(f.extra or {}), key: value}
+        f.updated_at = now
+
+    safe_updates['updated_at'] = str(now)
+    _notify_file('updated', file_id, safe_updates)
+    return True
+
+def delete_file(file_id):
+    """Deletes a file from the DB and local storage."""
+    with session_scope() as session:
+        f = _files_query(session).filter(File.id == _int_id(file_id)).one_or_none()
+        if f is None:
+            return False
+        file_data = _file_dict(f)
+        session.delete(f)
+
+    storage_path = file_data.get('storage_path')
+    if storage_path and not storage_path.startswith("http"):
+        try:
+            os.remove(_local_path(storage_path))
+        except (OSError, ValueError) as e:
+            print(f"Error deleting from storage: {e}")
+
+    _notify_file('deleted', file_id, file_data)
+    return True
+
+def _date_key(date_data):
+    return date_data.get('date') or date_data.get('date_time')
+
+def _date_dict(d):
+    data = dict(d.data or {})
+    data['id'] = str(d.id)
+    return data
+
+def save_date(date_data):
+    """
+    Saves due date info.
+    date_data: due_date, title, description, tags, file_id (optional)
+    """
+    with session_scope() as session:
+        d = DateEntry(
+            owner_id=date_data.get('owner_id'),
+            date=_date_key(date_data),
+            title=date_data.get('title'),
+            description=date_data.get('description'),
+            data=dict(date_data)
+        )
+        session.add(d)
+        session.flush()
+        return str(d.id)
+
+ANALYSIS_PENDING_STATES = ('queued', 'running')
+
+def _analysis_status():
+    return func.json_extract(File.extra, '$.analysis_status')
+
+def get_pending_analyses():
+    """File records (with 'id') whose analysis is queued or running."""
+    with session_scope() as session:
+        return [_file_dict(f) for f in _files_query(session).filter(_analysis_status().in_(ANALYSIS_PENDING_STATES))]
+
+def claim_stale_analysis(file_id, stale_before):
+    """
+    Takes over the analysis of a file queued or running since before stale_before
+    (epoch seconds): marks it queued again and counts the attempt. Returns the
+    record or None. Self-hosted mode runs a single instance, so nobody races the claim.
+    """
+    if _int_id(file_id) is None:
+        return None
+    with session_scope() as session:
+        f = _files_query(session).filter(File.id == _int_id(file_id)).one_or_none()
+        extra = dict(f.extra or {}) if f is not None else {}
+        if (f is None or extra.get('analysis_status') not in ANALYSIS_PENDING_STATES
+                or extra.get('analysis_updated_at', 0) >= stale_before):
+            return None
+        extra.update(analysis_status='queued', analysis_updated_at=time.time(),
+                     analysis_attempts=extra.get('analysis_attempts', 0) + 1)
+        f.extra = extra
+        session.flush()
+        return _file_dict(f)
+
+def get_file_metadata(file_id):
+    """Retrieves a single file record (with 'id'), or None if it does not exist."""
+    if _int_id(file_id) is None:
+        return None
+    with session_scope() as session:
+        f = _files_query(session).filter(File.id == _int_id(file_id)).one_or_none()
+        return _file_dict(f) if f else None
+
+def get_user_profile(line_user_id):
+    """Retrieves user profile including groups."""
+    with session_scope() as session:
+        user = session.query(User).options(
+            selectinload(User.memberships).selectinload(GroupMember.group)
+        ).filter(User.line_user_id == line_user_id).one_or_none()
+        if user is None:
+            return None
+        profile = {}
+        if user.display_name is not None:
+            profile['display_name'] = user.display_name
+        groups = {m.group.line_group_id: m.group_name for m in user.memberships}
+        if groups:
+            profile['groups'] = groups
+        file_ids = session.query(File.id).filter(File.owner_id == user.id).all()
+        if file_ids:
+            profile['files_owned'] = {str(fid): True for (fid,) in file_ids}
+        profile['created_at'] = str(user.created_at)
+        profile['updated_at'] = str(user.updated_at)
+        return profile
+
+def get_all_users_map():
+    """Retrieves a map of user_id -> display_name for all users."""
+    with session_scope() as session:
+        rows = session.query(User.line_user_id, User.display_name).all()
+        return {uid: name or 'Unknown User' for uid, name in rows}
+
+def get_user_names(user_ids):
+    """Display names for the given user ids ({user_id: name}; unknown ids are left out)."""
+    user_ids = [uid for uid in dict.fromkeys(user_ids) if isinstance(uid, str) and uid]
+    if not user_ids:
+        return {}
+    with session_scope() as session:
+        rows = session.query(User.line_user_id, User.display_name).filter(User.line_user_id.in_(user_ids)).all()
+        return {uid: name or 'Unknown User' for uid, name in rows}
+
+def _listing(files, projected):
+    dicts = [_file_dict(f) for f in files]
+    if projected:
+        return [{k: d[k] for k in ('id',) + LISTING_FIELDS if d.get(k) is not None} for d in dicts]
+    return dicts
+
+def get_files_by_user(line_user_id, projected=False):
+    """Retrieves files uploaded by a specific user (only the LISTING_FIELDS of each if projected)."""
+    with session_scope() as session:
+        files = _files_query(session).join(File.owner).filter(
+            User.line_user_id == line_user_id
+        ).order_by(File.id).all()
+        return _listing(files, projected)
+
+def get_files_by_group(group_id, projected=False):
+    """Retrieves files shared in a specific group (only the LISTING_FIELDS of each if projected)."""
+    with session_scope() as session:
+        files = _files_query(session).join(File.group).filter(
+            Group.line_group_id == group_id
+        ).order_by(File.id).all()
+        return _listing(files, projected)
+
+def _scoped(query, group_id=None, user_id=None):
+    """Access-control filter shared by the file listing functions."""
+    if group_id:
+        return query.join(File.group).filter(Group.line_group_id == group_id)
+    if user_id:
+        return query.join(File.owner).filter(User.line_user_id == user_id)
+    return query
+
+def get_dates_by_user(line_user_id):
+    """Retrieves dates/tasks for a specific user."""
+    with session_scope() as session:
+        rows = session.query(DateEntry).filter(DateEntry.owner_id == line_user_id).order_by(DateEntry.id).all()
+        return [_date_dict(d) for d in rows]
+
+def update_date(date_id, updates):
+    """Updates a date/task."""
+    with session_scope() as session:
+        d = session.get(DateEntry, _int_id(date_id)) if _int_id(date_id) is not None else None
+        if d is None:
+            return False
+        data = dict(d.data or {})
+        data.update(updates)
+        d.data = data
+        d.owner_id = data.get('owner_id')
+        d.date = _date_key(data)
+        d.title = data.get('title')
+        d.description = data.get('description')
+        return True
+
+def delete_date(date_id):
+    """Deletes a date/task."""
+    with session_scope() as session:
+        d = session.get(DateEntry, _int_id(date_id)) if _int_id(date_id) is not None else None
+        if d is None:
+            return False
+        session.delete(d)
+        return True
+
+def search_files_by_tags(query_tags, group_id=None, user_id=None):
+    """
+    Searches for files that contain at least one of the query tags
+    (case-insensitive, via the tags table). Filters by group_id or user_id.
+    """
+    if not query_tags:
+        return []
+    q_tags_lower = list(set(t.lower() for t in query_tags))
+    with session_scope() as session:
+        matching = session.query(Tag.file_id).filter(func.lower(Tag.name).in_(q_tags_lower))
+        query = _scoped(_files_query(session), group_id, user_id).filter(File.id.in_(matching))
+        return [_file_dict(f) for f in query.order_by(File.id).all()]
+
+def get_candidate_files(group_id=None, user_id=None):
+    """
+    Retrieves all files accessible to the user/group without tag filtering.
+    """
+    with session_scope() as session:
+        query = _scoped(_files_query(session), group_id, user_id)
+        return [_file_dict(f) for f in query.order_by(File.id).all()]
+
+def get_all_used_tags():
+    """Every tag carried by at least one file."""
+    with session_scope() as session:
+        return [name for (name,) in session.query(Tag.name).distinct().order_by(Tag.name).all()]
+
+def remap_file_tags(tag_mapping):
+    """
+    Applies {old tag: new tag} to every file carrying an old tag (found through
+    the tags table) in one transaction. Returns the number of files updated.
+    """
+    changed = {old: new for old, new in tag_mapping.items() if new and old != new}
+    if not changed:
+        return 0
+    now = _now()
+    updated = []
+    with session_scope() as session:
+        affected = session.query(Tag.file_id).filter(Tag.name.in_(list(changed)))
+        for f in session.query(File).options(selectinload(File.tags)).filter(File.id.in_(affected)):
+            tags = [t.name for t in f.tags]
+            new_tags = sorted(set(changed.get(t, t) for t in tags))
+            if new_tags != sorted(tags):
+                _set_tags(f, new_tags)
+                f.updated_at = now
+                updated.append((str(f.id), new_tags))
+    for file_id, new_tags in updated:
+        _notify_file('updated', file_id, {'tags': new_tags, 'updated_at': str(now)})
+    return len(updated)
+
+def get_tag_pool():
+    """Retrieves the global tag pool."""
+    with session_scope() as session:
+        return [name for (name,) in session.query(PoolTag.name).order_by(PoolTag.id).all()]
+
+def save_tag_pool(tags):
+    """Saves the global tag pool."""
+    with session_scope() as session:
+        session.query(PoolTag).delete()
+        seen = set()
+        for tag in tags or []:
+            if tag not in seen:
+                seen.add(tag)
+                session.add(PoolTag(name=tag))
+    _notify_tag_pool(tags)
+    return True
+
+def add_to_tag_pool(new_tags):
+    """Appends tags missing from the global tag pool."""
+    with session_scope() as session:
+        present = {name for (name,) in session.query(PoolTag.name).filter(PoolTag.name.in_(list(new_tags)))}
+        for tag in dict.fromkeys(new_tags):
+            if tag not in present:
+                session.add(PoolTag(name=tag))
+    _notify_tag_pool(get_tag_pool())
+    return True
+
+def _alias_key(tag):
+    return " ".join(tag.casefold().split())
+
+def get_tag_aliases(tags):
+    """Looks up canonical tags for raw tags in the alias map. Returns {tag: canonical} for known tags."""
+    keys = {_alias_key(tag) for tag in tags}
+    if not keys:
+        return {}
+    with session_scope() as session:
+        found = {row.alias: row.canonical for row in session.query(TagAlias).filter(TagAlias.alias.in_(keys))}
+    return {tag: found[_alias_key(tag)] for tag in tags if _alias_key(tag) in found}
+
+def save_tag_aliases(mapping):
+    """Records raw tag -> canonical tag entries in the alias map."""
+    with session_scope() as session:
+        for tag, canonical in (mapping or {}).items():
+            session.merge(TagAlias(alias=_alias_key(tag), canonical=canonical))
+    return True
+
+def get_all_tag_aliases():
+    """The whole alias map {alias key: canonical} (for the reconcile job)."""
+    with session_scope() as session:
+        return {row.alias: row.canonical for row in session.query(TagAlias).all()}
+
+def get_analysis_cache(content_hash):
+    """Retrieves cached AI metadata (tags, title, summary, suggested_filename) for a file's SHA-256."""
+    with session_scope() as session:
+        entry = session.get(AnalysisCacheEntry, content_hash)
+        if entry is None:
+            return None
+        data = dict(entry.data or {})
+        data['created_at'] = str(entry.created_at)
+        return data
+
+def save_analysis_cache(content_hash, metadata):
+    """Stores AI metadata for a file's SHA-256 so identical re-uploads skip Gemini."""
+    with session_scope() as session:
+        session.merge(AnalysisCacheEntry(content_hash=content_hash, data=dict(metadata), created_at=_now()))
+    return True
+
+# Same expiry as the RTDB index: reservations left by dead uploads free up after this
+FILENAME_RESERVATION_TTL = int(os.getenv("FILENAME_RESERVATION_TTL", "3600"))
+
+def _stale_reservations(session):
+    cutoff = _now() - datetime.timedelta(seconds=FILENAME_RESERVATION_TTL)
+    return session.query(FilenameReservation).filter(FilenameReservation.created_at < cutoff)
+
+def check_filename_exists(filename):
+    """Checks if a filename already exists in the database (or is reserved by a live upload)."""
+    with session_scope() as session:
+        _stale_reservations(session).delete()
+        if session.get(FilenameReservation, filename) is not None:
+            return True
+        return session.query(File.id).filter(File.filename == filename).first() is not None
+
+def reserve_filename(base_name, ext, current=None, token=None):
+    """
+    Claims the first free name of base_name.ext, base_name_1.ext, ... and returns it;
+    `current` is the caller's own name, kept if it comes up. The primary key on
+    filename_reservations makes the claim atomic (so the row is the caller's and
+    `token` is not stored); save_file_metadata or release_filename removes it.
+    """
+    with session_scope() as session:
+        _stale_reservations(session).delete()
+    count = 0
+    while True:
+        candidate = f"{base_name}.{ext}" if count == 0 else f"{base_name}_{count}.{ext}"
+        if candidate == current:
+            return candidate
+        try:
+            with session_scope() as session:
+                if session.query(File.id).filter(File.filename == candidate).first() is None:
+                    session.add(FilenameReservation(name=candidate, created_at=_now()))
+                    session.flush()
+                    return candidate
+        except IntegrityError:
+            pass
+        count += 1
+
+def release_filename(filename, token=None):
+    """Frees a name claimed by reserve_filename that was never saved."""
+    with session_scope() as session:
+        return session.query(FilenameReservation).filter(FilenameReservation.name == filename).delete() > 0
+
+def search_dates(query, user_id=None):
+    """
+    Searches for dates/events that match the query string.
+    Searches in 'title' and 'description' fields.
+    """
+    if not query:
+        return []
+    pattern = f"%{query.lower()}%"
+    with session_scope() as session:
+        rows = session.query(DateEntry).filter(or_(
+            func.lower(DateEntry.title).like(pattern),
+            func.lower(DateEntry.description).like(pattern)
+        ))
+        if user_id:
+            rows = rows.filter(DateEntry.owner_id == user_id)
+        return [_date_dict(d) for d in rows.order_by(DateEntry.id).all()]
+
+def _dates_between(start, end, user_id=None):
+    """Dates with start <= date < end (end None: no upper bound), by date."""
+    with session_scope() as session:
+        query = session.query(DateEntry).filter(DateEntry.date >= start)
+        if end is not None:
+            query = query.filter(DateEntry.date < end)
+        if user_id:
+            query = query.filter(DateEntry.owner_id == user_id)
+        return [_date_dict(d) for d in query.order_by(DateEntry.date).all()]
+
+def get_upcoming_dates(user_id=None):
+    """Retrieves all upcoming dates (from today onwards)."""
+    return _dates_between(datetime.datetime.now().strftime("%Y-%m-%d"), None, user_id)
+
+def get_dates_in_month(month, user_id=None):
+    """Retrieves the dates of a month ("YYYY-MM")."""
+    year, mon = (int(part) for part in month.split("-"))
+    end = f"{year + 1}-01" if mon == 12 else f"{year}-{mon + 1:02d}"
+    return _dates_between(month, end, user_id)
+
+def get_dates_this_month(user_id=None):
+    """Retrieves all dates in the current month."""
+    return get_dates_in_month(datetime.datetime.now().strftime("%Y-%m"), user_id)
+
+def get_all_dates():
+    """Retrieves all dates/events."""
+    with session_scope() as session:
+        return [_date_dict(d) for d in session.query(DateEntry).order_by(DateEntry.id).all()]
+
+def _collection_dict(c):
+    data = dict(c.data or {})
+    data['name'] = c.name
+    data['owner_id'] = c.owner_id
+    data['updated_at'] = c.updated_at
+    file_ids = [cf.file_id for cf in c.files]
+    if file_ids:
+        data['file_ids'] = file_ids
+    shared_with = [s.user_id for s in c.shares]
+    if shared_with:
+        data['shared_with'] = shared_with
+    data['id'] = str(c.id)
+    return {k: v for k, v in data.items() if v is not None}
+
+def _apply_collection(c, values):
+    data = dict(c.data or {})
+    for key, value in values.items():
+        if key == 'file_ids':
+            c.files = [CollectionFile(position=i, file_id=str(f_id)) for i, f_id in enumerate(value or [])]
+        elif key == 'shared_with':
+            c.shares = [CollectionShare(user_id=u) for u in dict.fromkeys(value or [])]
+        elif key in ('name', 'owner_id', 'updated_at'):
+            setattr(c, key, value)
+        elif key != 'id':
+            data[key] = value
+    c.data = data
+
+def save_collection(collection_data):
+    """
+    Saves a new collection.
+    collection_data: name, owner_id, description, file_ids (list)
+    """
+    collection_data['created_at'] = str(_now())
+    collection_data['updated_at'] = str(_now())
+    if 'file_ids' not in collection_data:
+        collection_data['file_ids'] = []
+    with session_scope() as session:
+        c = Collection()
+        _apply_collection(c, collection_data)
+        session.add(c)
+        session.flush()
+        return str(c.id)
+
+def _collections_query(session):
+    return session.query(Collection).options(selectinload(Collection.files), selectinload(Collection.shares))
+
+def get_collections_by_user(user_id):
+    """Retrieves all collections owned by or shared with a user, newest first."""
+    with session_scope() as session:
+        shared = session.query(CollectionShare.collection_id).filter(CollectionShare.user_id == user_id)
+        rows = _collections_query(session).filter(or_(
+            Collection.owner_id == user_id, Collection.id.in_(shared)
+        )).order_by(Collection.updated_at.desc()).all()
+        return [_collection_dict(c) for c in rows]
+
+def update_collection(collection_id, updates):
+    """Updates a collection."""
+    with session_scope() as session:
+        c = _collections_query(session).filter(Collection.id == _int_id(collection_id)).one_or_none()
+        if c is None:
+            return False
+        updates['updated_at'] = str(_now())
+        _apply_collection(c, updates)
+        return True
+
+def delete_collection(collection_id):
+    """Deletes a collection."""
+    with session_scope() as session:
+        c = session.get(Collection, _int_id(collection_id)) if _int_id(collection_id) is not None else None
+        if c is None:
+            return False
+        session.delete(c)
+        return True
+
+def get_collection_details(collection_id):
+    """Retrieves a single collection with its file details (one query for all files)."""
+    with session_scope() as session:
+        c = _collections_query(session).filter(Collection.id == _int_id(collection_id)).one_or_none()
+        if c is None:
+            return None
+        collection = _collection_dict(c)
+        file_ids = collection.get('file_ids', [])
+        int_ids = [i for i in (_int_id(f_id) for f_id in file_ids) if i is not None]
+        by_id = {}
+        if int_ids:
+            by_id = {str(f.id): _file_dict(f) for f in _files_query(session).filter(File.id.in_(int_ids)).all()}
+        collection['files'] = [by_id[f_id] for f_id in file_ids if f_id in by_id]
+        return collection
+
+def save_collection_access(collection_id, user_id):
+    """Adds a user to the shared_with list of a collection."""
+    with session_scope() as session:
+        c = session.get(Collection, _int_id(collection_id)) if _int_id(collection_id) is not None else None
+        if c is None:
+            return False
+        if session.get(CollectionShare, (c.id, user_id)) is None:
+            session.add(CollectionShare(collection_id=c.id, user_id=user_id))
+        return True
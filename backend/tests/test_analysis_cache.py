@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analysis_cache
+import firebase_config
+
+class TestAnalysisCache(unittest.TestCase):
+    def test_analysis_cache(self):
+        store = {}
+        tagger = MagicMock()
+        tagger.generate_metadata.return_value = {
+            "tags": ["Syllabus", "Math"], "title": "Calculus Syllabus",
+            "summary": "Course outline.", "suggested_filename": "calculus_syllabus"
+        }
+        hasher = analysis_cache.new_hasher()
+        for chunk in (b"%PDF-1.4 ", b"calculus"):
+            hasher.update(chunk)
+        content_hash = hasher.hexdigest()
+
+        with patch.object(firebase_config, "get_analysis_cache", side_effect=store.get), \
+             patch.object(firebase_config, "save_analysis_cache", side_effect=store.__setitem__), \
+             patch.object(analysis_cache, "cache_stats", analysis_cache.AnalysisCacheStats()):
+            first = analysis_cache.generate_metadata(tagger, "a.pdf", "application/pdf", content_hash)
+            second = analysis_cache.generate_metadata(tagger, "b.pdf", "application/pdf", content_hash)
+            self.assertEqual(first, second)
+            self.assertEqual(tagger.generate_metadata.call_count, 1)
+            self.assertIn(content_hash, store)
+
+            # Fallback results (no tags, Gemini error) are not cached
+            tagger.generate_metadata.return_value = {"tags": [], "title": "Untitled", "summary": ""}
+            analysis_cache.generate_metadata(tagger, "c.pdf", "application/pdf", "other-hash")
+            self.assertNotIn("other-hash", store)
+
+            stats = analysis_cache.cache_stats.stats()
+            self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+            self.assertAlmostEqual(stats["hit_ratio"], 1 / 3)
+            exported = "\n".join(analysis_cache.analysis_cache_metrics())
+            self.assertIn('# TYPE find_dee_analysis_cache_lookups_total counter', exported)
+            self.assertIn('find_dee_analysis_cache_lookups_total{result="hit"} 1', exported)
+            self.assertIn('find_dee_analysis_cache_lookups_total{result="miss"} 2', exported)
+            self.assertIn('# TYPE find_dee_analysis_cache gauge', exported)
+            self.assertNotIn('stat="hits"', exported)
+
+            # No tagger: cached entries are still served, misses return None
+            self.assertEqual(analysis_cache.generate_metadata(None, "d.pdf", "application/pdf", content_hash), first)
+            self.assertIsNone(analysis_cache.generate_metadata(None, "e.pdf", "application/pdf", "unknown"))
+
+if __name__ == '__main__':
+    unittest.main()
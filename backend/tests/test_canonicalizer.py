@@ -0,0 +1,88 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import firebase_config
+from benchmarks.fakes import FakeDB
+from search.canonicalizer import TagCanonicalizer
+from search.deduplicator import TagDeduplicator
+
+def deduplicator_answering(*answers):
+    """A TagDeduplicator whose model returns (or raises) the given answers in turn."""
+    deduplicator = TagDeduplicator.__new__(TagDeduplicator)
+    deduplicator.model = MagicMock()
+    deduplicator.model.models.generate_content.side_effect = [
+        a if isinstance(a, Exception) else SimpleNamespace(text=a) for a in answers
+    ]
+    return deduplicator
+
+class TestCanonicalizer(unittest.TestCase):
+    def setUp(self):
+        self.aliases = {}
+        self.load = lambda tags: {t: self.aliases[t] for t in tags if t in self.aliases}
+
+    def canonicalizer(self, deduplicator):
+        return TagCanonicalizer(deduplicator, self.load, self.aliases.update)
+
+    def test_model_failures_are_not_persisted(self):
+        canonicalizer = self.canonicalizer(deduplicator_answering(
+            "not json", ConnectionError("network down"), '```json\n{"Calculus": "Math"}\n```'
+        ))
+        pool = ["Math"]
+        for _ in range(2): # unparseable answer, then a network error
+            mapping, new = canonicalizer.canonicalize(["Calculus", "Quantum Physics"], pool)
+            self.assertEqual(mapping, {"Calculus": "Calculus", "Quantum Physics": "Quantum Physics"})
+            self.assertEqual(new, [])
+            self.assertEqual(self.aliases, {})
+
+        # The next upload retries them; the tag the model left out stays unaliased
+        mapping, new = canonicalizer.canonicalize(["Calculus", "Quantum Physics"], pool)
+        self.assertEqual(mapping, {"Calculus": "Math", "Quantum Physics": "Quantum Physics"})
+        self.assertEqual(self.aliases, {"Calculus": "Math", "Math": "Math"})
+        self.assertEqual(canonicalizer.resolution_counts["unresolved"], 5)
+        self.assertEqual(canonicalizer.deduplicator.model.models.generate_content.call_count, 3)
+
+    def test_deduplicator_returns_only_resolved_tags(self):
+        deduplicator = deduplicator_answering('{"a": "A", "b": "", "c": 3}', "[\"A\"]")
+        self.assertEqual(deduplicator.canonicalize(["a", "b", "c", "d"], []), {"a": "A"})
+        self.assertEqual(deduplicator.canonicalize(["a"], []), {})
+
+    def test_tag_canonicalizer(self):
+        fake = FakeDB()
+        deduplicator = MagicMock()
+        deduplicator.canonicalize.side_effect = lambda new, candidates: {
+            t: ("Math" if t == "Calculus" else t) for t in new
+        }
+        with patch.object(firebase_config, "db", fake):
+            canonicalizer = TagCanonicalizer(deduplicator, firebase_config.get_tag_aliases, firebase_config.save_tag_aliases)
+            pool = ["Math", "Biology"]
+
+            # Case variants of pool tags resolve locally; only unseen tags reach the model
+            mapping, new = canonicalizer.canonicalize(["math ", "Calculus", "Quantum Physics"], pool)
+            self.assertEqual(mapping, {"math": "Math", "Calculus": "Math", "Quantum Physics": "Quantum Physics"})
+            self.assertEqual(new, ["Quantum Physics"])
+            deduplicator.canonicalize.assert_called_once_with(["Calculus", "Quantum Physics"], pool)
+
+            # Seen before: served from the persisted alias map, no model call
+            mapping, new = canonicalizer.canonicalize(["calculus", "Quantum Physics"], pool + ["Quantum Physics"])
+            self.assertEqual(mapping, {"calculus": "Math", "Quantum Physics": "Quantum Physics"})
+            self.assertEqual(new, [])
+            self.assertEqual(deduplicator.canonicalize.call_count, 1)
+            self.assertEqual(canonicalizer.resolution_counts["alias"], 2)
+            self.assertEqual(firebase_config.get_all_tag_aliases()["calculus"], "Math")
+
+        # Large pools: the model only sees a shortlist of similar canonical tags
+        canonicalizer = TagCanonicalizer(deduplicator, lambda tags: {}, lambda mapping: None,
+                                         shortlist_size=3, full_pool_max=5)
+        big_pool = ["Biology", "Biochemistry Lab", "History", "Art", "Music", "Economics", "Geography"]
+        candidates = canonicalizer.candidates(["Biochemistry"], big_pool)
+        self.assertIn("Biochemistry Lab", candidates)
+        self.assertLessEqual(len(candidates), 3)
+        self.assertNotIn("Music", candidates)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import json
+import os
+import re
+import unittest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(BACKEND)
+
+class TestDatabaseRules(unittest.TestCase):
+    def test_every_child_query_has_an_index(self):
+        with open(os.path.join(ROOT, "firebase.json")) as f:
+            rules_file = json.load(f)["database"]["rules"]
+        with open(os.path.join(ROOT, rules_file)) as f:
+            rules = json.load(f)["rules"]
+        with open(os.path.join(BACKEND, "firebase_config.py")) as f:
+            source = f.read()
+
+        queries = set(re.findall(r"_ref\('([\w/]+)'\)\.order_by_child\('(\w+)'\)", source))
+        queries |= {("file_index", child) for child in ("owner_id", "group_id")} # order_by_child(child)
+        self.assertIn(("dates", "owner_date"), queries)
+        for node, child in sorted(queries):
+            self.assertIn(child, rules.get(node, {}).get(".indexOn", []), f"{node}/ needs an index on {child}")
+
+if __name__ == '__main__':
+    unittest.main()
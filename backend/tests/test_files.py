@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for _key in ("GOOGLE_API_KEY", "LINE_CHANNEL_ACCESS_TOKEN", "LINE_CHANNEL_SECRET"):
+    os.environ.setdefault(_key, "test")
+
+from fastapi.testclient import TestClient
+
+import firebase_config
+import main
+from benchmarks.fakes import FakeDB, FakeStorage
+
+class TestFiles(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDB()
+        patches = [
+            patch.object(firebase_config, "db", self.db),
+            patch.object(firebase_config, "storage", FakeStorage()),
+            patch.object(firebase_config, "_ready_indexes", set()),
+            patch.object(firebase_config, "read_cache", firebase_config._ReadCache(0, dict.fromkeys(firebase_config.read_cache.ttls, 0))),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.db.root["users"] = {"u1": {"display_name": "Nok", "groups": {"g1": True}}}
+        firebase_config.save_file_metadata({"filename": "notes.pdf", "owner_id": "u1", "tags": ["Math"]})
+        firebase_config.save_file_metadata({"filename": "slides.pdf", "owner_id": "u2", "group_id": "g1", "tags": []})
+
+    def test_slow_uploads_do_not_block_file_listing(self):
+        release = threading.Event()
+        entered = threading.Semaphore(0)
+
+        def slow_storage(*args, **kwargs):
+            entered.release()
+            release.wait(10)
+            return "https://storage.example/slow"
+
+        with TestClient(main.app) as client, \
+             patch.object(main, "upload_stream_to_storage", side_effect=slow_storage), \
+             patch.object(main.analysis_jobs, "submit"):
+            # One more upload than there are upload workers, all stuck in Storage
+            uploads = [
+                threading.Thread(target=client.post, args=("/api/upload",),
+                                 kwargs={"data": {"user_id": "u1"},
+                                         "files": {"file": (f"scan_{i}.pdf", b"%PDF-1.4", "application/pdf")}})
+                for i in range(main.UPLOAD_WORKERS + 1)
+            ]
+            for t in uploads:
+                t.start()
+            for _ in range(main.UPLOAD_WORKERS):
+                self.assertTrue(entered.acquire(timeout=5))
+            try:
+                listing = {}
+                reader = threading.Thread(target=lambda: listing.update(client.get("/api/files/u1").json()))
+                reader.start()
+                reader.join(5)
+                self.assertFalse(reader.is_alive(), "/api/files waited for the uploads")
+            finally:
+                release.set()
+                for t in uploads:
+                    t.join(10)
+        filenames = sorted(f["filename"] for section in listing["groups"] for f in section["files"])
+        self.assertEqual(filenames, ["notes.pdf", "slides.pdf"])
+
+    def test_group_files_are_fetched_concurrently(self):
+        groups = {f"g{i}": f"Group {i}" for i in range(4)}
+        self.db.root["users"]["u1"]["groups"] = groups
+        # Every group query waits for all the others: fetched one by one, the barrier breaks
+        barrier = threading.Barrier(len(groups), timeout=5)
+        get_files_by_group = firebase_config.get_files_by_group
+
+        def together(group_id, projected=False):
+            barrier.wait()
+            return get_files_by_group(group_id, projected)
+
+        with patch.object(main, "get_files_by_group", side_effect=together):
+            response = TestClient(main.app).get("/api/files/u1")
+        self.assertEqual(response.status_code, 200)
+        sections = {section["group_name"]: [f["filename"] for f in section["files"]] for section in response.json()["groups"]}
+        self.assertEqual(sections, {"My Uploads": ["notes.pdf"], "Group 1": ["slides.pdf"]})
+
+if __name__ == '__main__':
+    unittest.main()
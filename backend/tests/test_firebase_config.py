@@ -0,0 +1,195 @@
+import datetime
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import firebase_config
+from benchmarks.fakes import FakeDB
+
+class TestFirebaseConfig(unittest.TestCase):
+    def test_filename_index(self):
+        fake = FakeDB()
+        # Legacy data written before the index existed
+        fake.root = {"files": {"-F1": {"filename": "notes.pdf", "owner_id": "u1"}}}
+        with patch.object(firebase_config, "db", fake), \
+             patch.object(firebase_config, "_ready_indexes", set()):
+            self.assertTrue(firebase_config.check_filename_exists("notes.pdf"))
+            self.assertFalse(firebase_config.check_filename_exists("notes_1.pdf"))
+            self.assertEqual(fake.root["filenames"], {"notes%2Epdf": "-F1"})
+
+            # Concurrent uploads of the same name each get a distinct suffix
+            names = []
+            threads = [threading.Thread(target=lambda: names.append(firebase_config.reserve_filename("notes", "pdf")))
+                       for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(len(set(names)), 8)
+            self.assertNotIn("notes.pdf", names)
+
+            # Saving points the reservation at the file; renames and deletes keep the index in step
+            f2 = firebase_config.save_file_metadata({"filename": names[0], "owner_id": "u1", "tags": ["Math"]})
+            self.assertEqual(fake.root["filenames"][firebase_config._encode_key(names[0])], f2)
+            self.assertTrue(firebase_config.update_file_metadata(f2, {"filename": "calc.pdf"}))
+            self.assertNotIn(firebase_config._encode_key(names[0]), fake.root["filenames"])
+            self.assertEqual(firebase_config.reserve_filename("calc", "pdf", current="calc.pdf"), "calc.pdf")
+            self.assertTrue(firebase_config.delete_file(f2))
+            self.assertFalse(firebase_config.check_filename_exists("calc.pdf"))
+
+    def test_tag_remap(self):
+        fake = FakeDB()
+        # Legacy data written before the tag index existed
+        files = {f"-F{i}": {"filename": f"f{i}.pdf", "owner_id": "u1", "tags": ["calc", "Math"] if i % 2 else ["Art"]}
+                 for i in range(50)}
+        fake.root = {"files": files}
+        with patch.object(firebase_config, "db", fake), \
+             patch.object(firebase_config, "_ready_indexes", set()), \
+             patch.object(firebase_config, "REMAP_BATCH_SIZE", 10):
+            self.assertEqual(sorted(firebase_config.get_all_used_tags()), ["Art", "Math", "calc"])
+            self.assertEqual(len(fake.root["tag_files"]["calc"]), 25)
+
+            fake.reset_counters()
+            self.assertEqual(firebase_config.remap_file_tags({"calc": "Math", "Art": "Art"}), 25)
+            # One index read, one read per file, one write per batch of 10
+            self.assertEqual(fake.writes, 3)
+            self.assertEqual(fake.reads, 26)
+            self.assertEqual(fake.root["files"]["-F1"]["tags"], ["Math"])
+            self.assertEqual(fake.root["files"]["-F0"]["tags"], ["Art"])
+            self.assertNotIn("calc", fake.root["tag_files"])
+            self.assertEqual(len(fake.root["tag_files"]["Math"]), 25)
+
+            # Index follows saves, tag edits and deletes
+            f = firebase_config.save_file_metadata({"filename": "x.pdf", "owner_id": "u1", "tags": ["Art"]})
+            self.assertTrue(firebase_config.update_file_metadata(f, {"tags": ["Bio"]}))
+            self.assertNotIn(f, fake.root["tag_files"]["Art"])
+            self.assertIn(f, fake.root["tag_files"]["Bio"])
+            self.assertTrue(firebase_config.delete_file(f))
+            self.assertNotIn("Bio", fake.root["tag_files"])
+
+    def test_date_index(self):
+        fake = FakeDB()
+        month = datetime.datetime.now().strftime("%Y-%m")
+        # Legacy dates saved without the index fields
+        fake.root = {"dates": {
+            "-D0": {"owner_id": "u1", "title": "Old", "date": "2000-01-01"},
+            "-D1": {"owner_id": "u2", "title": "Trip", "date_time": "2999-05-01T09:00"},
+        }}
+        with patch.object(firebase_config, "db", fake), \
+             patch.object(firebase_config, "_ready_indexes", set()):
+            d1 = firebase_config.save_date({"owner_id": "u1", "title": "Exam", "date": "2999-01-02"})
+            d2 = firebase_config.save_date({"owner_id": "u1", "title": "Quiz", "date": f"{month}-15"})
+            self.assertEqual([d["title"] for d in firebase_config.get_upcoming_dates()], ["Exam", "Trip"])
+            self.assertEqual(fake.root["dates"]["-D1"]["owner_date"], "u2|2999-05-01T09:00")
+
+            # Indexed reads return only the matching records, without the index fields
+            fake.reset_counters()
+            upcoming = firebase_config.get_upcoming_dates("u1")
+            self.assertEqual([d["id"] for d in upcoming], [d1])
+            self.assertNotIn("date_key", upcoming[0])
+            self.assertEqual([d["id"] for d in firebase_config.get_dates_this_month("u1")], [d2])
+            self.assertEqual(firebase_config.get_dates_in_month("2999-05"), [
+                {"owner_id": "u2", "title": "Trip", "date_time": "2999-05-01T09:00", "id": "-D1"}])
+            self.assertEqual(fake.reads, 3)
+            self.assertEqual([d["title"] for d in firebase_config.get_dates_by_user("u1")], ["Old", "Exam", "Quiz"])
+            self.assertEqual([d["title"] for d in firebase_config.search_dates("trip", "u1")], [])
+
+            # Moving a date moves it in the index
+            self.assertTrue(firebase_config.update_date(d1, {"date": "2001-01-01"}))
+            self.assertEqual(firebase_config.get_upcoming_dates("u1"), [])
+            self.assertTrue(firebase_config.delete_date(d2))
+            self.assertFalse(firebase_config.delete_date(d2))
+
+    def test_read_cache(self):
+        fake = FakeDB()
+        fake.root = {"tags": {"all": ["Math"]}, "users": {"u1": {"display_name": "Alice", "groups": {}}}}
+        cache = firebase_config._ReadCache(max_size=2, ttls={"tag_pool": 60, "user": 60, "user_name": 60, "users_map": 60})
+        with patch.object(firebase_config, "db", fake), patch.object(firebase_config, "read_cache", cache), \
+             patch.object(firebase_config, "_ready_indexes", {"user_directory"}):
+            self.assertEqual(firebase_config.get_tag_pool(), ["Math"])
+            pool = firebase_config.get_tag_pool()
+            pool.append("mutated")
+            self.assertEqual(firebase_config.get_tag_pool(), ["Math"])
+            self.assertEqual(fake.reads, 1)
+            self.assertTrue(firebase_config.add_to_tag_pool(["Bio"]))
+            self.assertEqual(firebase_config.get_tag_pool(), ["Math", "Bio"])
+
+            firebase_config.save_user("u1", "Alice")
+            self.assertEqual(firebase_config.get_all_users_map(), {"u1": "Alice"})
+            firebase_config.save_user("u1", "Alicia")
+            self.assertEqual(firebase_config.get_all_users_map(), {"u1": "Alicia"})
+            self.assertEqual(firebase_config.get_user_profile("u1")["display_name"], "Alicia")
+            f = firebase_config.save_file_metadata({"filename": "a.pdf", "owner_id": "u1", "tags": []})
+            self.assertIn(f, firebase_config.get_user_profile("u1")["files_owned"])
+
+            # LRU: the two most recently used entries survive
+            fake.reset_counters()
+            firebase_config.get_tag_pool()
+            firebase_config.get_user_profile("u1")
+            self.assertEqual(fake.reads, 1)
+            stats = cache.stats()
+            self.assertEqual(sum(s["size"] for s in stats.values()), 2)
+            self.assertEqual(stats["users_map"]["size"], 0)
+            self.assertEqual((stats["tag_pool"]["hits"], stats["user"]["hits"]), (2, 1))
+
+        # A TTL of 0 turns a namespace off
+        with patch.object(firebase_config, "db", fake), \
+             patch.object(firebase_config, "read_cache", firebase_config._ReadCache(8, {"tag_pool": 0, "user": 0, "user_name": 0, "users_map": 0})):
+            fake.reset_counters()
+            firebase_config.get_tag_pool()
+            firebase_config.get_tag_pool()
+            self.assertEqual(fake.reads, 2)
+
+    def test_user_names(self):
+        fake = FakeDB()
+        # Legacy users without a directory, with bulky records
+        fake.root = {"users": {f"u{i}": {"display_name": f"User {i}", "files_owned": {f"-F{j}": True for j in range(50)}}
+                               for i in range(100)}}
+        cache = firebase_config._ReadCache(64, {"tag_pool": 60, "user": 60, "user_name": 60, "users_map": 60})
+        with patch.object(firebase_config, "db", fake), patch.object(firebase_config, "read_cache", cache), \
+             patch.object(firebase_config, "_ready_indexes", set()):
+            self.assertEqual(firebase_config.get_user_names(["u3", "u7", "ghost", "u3", None]), {"u3": "User 3", "u7": "User 7"})
+            self.assertEqual(fake.root["user_directory"]["u42"], "User 42")
+            self.assertEqual(len(firebase_config.get_all_users_map()), 100)
+
+            # One read per uncached id, none for cached ones
+            fake.reset_counters()
+            self.assertEqual(firebase_config.get_user_names(["u3", "u8", "u9"]), {"u3": "User 3", "u8": "User 8", "u9": "User 9"})
+            self.assertEqual(fake.reads, 2)
+
+            firebase_config.save_user("u3", "Renamed")
+            self.assertEqual(fake.root["user_directory"]["u3"], "Renamed")
+            self.assertEqual(firebase_config.get_user_names(["u3"]), {"u3": "Renamed"})
+            firebase_config.save_user("new", "Newcomer", group_id="g1", group_name="Class")
+            self.assertEqual(firebase_config.get_user_names(["new"]), {"new": "Newcomer"})
+            self.assertEqual(fake.root["users"]["new"]["groups"], {"g1": "Class"})
+
+    def test_file_listing(self):
+        fake = FakeDB()
+        # Legacy file saved before the listing index existed
+        fake.root = {"files": {"-F0": {"filename": "a.pdf", "file_type": "pdf", "owner_id": "u1", "group_id": "g1",
+                                       "tags": ["Math"], "upload_date": "2024-01-01", "detail_summary": "x" * 500,
+                                       "url": "https://example/a.pdf", "storage_path": "uploads/a.pdf"}}}
+        with patch.object(firebase_config, "db", fake), patch.object(firebase_config, "_ready_indexes", set()):
+            self.assertEqual(firebase_config.get_files_by_group("g1", projected=True), [{
+                "id": "-F0", "filename": "a.pdf", "file_type": "pdf", "owner_id": "u1", "group_id": "g1",
+                "tags": ["Math"], "upload_date": "2024-01-01"}])
+            self.assertIn("url", firebase_config.get_files_by_group("g1")[0])
+
+            f = firebase_config.save_file_metadata({"filename": "b.pdf", "file_type": "pdf", "owner_id": "u1",
+                                                    "tags": ["Art"], "detail_summary": "long"})
+            self.assertEqual([e["id"] for e in firebase_config.get_files_by_user("u1", projected=True)], ["-F0", f])
+            self.assertTrue(firebase_config.update_file_metadata(f, {"filename": "c.pdf", "detail_summary": "new"}))
+            self.assertEqual(firebase_config.remap_file_tags({"Art": "Drawing"}), 1)
+            self.assertEqual(fake.root["file_index"][f]["filename"], "c.pdf")
+            self.assertEqual(fake.root["file_index"][f]["tags"], ["Drawing"])
+            self.assertNotIn("detail_summary", fake.root["file_index"][f])
+            self.assertTrue(firebase_config.delete_file(f))
+            self.assertNotIn(f, fake.root["file_index"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import JobQueue, QueueFull, DONE, FAILED
+
+class TestJobQueue(unittest.TestCase):
+    def test_job_queue(self):
+        def handler(payload):
+            if payload == "bad":
+                raise ValueError("analysis failed")
+            return {"tags": [payload.upper()]}
+
+        jobs = JobQueue(handler, workers=2, max_finished=2, name="test")
+        ok = jobs.submit("math", job_id="file-1", info={"file_id": "file-1"})
+        bad = jobs.submit("bad")
+        jobs.join()
+
+        self.assertEqual(ok, "file-1")
+        self.assertEqual(jobs.get(ok)["status"], DONE)
+        self.assertEqual(jobs.get(ok)["result"], {"tags": ["MATH"]})
+        self.assertEqual(jobs.get(ok)["file_id"], "file-1")
+        self.assertEqual(jobs.get(bad)["status"], FAILED)
+        self.assertEqual(jobs.get(bad)["error"], "analysis failed")
+        self.assertIsNone(jobs.get("unknown"))
+
+        # Only the most recent max_finished finished jobs are kept
+        jobs.submit("science")
+        jobs.join()
+        self.assertIsNone(jobs.get(ok))
+        self.assertEqual(sum(jobs.stats().values()), 2)
+
+        # A full queue rejects new jobs instead of growing without bound
+        blocked = JobQueue(handler, workers=0, max_pending=1)
+        blocked.submit("one")
+        with self.assertRaises(QueueFull):
+            blocked.submit("two")
+
+        # Jobs sharing a key run one at a time in submission order, other keys in parallel
+        order, running, overlap = [], set(), []
+        lock = threading.Lock()
+
+        def ordered(payload):
+            key, n = payload
+            with lock:
+                if key in running:
+                    overlap.append(payload)
+                running.add(key)
+            time.sleep(0.005)
+            with lock:
+                running.discard(key)
+                order.append(payload)
+
+        keyed = JobQueue(ordered, workers=4, name="keyed")
+        for n in range(5):
+            for key in ("alice", "bob"):
+                keyed.submit((key, n), key=key)
+        keyed.join()
+        self.assertEqual(overlap, [])
+        self.assertEqual([n for key, n in order if key == "alice"], list(range(5)))
+        self.assertEqual([n for key, n in order if key == "bob"], list(range(5)))
+        self.assertEqual(keyed.pending(), 0)
+        self.assertEqual(keyed.stats()[DONE], 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search.local_matcher import LocalTagMatcher
+
+class TestLocalTagMatcher(unittest.TestCase):
+    def test_short_thai_tags_inside_longer_words_fall_through(self):
+        matcher = LocalTagMatcher(["ภาพ", "งาน", "งา", "การบ้าน"])
+        # ภาพ inside ภาพยนตร์ (film), งาน inside งานวิจัย (research): not confident
+        self.assertEqual(matcher.match("ดูภาพยนตร์"), [])
+        self.assertEqual(matcher.match("สรุปงานวิจัย"), [])
+        self.assertEqual(matcher.match("สงานวิจัย"), [])
+        self.assertLess(dict(matcher.score("ดูภาพยนตร์"))["ภาพ"], 0.8)
+        # As a whole word they still match
+        self.assertEqual(matcher.match("ส่ง งาน กลุ่ม"), ["งาน"])
+        self.assertEqual(matcher.match("เมล็ด งา"), ["งา"])
+        # Longer tags are specific enough to match inside a run
+        self.assertEqual(matcher.match("ส่งการบ้านวิชาเลข"), ["การบ้าน"])
+
+if __name__ == '__main__':
+    unittest.main()
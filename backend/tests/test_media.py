@@ -0,0 +1,47 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.media import make_text_pdf
+from search.media import MediaPreprocessor, TEXT, INLINE, UPLOAD
+
+class TestMediaPreprocessor(unittest.TestCase):
+    def test_media_preprocessor(self):
+        preprocessor = MediaPreprocessor(max_image_edge=512, inline_max_bytes=64 * 1024)
+        with tempfile.TemporaryDirectory() as tmp:
+            photo = os.path.join(tmp, "photo.png")
+            Image.frombytes("RGB", (1600, 1200), os.urandom(1600 * 1200 * 3)).save(photo)
+            mode, part = preprocessor.prepare(photo, "image/png")
+            self.assertEqual(mode, INLINE)
+            self.assertEqual(part.inline_data.mime_type, "image/jpeg")
+            with Image.open(io.BytesIO(part.inline_data.data)) as small:
+                self.assertEqual(max(small.size), 512)
+
+            pdf = os.path.join(tmp, "notes.pdf")
+            make_text_pdf(pdf, pages=30)
+            mode, text = preprocessor.prepare(pdf, "application/pdf")
+            self.assertEqual(mode, TEXT)
+            self.assertIn("syllabus", text)
+            self.assertLessEqual(len(text), preprocessor.pdf_chars)
+
+            # Unparseable PDFs: small ones go inline, large ones through the Files API
+            blob = os.path.join(tmp, "scan.pdf")
+            with open(blob, "wb") as f:
+                f.write(os.urandom(1024))
+            self.assertEqual(preprocessor.prepare(blob, "application/pdf")[0], INLINE)
+            with open(blob, "wb") as f:
+                f.write(os.urandom(128 * 1024))
+            self.assertEqual(preprocessor.prepare(blob, "application/pdf"), (UPLOAD, blob))
+
+        stats = preprocessor.stats()
+        self.assertEqual(stats["files_inline"], 2)
+        self.assertLess(stats["bytes_sent"], stats["bytes_in"] / 10)
+
+if __name__ == '__main__':
+    unittest.main()
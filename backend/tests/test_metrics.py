@@ -0,0 +1,36 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+class TestMetrics(unittest.TestCase):
+    def test_metrics(self):
+        @metrics.tracked("test_op")
+        def handler(fail=False):
+            metrics.count(metrics.FIREBASE_READ, 2)
+            metrics.count(metrics.GEMINI_CALL)
+            metrics.mark("first")
+            if fail:
+                raise ValueError("boom")
+            return "ok"
+
+        self.assertEqual(handler(), "ok")
+        with self.assertRaises(ValueError):
+            handler(fail=True)
+
+        text = metrics.render()
+        self.assertIn('find_dee_requests_total{op="test_op",status="ok"} 1', text)
+        self.assertIn('find_dee_requests_total{op="test_op",status="error"} 1', text)
+        self.assertIn('find_dee_stage_seconds_count{op="test_op",stage="first"} 2', text)
+        # Two requests with two reads each: both land in the le=2 bucket
+        self.assertIn('find_dee_request_backend_calls_bucket{op="test_op",kind="firebase_reads",le="2"} 2', text)
+        self.assertIn('find_dee_request_backend_calls_sum{op="test_op",kind="gemini_calls"} 2', text)
+        # Outside a tracked handler only the global counters move
+        metrics.mark("ignored")
+        self.assertNotIn('stage="ignored"', metrics.render())
+
+if __name__ == '__main__':
+    unittest.main()
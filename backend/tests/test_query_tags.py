@@ -0,0 +1,92 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search.query_cache import QueryTagCache
+from search.search import TagSearch
+
+class TestQueryTags(unittest.TestCase):
+    @patch('google.genai.Client')
+    def test_query_tag_cache(self, mock_client_cls):
+        mock_client = MagicMock()
+        mock_client_cls.return_value = mock_client
+
+        mock_response = MagicMock()
+        mock_response.text = '["Lecture"]'
+        mock_client.models.generate_content.return_value = mock_response
+
+        searcher = TagSearch()
+        pool = ["Lecture", "Exam"]
+
+        # Repeated query (different case/spacing) hits the cache
+        self.assertEqual(searcher.extract_query_tags("slides from class", pool), ["Lecture"])
+        self.assertEqual(searcher.resolve_query_tags("  Slides from   CLASS ", pool), (["Lecture"], "cache"))
+        self.assertEqual(mock_client.models.generate_content.call_count, 1)
+
+        # A different tag pool is a different key
+        searcher.extract_query_tags("slides from class", pool + ["Homework"])
+        self.assertEqual(mock_client.models.generate_content.call_count, 2)
+
+        # Explicit invalidation (wired to save_tag_pool)
+        searcher.query_cache.clear(pool)
+        searcher.extract_query_tags("slides from class", pool)
+        self.assertEqual(mock_client.models.generate_content.call_count, 3)
+
+        # Pre-extracted tags skip the model entirely
+        docs = [{"id": "1", "tags": ["Lecture"]}, {"id": "2", "tags": ["Exam"]}]
+        results = searcher.search_documents("anything", docs, pool, query_tags=["Exam"])
+        self.assertEqual([r["id"] for r in results], ["2"])
+        self.assertEqual(mock_client.models.generate_content.call_count, 3)
+
+    def test_query_cache_eviction(self):
+        cache = QueryTagCache(max_size=2, ttl_seconds=60)
+        cache.put("a", [], ["A"])
+        cache.put("b", [], ["B"])
+        cache.get("a", [])  # "a" becomes most recent
+        cache.put("c", [], ["C"])
+        self.assertIsNone(cache.get("b", []))
+        self.assertEqual(cache.get("a", []), ["A"])
+
+        expired = QueryTagCache(max_size=2, ttl_seconds=0)
+        expired.put("a", [], ["A"])
+        self.assertIsNone(expired.get("a", []))
+
+    @patch('google.genai.Client')
+    def test_local_tag_matching(self, mock_client_cls):
+        mock_client = MagicMock()
+        mock_client_cls.return_value = mock_client
+        mock_response = MagicMock()
+        mock_response.text = '["Biology"]'
+        mock_client.models.generate_content.return_value = mock_response
+
+        searcher = TagSearch()
+        pool = ["Math", "Homework", "Biology", "การบ้าน", "Exam Schedule", "AI"]
+
+        # Verbatim tags (Latin and Thai) resolve without the model
+        tags, source = searcher.resolve_query_tags("Math homework", pool)
+        self.assertEqual(source, "local")
+        self.assertEqual(sorted(tags), ["Homework", "Math"])
+        self.assertEqual(searcher.resolve_query_tags("ส่งการบ้านวิชาเลข", pool), (["การบ้าน"], "local"))
+
+        # Small typos still clear the threshold
+        tags, source = searcher.resolve_query_tags("exam schedul for finals", pool)
+        self.assertEqual((tags, source), (["Exam Schedule"], "local"))
+
+        # Short tags only match on word boundaries
+        self.assertEqual(searcher._get_matcher(pool).match("explain photosynthesis"), [])
+        # Short Thai tags do not match inside longer words, only as a whole word
+        thai = searcher._get_matcher(["งา", "การบ้าน"])
+        self.assertEqual(thai.match("สงานวิจัย"), [])
+        self.assertEqual(thai.match("เมล็ด งา"), ["งา"])
+
+        # Ambiguous queries fall through to Gemini
+        tags, source = searcher.resolve_query_tags("photosynthesis slides", pool)
+        self.assertEqual((tags, source), (["Biology"], "model"))
+        self.assertEqual(mock_client.models.generate_content.call_count, 1)
+        self.assertEqual(searcher.resolution_counts["local"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search.ranker import BM25Ranker
+from search.tag_index import TagIndex
+
+class TestBM25Ranker(unittest.TestCase):
+    def test_bm25_ranking(self):
+        index = TagIndex(ranker=BM25Ranker())
+        index.rebuild([
+            {"id": "1", "tags": ["Biology"], "filename": "cell_structure.pdf",
+             "detail_summary": "Lecture slides on photosynthesis and cells.", "owner_id": "u1"},
+            {"id": "2", "tags": ["Biology", "Lecture"], "filename": "bio_week2.pdf",
+             "detail_summary": "Second week lecture.", "owner_id": "u1"},
+            {"id": "3", "tags": ["Math"], "filename": "calculus_notes.pdf",
+             "detail_summary": "Limits and derivatives.", "owner_id": "u1"},
+            {"id": "4", "tags": ["Biology", "Lecture"], "filename": "private.pdf",
+             "detail_summary": "", "owner_id": "u2"},
+        ])
+
+        # Tag hits outrank summary-only hits; other users' files are excluded
+        results = index.rank("biology lecture", ["Biology", "Lecture"], owner_ids=["u1"])
+        self.assertEqual([r["id"] for r in results], ["2", "1"])
+        self.assertGreater(results[0]["_score"], results[1]["_score"])
+
+        # Filename and summary terms match without any tag
+        results = index.rank("photosynthesis", ["other"], owner_ids=["u1"])
+        self.assertEqual([r["id"] for r in results], ["1"])
+        results = index.rank("calculus", [], owner_ids=["u1"])
+        self.assertEqual([r["id"] for r in results], ["3"])
+
+        # Top-k and incremental removal
+        self.assertEqual(len(index.rank("lecture", ["Biology"], owner_ids=["u1", "u2"], limit=2)), 2)
+        index.on_file_event("deleted", "2", {})
+        results = index.rank("biology lecture", ["Biology", "Lecture"], owner_ids=["u1"])
+        self.assertEqual([r["id"] for r in results], ["1"])
+
+    def test_bm25_thai_terms(self):
+        ranker = BM25Ranker()
+        ranker.add("1", {"detail_summary": "เอกสารการบ้านวิชาคณิตศาสตร์", "owner_id": "u1"})
+        ranker.add("2", {"detail_summary": "ตารางสอบปลายภาค", "owner_id": "u1"})
+        ranked = ranker.search("การบ้าน", owner_ids=["u1"])
+        self.assertEqual(ranked[0][0], "1")
+
+if __name__ == '__main__':
+    unittest.main()
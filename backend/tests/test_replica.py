@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import firebase_config
+from benchmarks.fakes import FakeDB
+from replica import RtdbReplica
+
+class TestReplica(unittest.TestCase):
+    def test_replica(self):
+        fake = FakeDB(stream_latency_ms=50)
+        fake.root = {
+            "files": {"-F1": {"filename": "a.pdf", "owner_id": "u1", "group_id": "g1", "tags": ["Math"]}},
+            "users": {"u1": {"display_name": "Alice"}},
+            "tags": {"all": ["Math"]},
+            "collections": {"-C1": {"name": "Exam", "owner_id": "u1", "file_ids": ["-F1"]}},
+        }
+
+        def wait_for(condition):
+            deadline = time.monotonic() + 5
+            while not condition() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            return condition()
+
+        with patch.object(firebase_config, "db", fake), patch.object(firebase_config, "_replica", None):
+            replica = firebase_config.start_replica()
+            try:
+                self.assertTrue(wait_for(lambda: all(replica.ready(r) for r in replica.roots)))
+                fake.reset_counters()
+                self.assertEqual([f["id"] for f in firebase_config.get_files_by_user("u1")], ["-F1"])
+                self.assertEqual(len(firebase_config.get_candidate_files(group_id="g1")), 1)
+                self.assertEqual(firebase_config.get_collection_details("-C1")["files"][0]["filename"], "a.pdf")
+                self.assertEqual(firebase_config.get_all_users_map(), {"u1": "Alice"})
+                self.assertEqual(fake.reads, 0)
+
+                # Own writes are visible at once, before the stream echoes them
+                f2 = firebase_config.save_file_metadata({"filename": "b.pdf", "owner_id": "u1", "group_id": "g2", "tags": []})
+                self.assertEqual(len(firebase_config.get_files_by_user("u1")), 2)
+                self.assertTrue(firebase_config.update_file_metadata(f2, {"tags": ["A"]}))
+                self.assertTrue(firebase_config.update_file_metadata(f2, {"tags": ["B"]}))
+                self.assertEqual(firebase_config.get_files_by_group("g2")[0]["tags"], ["B"])
+                self.assertTrue(firebase_config.delete_file("-F1"))
+                self.assertEqual(firebase_config.get_files_by_group("g1"), [])
+
+                # Another instance's write arrives through the stream
+                fake.reference("files/-F9").set({"filename": "c.pdf", "owner_id": "u2", "tags": []})
+                self.assertTrue(wait_for(lambda: firebase_config.get_files_by_user("u2")))
+                self.assertTrue(wait_for(lambda: replica.stats()["pending_echoes"] == 0))
+                self.assertEqual(firebase_config.get_files_by_group("g2")[0]["tags"], ["B"])
+                self.assertEqual(firebase_config.get_user_profile("u1")["files_owned"], {f2: True})
+                stats = replica.stats()
+                self.assertGreater(stats["echo_lag_max_seconds"], 0.04)
+                self.assertEqual(stats["echo_timeouts"], 0)
+            finally:
+                firebase_config.stop_replica()
+
+    def test_replica_held_back_events(self):
+        def event(event_type, path, data):
+            return SimpleNamespace(event_type=event_type, path=path, data=data)
+
+        replica = RtdbReplica(roots=("files",))
+        replica.on_event("files", event("put", "/", {"-F1": {"filename": "a.pdf", "tags": ["Math"]}}))
+
+        # Another instance's change lands while a local write to the same file is pending
+        # (the first pending write takes it as its echo, the second holds it back)
+        replica.begin_write("files/-F1/tags", ["Local"])
+        token = replica.begin_write("files/-F1/tags", ["Local"])
+        replica.on_event("files", event("put", "/-F1/tags", ["Remote"]))
+        self.assertEqual(replica.stats()["deferred_events"], 1)
+        # ... and the later local write fails: the held-back value is applied
+        replica.cancel_write(token)
+        self.assertEqual(replica.get("files/-F1/tags"), ["Remote"])
+        self.assertEqual(replica.stats()["deferred_events"], 0)
+
+        # A held-back value older than a write that went through is never applied
+        replica.begin_write("files/-F1", {"filename": "b.pdf"}, merge=True)
+        replica.begin_write("files/-F1", {"filename": "b.pdf"}, merge=True)
+        replica.on_event("files", event("patch", "/-F1", {"filename": "old.pdf"}))
+        self.assertEqual(replica.stats()["deferred_events"], 1)
+        replica.finish_write("files/-F1", {"filename": "b.pdf"}, merge=True)
+        self.assertEqual(replica.stats()["deferred_events"], 0)
+        self.assertEqual(replica.get("files/-F1"), {"filename": "b.pdf", "tags": ["Remote"]})
+
+        # Newer stream data under a held-back parent ends up in the parent
+        replica.begin_write("files/-F2", {"filename": "c.pdf"})
+        token = replica.begin_write("files/-F2", {"filename": "c.pdf"})
+        replica.on_event("files", event("put", "/-F2", {"filename": "c.pdf", "tags": ["Old"]}))
+        replica.on_event("files", event("put", "/-F2/tags", ["New"]))
+        replica.cancel_write(token)
+        self.assertEqual(replica.get("files/-F2"), {"filename": "c.pdf", "tags": ["New"]})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for _key in ("GOOGLE_API_KEY", "LINE_CHANNEL_ACCESS_TOKEN", "LINE_CHANNEL_SECRET"):
+    os.environ.setdefault(_key, "test")
+
+from fastapi.testclient import TestClient
+
+import firebase_config
+import main
+from benchmarks.fakes import FakeDB, FakeStorage
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDB()
+        patches = [
+            patch.object(firebase_config, "db", self.db),
+            patch.object(firebase_config, "storage", FakeStorage()),
+            patch.object(firebase_config, "_ready_indexes", set()),
+            patch.object(firebase_config, "read_cache", firebase_config._ReadCache(0, dict.fromkeys(firebase_config.read_cache.ttls, 0))),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.db.root["users"] = {"u1": {"display_name": "Nok", "groups": {"g1": "Calculus"}}}
+        self.db.root["tags"] = {"all": ["Math", "History"]}
+        for i in range(5):
+            firebase_config.save_file_metadata({"filename": f"math_{i}.pdf", "owner_id": "u1", "tags": ["Math"],
+                                                "detail_summary": "Limits and derivatives " * (i + 1)})
+        firebase_config.save_file_metadata({"filename": "group.pdf", "owner_id": "u2", "group_id": "g1", "tags": ["Math"]})
+        firebase_config.save_file_metadata({"filename": "other.pdf", "owner_id": "u3", "tags": ["Math"]})
+        firebase_config.save_file_metadata({"filename": "war.pdf", "owner_id": "u1", "tags": ["History"]})
+        main.tag_index.rebuild(firebase_config.get_candidate_files())
+        self.client = TestClient(main.app)
+
+    def search(self, **body):
+        response = self.client.post("/api/search", json={"query": "Math", "user_id": "u1", **body})
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()
+
+    def test_pages_follow_the_full_ranking(self):
+        everything = self.search()
+        self.assertIsNone(everything["next_cursor"])
+        ranked = [f["id"] for f in everything["results"]]
+        self.assertEqual(len(ranked), 6) # personal + group, not u3's file or the History one
+
+        pages, cursor = [], None
+        while True:
+            page = self.search(limit=4, cursor=cursor)
+            pages += [f["id"] for f in page["results"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(pages, ranked)
+
+    def test_compact_results_carry_only_display_fields(self):
+        page = self.search(limit=2, compact=True)
+        self.assertEqual(len(page["results"]), 2)
+        for hit in page["results"]:
+            self.assertLessEqual(set(hit), set(main.SEARCH_DISPLAY_FIELDS))
+            self.assertIn("id", hit)
+            self.assertNotIn("detail_summary", hit)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.post("/api/search", json={"query": "Math", "user_id": "u1", "cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import sqlite_backend as store
+
+class TestSqliteBackend(unittest.TestCase):
+    def test_sqlite_backend(self):
+        tmp = tempfile.mkdtemp()
+        database.init_db(f"sqlite:///{os.path.join(tmp, 'test.db')}")
+        store.LOCAL_STORAGE_DIR = os.path.join(tmp, "storage")
+
+        store.save_user("u1", "Alice", "g1", "Study Group")
+        store.save_user("u2", "Bob")
+        f1 = store.save_file_metadata({"filename": "notes.pdf", "file_type": "pdf", "storage_path": "uploads/u1/notes.pdf",
+                                       "owner_id": "u1", "group_id": "g1", "tags": ["Biology", "Lecture"], "version": "v1"})
+        f2 = store.save_file_metadata({"filename": "calc.pdf", "file_type": "pdf", "storage_path": "uploads/u2/calc.pdf",
+                                       "owner_id": "u2", "group_id": None, "tags": ["Math"]})
+
+        profile = store.get_user_profile("u1")
+        self.assertEqual(profile["display_name"], "Alice")
+        self.assertEqual(profile["groups"], {"g1": "Study Group"})
+        self.assertEqual(profile["files_owned"], {f1: True})
+        self.assertIsNone(store.get_user_profile("nobody"))
+        self.assertEqual(store.get_all_users_map(), {"u1": "Alice", "u2": "Bob"})
+        self.assertEqual(store.get_user_names(["u2", "nobody", "u2"]), {"u2": "Bob"})
+
+        # Same record shape as RTDB: string ids, no null keys
+        record = store.get_file_metadata(f1)
+        self.assertEqual(record["id"], f1)
+        self.assertEqual(record["group_id"], "g1")
+        self.assertEqual(record["tags"], ["Biology", "Lecture"])
+        self.assertNotIn("group_id", store.get_file_metadata(f2))
+        self.assertEqual([f["id"] for f in store.get_files_by_group("g1")], [f1])
+        self.assertEqual([f["id"] for f in store.get_files_by_user("u2")], [f2])
+        self.assertEqual(sorted(store.get_files_by_group("g1", projected=True)[0]),
+                         ["file_type", "filename", "group_id", "id", "owner_id", "tags", "upload_date"])
+        self.assertEqual([f["id"] for f in store.search_files_by_tags(["biology", "math"])], [f1, f2])
+        self.assertEqual([f["id"] for f in store.search_files_by_tags(["biology", "math"], user_id="u2")], [f2])
+        self.assertTrue(store.check_filename_exists("notes.pdf"))
+        self.assertFalse(store.check_filename_exists("other.pdf"))
+        self.assertEqual(store.reserve_filename("notes", "pdf"), "notes_1.pdf")
+        self.assertEqual(store.reserve_filename("notes", "pdf"), "notes_2.pdf")
+        self.assertTrue(store.check_filename_exists("notes_1.pdf"))
+
+        self.assertTrue(store.update_file_metadata(f1, {"tags": ["Chemistry"], "owner_id": "hacker"}))
+        self.assertEqual(store.get_file_metadata(f1)["tags"], ["Chemistry"])
+        self.assertEqual(store.get_file_metadata(f1)["owner_id"], "u1")
+
+        store.save_tag_pool(["Biology", "Math"])
+        self.assertEqual(store.get_tag_pool(), ["Biology", "Math"])
+
+        d1 = store.save_date({"owner_id": "u1", "title": "Exam", "date": "2999-01-02"})
+        store.save_date({"owner_id": "u1", "title": "Old", "description": "past exam", "date": "2000-01-01"})
+        self.assertEqual([d["title"] for d in store.get_upcoming_dates()], ["Exam"])
+        self.assertEqual(len(store.search_dates("exam")), 2)
+        self.assertTrue(store.update_date(d1, {"title": "Final"}))
+        self.assertEqual(store.get_dates_by_user("u1")[0]["title"], "Final")
+        self.assertEqual([d["title"] for d in store.get_dates_in_month("2999-01", "u1")], ["Final"])
+        self.assertEqual(store.get_upcoming_dates("u2"), [])
+        self.assertTrue(store.delete_date(d1))
+        self.assertFalse(store.delete_date(d1))
+
+        c1 = store.save_collection({"name": "Bio", "owner_id": "u1", "file_ids": [f2, f1]})
+        self.assertTrue(store.save_collection_access(c1, "u2"))
+        self.assertEqual([c["id"] for c in store.get_collections_by_user("u2")], [c1])
+        details = store.get_collection_details(c1)
+        self.assertEqual([f["id"] for f in details["files"]], [f2, f1])
+        self.assertTrue(store.update_collection(c1, {"file_ids": [f1], "description": "x"}))
+        self.assertEqual(store.get_collection_details(c1)["file_ids"], [f1])
+
+        self.assertTrue(store.delete_file(f1))
+        self.assertIsNone(store.get_file_metadata(f1))
+        self.assertEqual(store.search_files_by_tags(["chemistry"]), [])
+        self.assertTrue(store.delete_collection(c1))
+
+        url = store.upload_stream_to_storage(io.BytesIO(b"x" * 3000000), "uploads/u1/big.pdf", "application/pdf", 3000000)
+        self.assertEqual(url, f"{store.LOCAL_STORAGE_URL}/uploads/u1/big.pdf")
+        self.assertEqual(os.path.getsize(os.path.join(store.LOCAL_STORAGE_DIR, "uploads", "u1", "big.pdf")), 3000000)
+        with self.assertRaises(ValueError):
+            store.upload_stream_to_storage(io.BytesIO(b"x"), "../escape.pdf", None)
+
+if __name__ == '__main__':
+    unittest.main()
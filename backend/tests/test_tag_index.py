@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search.ranker import BM25Ranker
+from search.tag_index import TagIndex
+from search.vector_index import VectorIndex
+
+def record(file_id, tags, owner="u1"):
+    return {"id": file_id, "filename": f"{file_id}.pdf", "tags": tags, "owner_id": owner}
+
+class TestTagIndex(unittest.TestCase):
+    def test_searches_use_the_old_index_while_a_rebuild_runs(self):
+        index = TagIndex(ranker=BM25Ranker(), vectors=VectorIndex(dim=32))
+        index.rebuild([record("a", ["Math"]), record("b", ["History"])])
+        loading, release = threading.Event(), threading.Event()
+
+        def slow_scan():
+            yield record("a", ["Math"])
+            loading.set()
+            release.wait(5)
+            yield record("c", ["Math"])
+
+        rebuild = threading.Thread(target=index.rebuild, args=(slow_scan(),))
+        rebuild.start()
+        self.assertTrue(loading.wait(5))
+        try:
+            # Not blocked by the rebuild, and still the complete old index
+            self.assertEqual([d["id"] for d in index.rank("math", ["Math"], owner_ids=["u1"])], ["a"])
+            self.assertEqual([d["id"] for d in index.search(["History"], owner_ids=["u1"])], ["b"])
+            # A write during the rebuild survives the swap
+            index.on_file_event("saved", "d", record("d", ["Math"]))
+        finally:
+            release.set()
+            rebuild.join(5)
+        self.assertEqual(sorted(d["id"] for d in index.rank("math", ["Math"], owner_ids=["u1"])), ["a", "c", "d"])
+        self.assertEqual(index.search(["History"], owner_ids=["u1"]), [])
+        self.assertEqual(sorted(d["id"] for d in index.nearest("math", owner_ids=["u1"])), ["a", "c", "d"])
+
+    def test_concurrent_refreshes_share_one_rebuild(self):
+        index = TagIndex()
+        scans = []
+        started, release = threading.Event(), threading.Event()
+
+        def load():
+            scans.append(1)
+            started.set()
+            release.wait(5)
+            return [record("a", ["Math"])]
+
+        self.assertTrue(index.refresh_in_background(load))
+        self.assertTrue(started.wait(5))
+        self.assertFalse(index.refresh_in_background(load))
+        release.set()
+        index.join_refresh(5)
+        self.assertEqual(len(scans), 1)
+        # A caller that waited for a running rebuild does not start another
+        index.built_at += 3600
+        self.assertFalse(index.refresh(load))
+        self.assertEqual(len(scans), 1)
+        index.built_at = None
+        self.assertTrue(index.refresh(load))
+        self.assertFalse(index.is_stale())
+        self.assertEqual([d["id"] for d in index.search(["Math"], owner_ids=["u1"])], ["a"])
+
+    def test_tag_index(self):
+        index = TagIndex()
+        index.rebuild([
+            {"id": "1", "tags": ["AI", "ML"], "group_id": "g1", "owner_id": "u1"},
+            {"id": "2", "tags": ["ai"], "group_id": "g2", "owner_id": "u2"},
+            {"id": "3", "tags": ["Food"], "group_id": None, "owner_id": "u1"},
+        ])
+
+        # u1 sees own files + g2; case-insensitive, ranked by matched tag count
+        results = index.search(["AI", "ML"], owner_ids=["u1"], group_ids=["g2"])
+        self.assertEqual([r["id"] for r in results], ["1", "2"])
+        self.assertEqual(results[0]["_score"], 2.0)
+
+        # Files outside the access set are never returned
+        results = index.search(["AI"], owner_ids=["u3"], group_ids=[])
+        self.assertEqual(results, [])
+
+        # Scoped filters
+        results = index.search(["AI"], owner_ids=["u1"], group_ids=["g2"], owner_id="u2")
+        self.assertEqual([r["id"] for r in results], ["2"])
+        results = index.search(["AI"], owner_ids=["u3"], group_id="g1")
+        self.assertEqual([r["id"] for r in results], ["1"])
+
+        # Incremental maintenance
+        index.on_file_event("saved", "4", {"tags": ["Food", "AI"], "owner_id": "u1", "group_id": None})
+        index.on_file_event("updated", "3", {"tags": ["AI"]})
+        index.on_file_event("deleted", "1", {})
+        ids = sorted(r["id"] for r in index.search(["ai"], owner_ids=["u1"]))
+        self.assertEqual(ids, ["3", "4"])
+        self.assertNotIn("food", [t for t in index.postings if "3" in index.postings[t]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sys
+import unittest
+from unittest.mock import Mock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for _key in ("GOOGLE_API_KEY", "LINE_CHANNEL_ACCESS_TOKEN", "LINE_CHANNEL_SECRET"):
+    os.environ.setdefault(_key, "test")
+
+from fastapi.testclient import TestClient
+
+import firebase_config
+import main
+from benchmarks.fakes import FakeDB, FakeStorage
+
+class TestUploads(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDB()
+        self.storage = FakeStorage()
+        patches = [
+            patch.object(firebase_config, "db", self.db),
+            patch.object(firebase_config, "storage", self.storage),
+            patch.object(firebase_config, "_ready_indexes", set()),
+            patch.object(firebase_config, "read_cache", firebase_config._ReadCache(0, dict.fromkeys(firebase_config.read_cache.ttls, 0))),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.client = TestClient(main.app)
+
+    def test_failed_upload_releases_filename(self):
+        with patch.object(main, "upload_stream_to_storage", side_effect=IOError("storage down")):
+            response = self.client.post("/api/upload", data={"user_id": "u1"},
+                                        files={"file": ("lecture.pdf", b"%PDF-1.4 notes", "application/pdf")})
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(firebase_config.check_filename_exists("lecture.pdf"))
+        self.assertEqual(self.db.root.get("filenames", {}), {})
+
+        # A release only frees the caller's own reservation
+        name = firebase_config.reserve_filename("lecture", "pdf", token="mine")
+        self.assertFalse(firebase_config.release_filename(name, "someone-else"))
+        self.assertTrue(firebase_config.check_filename_exists(name))
+        self.assertTrue(firebase_config.release_filename(name, "mine"))
+        self.assertFalse(firebase_config.check_filename_exists(name))
+
+        # Reservations a crashed upload never released expire
+        self.db.root["filenames"] = {"notes%2Epdf": "reserved:1000:dead", "old%2Epdf": "reserved:legacytoken"}
+        self.assertFalse(firebase_config.check_filename_exists("notes.pdf"))
+        self.assertEqual(firebase_config.reserve_filename("old", "pdf"), "old.pdf")
+
+    def test_failed_rename_keeps_provisional_name(self):
+        file_id = firebase_config.save_file_metadata({"filename": "scan.pdf", "owner_id": "u1", "tags": []})
+        job = {"file_id": file_id, "filename": "scan.pdf", "ext": "pdf", "file_type": "pdf", "manual_tags": []}
+        with patch.object(main, "update_file_metadata", side_effect=IOError("rtdb down")):
+            with self.assertRaises(IOError):
+                main.finish_upload(job, {"suggested_filename": "calculus_notes"}, ["Math"])
+        self.assertFalse(firebase_config.check_filename_exists("calculus_notes.pdf"))
+        self.assertEqual(self.db.root["filenames"]["scan%2Epdf"], file_id)
+
+    def test_lost_analysis_is_requeued_from_storage(self):
+        self.storage.bucket().blob("uploads/u1/abc.pdf").upload_from_string(b"%PDF-1.4 notes")
+        record = {"filename": "scan.pdf", "file_type": "pdf", "storage_path": "uploads/u1/abc.pdf",
+                  "owner_id": "u1", "tags": ["Math"], "mime_type": "application/pdf",
+                  "analysis_status": "running", "analysis_updated_at": 1000}
+        file_id = firebase_config.save_file_metadata(dict(record))
+        fresh_id = firebase_config.save_file_metadata({**record, "analysis_updated_at": main.time.time()})
+        given_up_id = firebase_config.save_file_metadata({**record, "analysis_attempts": main.ANALYSIS_MAX_RETRIES})
+
+        class Tagger:
+            def generate_metadata(self, path, mime_type):
+                with open(path, "rb") as f:
+                    self.read = f.read()
+                return {"tags": ["Calculus"], "title": "Calculus Notes", "summary": "Limits",
+                        "suggested_filename": "calculus_notes"}
+        tagger = Tagger()
+        submitted = []
+        with patch.object(main.analysis_jobs, "submit", side_effect=lambda job, **kw: submitted.append(job)):
+            self.assertEqual(main.recover_analyses(), {"requeued": 1, "failed": 1})
+        self.assertEqual([job["file_id"] for job in submitted], [file_id])
+        self.assertEqual(firebase_config.get_file_metadata(given_up_id)["analysis_status"], "failed")
+        self.assertEqual(firebase_config.get_file_metadata(fresh_id)["analysis_status"], "running")
+
+        # The job is rebuilt from the record and reads the file back from Storage
+        with patch.object(main, "tagger", tagger), \
+             patch.object(main, "canonicalize_upload_tags", lambda tags: ({t: t for t in tags}, [])):
+            main.analyze_upload(submitted[0])
+        self.assertEqual(tagger.read, b"%PDF-1.4 notes")
+        saved = firebase_config.get_file_metadata(file_id)
+        self.assertEqual((saved["filename"], saved["analysis_status"]), ("calculus_notes.pdf", "done"))
+
+        # Evicted jobs report the stored record, title included
+        status = self.client.get(f"/api/upload/{file_id}").json()
+        self.assertEqual(status["result"]["title"], "Calculus Notes")
+        self.assertEqual(status["result"]["tags"], ["Calculus", "Math"])
+
+    def test_oversized_upload_is_rejected_before_parsing(self):
+        limit = main.MAX_UPLOAD_BYTES + main.MULTIPART_OVERHEAD_BYTES
+        with patch.object(main, "prepare_upload") as prepare:
+            response = self.client.post("/api/upload", content=b"x" * 16,
+                                        headers={"Content-Length": str(limit + 1), "Content-Type": "multipart/form-data; boundary=b"})
+            self.assertEqual(response.status_code, 413)
+
+            # Without a Content-Length, the body is cut off once it passes the limit
+            def chunks():
+                for _ in range(limit // main.UPLOAD_CHUNK_SIZE + 2):
+                    yield b"x" * main.UPLOAD_CHUNK_SIZE
+            response = self.client.post("/api/upload", content=chunks(),
+                                        headers={"Content-Type": "multipart/form-data; boundary=b"})
+            self.assertEqual(response.status_code, 413)
+        prepare.assert_not_called()
+
+    def test_upload_streams_request_file_to_storage(self):
+        body = b"%PDF-1.4 notes"
+        with patch.object(main.analysis_jobs, "submit"), patch("builtins.open", side_effect=AssertionError("no local copy")):
+            response = self.client.post("/api/upload", data={"user_id": "u1"},
+                                        files={"file": ("lecture.pdf", body, "application/pdf")})
+        self.assertEqual(response.status_code, 200)
+        record = firebase_config.get_file_metadata(response.json()["file_id"])
+        self.assertEqual(self.storage.data[record["storage_path"]], body)
+        self.assertEqual(record["content_hash"], hashlib.sha256(body).hexdigest())
+
+    def test_batch_upload_canonicalizes_tags_once(self):
+        class Tagger:
+            def generate_metadata(self, path, mime_type):
+                with open(path, "rb") as f:
+                    name = f.read().decode()
+                return {"tags": [f"tag-{name}", "calculus"], "title": name, "summary": ""}
+
+        canonicalize = Mock(side_effect=lambda raw, pool: ({t: t.capitalize() for t in raw}, ["Calculus"]))
+        with patch.object(main, "tagger", Tagger()), patch.object(main.canonicalizer, "canonicalize", canonicalize):
+            response = self.client.post("/api/upload/batch", data={"user_id": "u1", "tags": "math"}, files=[
+                ("files", (f"{name}.jpg", name.encode(), "image/jpeg")) for name in ("a", "b", "c")
+            ])
+        self.assertEqual(response.status_code, 200)
+        events = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(sorted(e["filename"] for e in events if e["event"] == "file"), ["a.jpg", "b.jpg", "c.jpg"])
+        batch = events[-1]
+        self.assertEqual((batch["event"], batch["failed"], batch["new_tags"]), ("batch", 0, ["Calculus"]))
+
+        canonicalize.assert_called_once()
+        self.assertEqual(sorted(canonicalize.call_args[0][0]).count("calculus"), 3)
+        self.assertEqual(firebase_config.get_tag_pool(), ["Calculus"])
+        for result in batch["files"]:
+            saved = firebase_config.get_file_metadata(result["file_id"])
+            self.assertEqual(saved["tags"], result["tags"])
+            self.assertEqual(saved["analysis_status"], "done")
+            self.assertEqual(result["tags"][1:], ["Calculus", "Math"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import vector_index
+from search.vector_index import VectorIndex, embed_text
+
+class TestVectorIndex(unittest.TestCase):
+    def test_rebuild_reembeds_only_changed_files_and_keeps_partitions(self):
+        rng = np.random.default_rng(0)
+        words = ["calculus", "history", "chemistry", "physics", "poetry", "biology", "economics", "art"]
+        docs = [{"id": str(i), "filename": " ".join(rng.choice(words, 3)), "group_id": "g"} for i in range(300)]
+        index = VectorIndex(dim=64, ivf_min_rows=200, brute_force_max=10, nprobe=2, min_score=0.0)
+        index.rebuild(docs)
+        index.join_training()
+        centroids = index._centroids
+        self.assertIsNotNone(centroids)
+
+        docs[5] = {**docs[5], "filename": "organic chemistry lab report"}
+        embed = vector_index.embed_document
+        with patch.object(vector_index, "embed_document", side_effect=embed) as embedded:
+            index.rebuild(docs[1:])
+        self.assertEqual(embedded.call_count, 1) # only the renamed file
+        self.assertIs(index._centroids, centroids)
+        self.assertEqual(len(index), 299)
+        self.assertEqual(sorted(row for rows in index._lists for row in rows), list(range(299)))
+
+        hits = index.search("organic chemistry lab report", group_ids=["g"], limit=1)
+        self.assertEqual(hits[0][0], "5")
+        self.assertNotIn("0", [f_id for f_id, _ in index.search("calculus", group_ids=["g"])])
+        # Reused vectors are the ones the file had
+        np.testing.assert_allclose(index._matrix[index._row_of["7"]], embed(docs[7], 64), rtol=1e-6)
+
+    def test_vector_search(self):
+        # Embeddings are deterministic and unit length
+        self.assertTrue(np.allclose(embed_text("lecture notes"), embed_text("Lecture  Notes")))
+        self.assertAlmostEqual(float(np.linalg.norm(embed_text("สรุปเนื้อหา"))), 1.0, places=5)
+
+        index = VectorIndex(dim=256)
+        index.add("1", {"tags": ["Biology"], "filename": "photosynthesis_notes.pdf", "owner_id": "u1"})
+        index.add("2", {"tags": ["Math"], "filename": "calculus_limits.pdf", "owner_id": "u1"})
+        index.add("3", {"tags": ["Biology"], "filename": "photosynthesis_quiz.pdf", "owner_id": "u2"})
+        hits = index.search("photosynthesis", owner_ids=["u1"])
+        self.assertEqual(hits[0][0], "1")
+        self.assertNotIn("3", [h[0] for h in hits])
+
+        # IVF path: a document's own list is always probed first
+        rng = np.random.default_rng(1)
+        ivf = VectorIndex(dim=64, ivf_min_rows=200, brute_force_max=10, nprobe=2, min_score=0.0)
+        words = ["lecture", "exam", "homework", "syllabus", "biology", "physics", "การบ้าน", "ตารางสอบ"]
+        for i in range(400):
+            ivf.add(str(i), {"filename": " ".join(rng.choice(words, 3)), "group_id": "g"})
+        ivf.add("target", {"filename": "organic chemistry lab report", "group_id": "g"})
+        # Training runs off the search path; the trained lists cover every live row
+        ivf.join_training()
+        self.assertIsNotNone(ivf._centroids)
+        self.assertEqual(sum(len(rows) for rows in ivf._lists), 401)
+        hits = ivf.search("organic chemistry lab report", group_ids=["g"], limit=3)
+        self.assertEqual(hits[0][0], "target")
+        ivf.remove("target")
+        self.assertNotIn("target", [h[0] for h in ivf.search("organic chemistry lab report", group_ids=["g"])])
+        self.assertEqual(ivf.search("organic chemistry", group_ids=["other"]), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for _key in ("GOOGLE_API_KEY", "LINE_CHANNEL_ACCESS_TOKEN", "LINE_CHANNEL_SECRET"):
+    os.environ.setdefault(_key, "test")
+
+from fastapi.testclient import TestClient
+
+import main
+
+def text_event(event_id, user_id, text):
+    return {
+        "type": "message", "mode": "active", "timestamp": 1700000000000, "webhookEventId": event_id,
+        "deliveryContext": {"isRedelivery": False}, "replyToken": f"reply-{event_id}",
+        "source": {"type": "user", "userId": user_id},
+        "message": {"id": f"m-{event_id}", "type": "text", "text": text},
+    }
+
+class TestWebhook(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(main.app)
+
+    def post(self, events, signature=None):
+        body = json.dumps({"destination": "bot", "events": events})
+        if signature is None:
+            digest = hmac.new(main.LINE_CHANNEL_SECRET.encode(), body.encode(), hashlib.sha256).digest()
+            signature = base64.b64encode(digest).decode()
+        return self.client.post("/callback", content=body, headers={"X-Line-Signature": signature})
+
+    def wait_done(self, event_ids):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if all((main.line_events.get(i) or {}).get("status") == main.DONE for i in event_ids):
+                return
+            time.sleep(0.01)
+        self.fail(f"LINE events not handled: {[main.line_events.get(i) for i in event_ids]}")
+
+    def test_callback_acknowledges_before_events_are_handled(self):
+        release = threading.Event()
+        handled = []
+
+        def slow_handler(event, api):
+            release.wait(5)
+            handled.append((event.source.user_id, event.message.text))
+
+        with patch.object(main, "handle_line_event", side_effect=slow_handler):
+            started = time.monotonic()
+            response = self.post([text_event("e1", "alice", "first"), text_event("e2", "alice", "second"),
+                                  text_event("e3", "bob", "hello")])
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertEqual(handled, [])
+
+            # A redelivery of an event already queued is not handled twice
+            self.assertEqual(self.post([text_event("e1", "alice", "first")]).status_code, 200)
+            release.set()
+            self.wait_done(["e1", "e2", "e3"])
+        self.assertEqual(len(handled), 3)
+        # One user's events run in the order they arrived
+        self.assertEqual([text for user, text in handled if user == "alice"], ["first", "second"])
+
+    def test_invalid_signature_is_rejected(self):
+        with patch.object(main, "handle_line_event") as handle:
+            response = self.post([text_event("e4", "alice", "hi")], signature="bad")
+        self.assertEqual(response.status_code, 400)
+        handle.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@ const FileListView = () => {
     const [currentFolder, setCurrentFolder] = useState(null); // null = Home, object = Folder
     const [searchQuery, setSearchQuery] = useState('');
     const [searchResults, setSearchResults] = useState([]);
+    const [searchCursor, setSearchCursor] = useState(null); // next_cursor for "Load more"
     const [isSearching, setIsSearching] = useState(false);
     const [uploaderFilter, setUploaderFilter] = useState('');
 
@@ -67,8 +68,10 @@ const FileListView = () => {
         }
     };
 
-    const performSearch = async () => {
-        setIsSearching(true);
+    const SEARCH_PAGE_SIZE = 20;
+
+    const performSearch = async (cursor = null) => {
+        if (!cursor) setIsSearching(true);
         try {
             const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
             const groupId = currentFolder ? currentFolder.group_id : null;
@@ -83,17 +86,23 @@ const FileListView = () => {
                     query: searchQuery,
                     user_id: userId,
                     group_id: groupId,
-                    owner_id: uploaderFilter || null
+                    owner_id: uploaderFilter || null,
+                    limit: SEARCH_PAGE_SIZE,
+                    cursor: cursor,
+                    compact: true // Summary & URL are loaded when a result is opened
                 })
             });
 
             if (!response.ok) throw new Error('Search failed');
 
             const data = await response.json();
-            setSearchResults(data.results || []);
+            const results = data.results || [];
+            setSearchResults(prev => cursor ? [...prev, ...results] : results);
+            setSearchCursor(data.next_cursor || null);
         } catch (error) {
             console.error("Search error:", error);
-            setSearchResults([]);
+            if (!cursor) setSearchResults([]);
+            setSearchCursor(null);
         } finally {
             setIsSearching(false);
         }
@@ -102,7 +111,7 @@ const FileListView = () => {
     const fetchFiles = async () => {
         try {
             const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
-            const response = await fetch(`${apiUrl}/api/files/${userId}`, {
+            const response = await fetch(`${apiUrl}/api/files/${userId}?compact=true`, {
                 headers: { 'ngrok-skip-browser-warning': 'true' }
             });
 
@@ -156,8 +165,11 @@ const FileListView = () => {
 
             if (!response.ok) throw new Error('Upload failed');
 
+            // File is stored; AI tags/summary arrive in the background
+            const { job_id, status } = await response.json();
             await fetchFiles(); // Refresh list
             setShowUploadModal(false);
+            if (job_id && status !== 'done') pollUploadStatus(job_id);
         } catch (error) {
             alert('Upload failed: ' + error.message);
         } finally {
@@ -165,6 +177,26 @@ const FileListView = () => {
         }
     };
 
+    const pollUploadStatus = async (jobId, attempt = 0) => {
+        if (attempt >= 60) return; // Give up after ~2 minutes
+        try {
+            const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+            const response = await fetch(`${apiUrl}/api/upload/${jobId}`, {
+                headers: { 'ngrok-skip-browser-warning': 'true' }
+            });
+            if (response.ok) {
+                const job = await response.json();
+                if (job.status === 'done' || job.status === 'failed') {
+                    await fetchFiles(); // Pick up final filename and tags
+                    return;
+                }
+            }
+        } catch (error) {
+            console.error('Error polling upload status:', error);
+        }
+        setTimeout(() => pollUploadStatus(jobId, attempt + 1), 2000);
+    };
+
     const handleDelete = async (fileId) => {
         if (!confirm('Are you sure you want to delete this file?')) return;
         try {
@@ -177,7 +209,7 @@ const FileListView = () => {
             if (!response.ok) throw new Error('Delete failed');
             await fetchFiles();
 
-            const updatedGroups = await (await fetch(`${apiUrl}/api/files/${userId}`)).json();
+            const updatedGroups = await (await fetch(`${apiUrl}/api/files/${userId}?compact=true`)).json();
             setGroupedFiles(updatedGroups.groups || []);
             if (currentFolder) {
                 const updatedFolder = updatedGroups.groups.find(g => g.group_name === currentFolder.group_name);
@@ -219,7 +251,7 @@ const FileListView = () => {
             // Update current folder view if active
             if (currentFolder) {
                 // Re-fetch to get updated data
-                const updatedGroups = await (await fetch(`${apiUrl}/api/files/${userId}`)).json();
+                const updatedGroups = await (await fetch(`${apiUrl}/api/files/${userId}?compact=true`)).json();
                 setGroupedFiles(updatedGroups.groups || []);
                 const updatedFolder = updatedGroups.groups.find(g => g.group_name === currentFolder.group_name);
                 setCurrentFolder(updatedFolder || null);
@@ -264,14 +296,41 @@ const FileListView = () => {
         }
     };
 
-    const handleCardClick = (file) => {
+    // Compact listings and search results carry no summary/url; fetch them on demand
+    const loadFileDetail = async (file) => {
+        if (file.url !== undefined) return file;
+        try {
+            const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+            const response = await fetch(`${apiUrl}/api/files/detail/${file.id}`, {
+                headers: { 'ngrok-skip-browser-warning': 'true' }
+            });
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            return { ...file, ...(await response.json()) };
+        } catch (error) {
+            console.error("Failed to fetch file detail:", error);
+            return file;
+        }
+    };
+
+    const handleCardClick = async (file) => {
         if (selectionMode) {
             toggleSelection(file.id);
         } else {
             setSelectedFile(file);
+            const detailed = await loadFileDetail(file);
+            if (detailed !== file) setSelectedFile(detailed);
         }
     };
 
+    const handlePreview = async (e, file) => {
+        e.stopPropagation();
+        if (file.url !== undefined) return; // Regular link
+        e.preventDefault();
+        const previewWindow = window.open('', '_blank');
+        const detailed = await loadFileDetail(file);
+        if (detailed.url && previewWindow) previewWindow.location.href = detailed.url;
+    };
+
     const openCollectionModal = () => {
         fetchCollections();
         setShowCollectionModal(true);
@@ -459,6 +518,11 @@ const FileListView = () => {
                             <div className="d-flex flex-column gap-3">
                                 {searchResults.map(file => renderFileCard(file))}
                                 {searchResults.length === 0 && <div className="text-center text-muted">No files match your search.</div>}
+                                {searchCursor && (
+                                    <button className="btn btn-outline-secondary rounded-3" onClick={() => performSearch(searchCursor)}>
+                                        Load more
+                                    </button>
+                                )}
                             </div>
                         )}
                     </div>
@@ -570,6 +634,11 @@ const FileListView = () => {
                             </div>
                         )
                     )}
+                    {searchQuery && !isSearching && searchCursor && (
+                        <button className="btn btn-outline-secondary rounded-3" onClick={() => performSearch(searchCursor)}>
+                            Load more
+                        </button>
+                    )}
                 </div>
             </>
         );
@@ -631,7 +700,7 @@ const FileListView = () => {
                                                 <button className="dropdown-item px-3 py-2 d-flex align-items-center gap-2" onClick={(e) => { e.stopPropagation(); openEditModal(file); }}>
                                                     <Edit2 size={16} /> Edit
                                                 </button>
-                                                <a href={file.url} target="_blank" rel="noopener noreferrer" className="dropdown-item px-3 py-2 d-flex align-items-center gap-2 text-decoration-none text-dark" onClick={(e) => e.stopPropagation()}>
+                                                <a href={file.url || '#'} target="_blank" rel="noopener noreferrer" className="dropdown-item px-3 py-2 d-flex align-items-center gap-2 text-decoration-none text-dark" onClick={(e) => handlePreview(e, file)}>
                                                     <ExternalLink size={16} /> Preview
                                                 </a>
                                                 <div className="dropdown-divider my-1 border-top"></div>